@@ -1,10 +1,14 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_caching import Cache
+from flask_migrate import Migrate
 import os
 
-db = SQLAlchemy()
+from backend.engine import RoutingSession, REPLICA_BIND, resolve_profile, engine_options, configure_engines
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 cache = Cache()
+migrate = Migrate()
 
 
 def create_app():
@@ -26,6 +30,25 @@ def create_app():
     )
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+    # ✅ ENGINE PROFILE ("auto", "sqlite-wal", "postgres-pool" or "default")
+    app.config["DB_PROFILE"] = resolve_profile(app.config["SQLALCHEMY_DATABASE_URI"])
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["DB_PROFILE"])
+
+    # ✅ READ REPLICA (optional; GET requests read from it)
+    binds = {}
+    replica_url = os.getenv("DATABASE_REPLICA_URL")
+    if replica_url:
+        binds[REPLICA_BIND] = {"url": replica_url, **engine_options(resolve_profile(replica_url))}
+
+    # ✅ SHARDS (optional; "lo-hi=url;..." puts those lots' spots/reservations on their own DB)
+    from backend.shards import parse_shards
+    app.config["DATABASE_SHARDS"] = parse_shards(os.getenv("DATABASE_SHARDS", ""))
+    app.config["SHARD_ID_BLOCK"] = int(os.getenv("SHARD_ID_BLOCK", 10 ** 8))
+    for _, _, bind, url in app.config["DATABASE_SHARDS"]:
+        binds[bind] = {"url": url, **engine_options(resolve_profile(url))}
+    if binds:
+        app.config["SQLALCHEMY_BINDS"] = binds
+
     # ✅ EMAIL CONFIG (NEVER hardcode in deployment)
     app.config["MAIL_SERVER"] = os.getenv("MAIL_SERVER", "smtp.gmail.com")
     app.config["MAIL_PORT"] = int(os.getenv("MAIL_PORT", 587))
@@ -41,16 +64,135 @@ def create_app():
 
     # ✅ CACHE CONFIG (use cloud redis URL in deployment)
     redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-    app.config["CACHE_TYPE"] = "RedisCache"
+    app.config["CACHE_TYPE"] = os.getenv("CACHE_TYPE", "RedisCache")
     app.config["CACHE_REDIS_URL"] = redis_url
     app.config["CACHE_DEFAULT_TIMEOUT"] = 30
 
+    # ✅ ADMISSION CONTROL ("redis", "memory" or "off"; token_required routes only)
+    app.config["ADMISSION"] = os.getenv("ADMISSION", "redis")
+    app.config["ADMISSION_REDIS_URL"] = redis_url
+    app.config["ADMISSION_USER_RATE"] = float(os.getenv("ADMISSION_USER_RATE", 20))
+    app.config["ADMISSION_USER_BURST"] = int(os.getenv("ADMISSION_USER_BURST", 40))
+    app.config["ADMISSION_ROUTE_LIMITS"] = os.getenv("ADMISSION_ROUTE_LIMITS", "")  # "book_spot=200/400,..."
+    app.config["ADMISSION_CONCURRENCY"] = os.getenv(
+        "ADMISSION_CONCURRENCY", "book_spot=32,release_spot=32,bulk_release=2,import_lots=2")
+    app.config["ADMISSION_RETRY_AFTER"] = 30
+
+    # ✅ SPOT ALLOCATOR ("redis", "memory" or "off" to always use the DB path)
+    app.config["SPOT_ALLOCATOR"] = os.getenv("SPOT_ALLOCATOR", "redis")
+    app.config["SPOT_ALLOCATOR_REDIS_URL"] = redis_url
+    app.config["SPOT_ALLOCATOR_TTL"] = int(os.getenv("SPOT_ALLOCATOR_TTL", 300))
+
+    # ✅ OCCUPANCY BITMAPS ("redis", "memory" or "off" to build from the DB on every read)
+    app.config["SPOT_BITMAP"] = os.getenv("SPOT_BITMAP", "redis")
+    app.config["SPOT_BITMAP_REDIS_URL"] = redis_url
+    app.config["SPOT_BITMAP_TTL"] = int(os.getenv("SPOT_BITMAP_TTL", os.getenv("HTTP_POLL_SECONDS", 10)))  # the dashboard's poll interval
+
+    # ✅ SURGE BOOKING ("off", "all" or comma-separated lot ids to group-commit bookings)
+    app.config["BOOKING_GROUP_COMMIT"] = os.getenv("BOOKING_GROUP_COMMIT", "off")
+    app.config["BOOKING_BATCH_MAX"] = int(os.getenv("BOOKING_BATCH_MAX", 200))
+    app.config["BOOKING_BATCH_WINDOW_MS"] = int(os.getenv("BOOKING_BATCH_WINDOW_MS", 10))
+    app.config["BOOKING_WAIT_MS"] = int(os.getenv("BOOKING_WAIT_MS", 2000))
+    app.config["BOOKING_QUEUE_MAX"] = int(os.getenv("BOOKING_QUEUE_MAX", 5000))
+    app.config["BOOKING_TICKET_TTL"] = 300
+    app.config["BOOKING_BATCHER_IDLE_SECONDS"] = float(os.getenv("BOOKING_BATCHER_IDLE_SECONDS", 30))
+
+    # ✅ LIVE FEED (Redis pub/sub shared by all workers)
+    app.config["EVENTS_REDIS_URL"] = redis_url
+    app.config["EVENTS_HEARTBEAT"] = 15
+    app.config["LIVE_TICKET_SECONDS"] = int(os.getenv("LIVE_TICKET_SECONDS", 30))  # single-use EventSource tickets
+
+    # ✅ LOT SEARCH (per-worker index; resync check interval and availability snapshot age)
+    app.config["LOT_SEARCH_SYNC_SECONDS"] = float(os.getenv("LOT_SEARCH_SYNC_SECONDS", 1))
+    app.config["LOT_SEARCH_COUNTS_TTL"] = float(os.getenv("LOT_SEARCH_COUNTS_TTL", 5))
+    app.config["LOT_SEARCH_MAX_AGE"] = float(os.getenv("LOT_SEARCH_MAX_AGE", 60))  # rebuild age when the cache is down
+
+    # ✅ CSV EXPORT (histories up to this size stream directly, bigger go via Celery)
+    app.config["EXPORT_DIRECT_MAX_ROWS"] = int(os.getenv("EXPORT_DIRECT_MAX_ROWS", 5000))
+
+    # ✅ ARCHIVAL (closed reservations older than this move to reservation_archive)
+    app.config["RESERVATION_ARCHIVE_DAYS"] = int(os.getenv("RESERVATION_ARCHIVE_DAYS", 180))
+
+    # ✅ HTTP CACHING (ETag/304 on polled GETs; JSON bodies from this size are gzip/brotli-compressed)
+    app.config["HTTP_ETAGS"] = os.getenv("HTTP_ETAGS", "auto")  # "auto" = only with a Redis/Memcached cache, "on", "off"
+    app.config["HTTP_POLL_SECONDS"] = int(os.getenv("HTTP_POLL_SECONDS", 10))  # version tokens live 6 polls
+    app.config["HTTP_COMPRESS_MIN_BYTES"] = int(os.getenv("HTTP_COMPRESS_MIN_BYTES", 1024))
+    app.config["HTTP_COMPRESS_LEVEL"] = int(os.getenv("HTTP_COMPRESS_LEVEL", 6))
+
+    # ✅ METRICS (/metrics, slow-query log, N+1 detection)
+    app.config["METRICS_SLOW_QUERY_MS"] = int(os.getenv("METRICS_SLOW_QUERY_MS", 200))
+    app.config["METRICS_N_PLUS_ONE_THRESHOLD"] = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", 10))
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN", "")  # bearer token for /metrics; unset = route disabled
+
+    # ✅ PASSWORD HASHING (Werkzeug method; bounded per-process pool, excess gets 503 + Retry-After)
+    app.config["PASSWORD_HASH_METHOD"] = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+    app.config["PASSWORD_HASH_CONCURRENCY"] = int(os.getenv("PASSWORD_HASH_CONCURRENCY", max(1, (os.cpu_count() or 2) // 2)))
+    app.config["PASSWORD_HASH_QUEUE_MAX"] = int(os.getenv("PASSWORD_HASH_QUEUE_MAX", 64))
+    app.config["PASSWORD_HASH_QUEUE_MS"] = int(os.getenv("PASSWORD_HASH_QUEUE_MS", 1000))
+    app.config["PASSWORD_HASH_RETRY_AFTER"] = 1
+
+    # ✅ AUTH PRINCIPAL CACHE ("redis" shared, or "memory" per worker: revocations lag up to the TTL elsewhere)
+    app.config["PRINCIPAL_CACHE"] = os.getenv("PRINCIPAL_CACHE", "redis")
+    app.config["PRINCIPAL_CACHE_REDIS_URL"] = redis_url
+    app.config["PRINCIPAL_CACHE_SIZE"] = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+    app.config["PRINCIPAL_CACHE_TTL"] = int(os.getenv("PRINCIPAL_CACHE_TTL", 30))
+
+    # ✅ BOOTSTRAP (normally `flask --app run bootstrap` at deploy; "1" runs it at startup)
+    app.config["AUTO_BOOTSTRAP"] = os.getenv("AUTO_BOOTSTRAP", "0") == "1"
+
     # ✅ Init extensions
     db.init_app(app)
+    configure_engines(app, db)
     cache.init_app(app)
+    migrate.init_app(app, db, directory=os.path.join(BASE_DIR, "migrations"),
+                     render_as_batch=True)  # batch mode so ALTERs work on SQLite
+
+    from backend import shards
+    shards.init_app(app)
+
+    from backend.allocator import allocator
+    allocator.init_app(app)
+
+    from backend.spot_bitmap import spot_bitmap
+    spot_bitmap.init_app(app)
+
+    from backend.group_commit import group_committer
+    group_committer.init_app(app)
+
+    from backend.events import event_bus
+    event_bus.init_app(app)
+
+    from backend.principals import principal_cache
+    principal_cache.init_app(app)
+
+    from backend.lot_search import lot_index
+    lot_index.init_app(app)
+
+    from backend.passwords import password_hasher
+    password_hasher.init_app(app)
+
+    from backend.admission import admission
+    admission.init_app(app)
+
+    from backend import metrics
+    metrics.init_app(app)
+
+    from backend import http_cache
+    http_cache.init_app(app)
 
     # ✅ Blueprints
     from backend.routes import bp
     app.register_blueprint(bp)
 
+    # ✅ CLI
+    from backend.shards import init_shards_command
+    app.cli.add_command(init_shards_command)
+
+    from backend.bootstrap import bootstrap, bootstrap_command
+    app.cli.add_command(bootstrap_command)
+
+    if app.config["AUTO_BOOTSTRAP"]:
+        with app.app_context():
+            bootstrap()
+
     return app
@@ -0,0 +1,249 @@
+# backend/admission.py
+"""
+Admission control for the API blueprint.
+
+Runs as a ``before_request`` hook on ``bp``, ahead of ``token_required``,
+for every view that decorator protects. Requests that would only add to
+an overload are turned away before they reach the database:
+
+- Token buckets: one per user (``ADMISSION_USER_RATE`` requests/s, burst
+  ``ADMISSION_USER_BURST``; admins are not limited) and one per route
+  shared by every caller (``ADMISSION_ROUTE_LIMITS``, e.g.
+  ``"book_spot=200/400"`` for 200/s with a burst of 400). A request takes
+  a token from all of its buckets or from none; when one is empty the
+  answer is 429 with the seconds until a token is back as Retry-After.
+- Concurrency limits: at most N requests of each route listed in
+  ``ADMISSION_CONCURRENCY`` (``"book_spot=32,bulk_release=2"``) run at
+  once in this process. The next one gets a 503 straight away instead of
+  queueing on row locks and pool connections behind the ones in flight,
+  so admitted bookings keep their latency during a spike.
+
+Buckets live in this process ("memory") or in Redis ("redis", shared by
+every worker, one script call per request). A Redis error trips a short
+breaker during which each process falls back to its own buckets, so the
+limits keep holding, per worker, instead of failing open.
+"""
+import logging
+import math
+import threading
+import time
+
+import redis
+from flask import current_app, g, jsonify, request
+
+from backend import metrics
+
+log = logging.getLogger(__name__)
+
+MAX_MEMORY_BUCKETS = 100000
+
+metrics.METRICS.update({
+    "parking_admission_total": ("counter", "Admission decisions by endpoint and result (admitted/throttled/shed)."),
+})
+
+
+def parse_limits(spec, parse=int):
+    """``"book_spot=32,release_spot=16"`` -> {"book_spot": 32, ...}."""
+    limits = {}
+    for entry in filter(None, (e.strip() for e in (spec or "").split(","))):
+        name, _, value = entry.partition("=")
+        if not value:
+            raise ValueError(f"admission limit must look like 'route=value', got {entry!r}")
+        limits[name.strip()] = parse(value.strip())
+    return limits
+
+
+def parse_rate(value):
+    """``"200/400"`` -> (200.0, 400); a bare rate gets a burst of one second's worth."""
+    rate, _, burst = value.partition("/")
+    rate = float(rate)
+    return rate, int(burst) if burst else max(1, math.ceil(rate))
+
+
+# --------------------
+# BACKENDS
+# --------------------
+class MemoryBuckets:
+    """Token buckets held in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> (tokens, updated at, full again at)
+
+    def _prune(self, now):
+        # a bucket that has refilled is the same as no bucket
+        self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+
+    def take(self, buckets):
+        """
+        Take one token from each (key, rate, burst), or none at all.
+        Returns 0 if admitted, else the seconds until every bucket has one.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) > MAX_MEMORY_BUCKETS:
+                self._prune(now)
+            levels, wait = [], 0.0
+            for key, rate, burst in buckets:
+                tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+                tokens = min(burst, tokens + (now - updated) * rate)
+                levels.append(tokens)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+            taken = 0 if wait else 1
+            for (key, rate, burst), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens - taken, now, now + (burst - tokens + taken) / rate)
+            return wait
+
+
+# Same algorithm as MemoryBuckets.take, atomically, on Redis' clock.
+TAKE_SCRIPT = """
+local now = redis.call("TIME")
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local levels, wait = {}, 0
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call("HMGET", key, "tokens", "ts")
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    if tokens < 1 then wait = math.max(wait, (1 - tokens) / rate) end
+end
+local taken = 1
+if wait > 0 then taken = 0 end
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    redis.call("HSET", key, "tokens", levels[i] - taken, "ts", now)
+    redis.call("PEXPIRE", key, math.ceil(burst / rate * 1000) + 1000)
+end
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared by every worker: one hash per bucket, updated by a script."""
+
+    prefix = "parking:admission"
+
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._take = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self, buckets):
+        keys = [f"{self.prefix}:{key}" for key, _, _ in buckets]
+        args = [value for _, rate, burst in buckets for value in (rate, burst)]
+        return float(self._take(keys=keys, args=args))
+
+
+# --------------------
+# ADMISSION
+# --------------------
+class AdmissionControl:
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.fallback = MemoryBuckets()
+        self.user_rate = 20.0
+        self.user_burst = 40
+        self.route_limits = {}
+        self.concurrency = {}
+        self.retry_after = 30
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get("ADMISSION", "redis")
+        self.user_rate = app.config.get("ADMISSION_USER_RATE", 20.0)
+        self.user_burst = app.config.get("ADMISSION_USER_BURST", 40)
+        self.route_limits = parse_limits(app.config.get("ADMISSION_ROUTE_LIMITS", ""), parse_rate)
+        self.concurrency = parse_limits(app.config.get("ADMISSION_CONCURRENCY", ""))
+        self.retry_after = app.config.get("ADMISSION_RETRY_AFTER", 30)
+        self.fallback = MemoryBuckets()
+        self._down_until = 0.0
+        self._in_flight = {}
+
+        if kind == "redis":
+            self.backend = RedisBuckets(app.config["ADMISSION_REDIS_URL"])
+        elif kind == "memory":
+            self.backend = self.fallback
+        else:
+            self.backend = None
+
+        app.extensions["admission"] = self
+
+    def protect(self, bp, principal):
+        """
+        Admit requests to ``bp``'s ``token_required`` views. ``principal()``
+        names the caller's bucket ("user:7", "ip:10.0.0.1") or returns
+        None for callers without a per-user limit.
+        """
+        bp.before_request(lambda: self._admit(principal))
+        bp.teardown_request(self._release)
+
+    # --------------------
+    # BUCKETS
+    # --------------------
+    def _take(self, buckets):
+        if time.monotonic() >= self._down_until:
+            try:
+                return self.backend.take(buckets)
+            except redis.RedisError as e:
+                log.warning("Admission buckets unavailable, using per-process buckets: %s", e)
+                self._down_until = time.monotonic() + self.retry_after
+        return self.fallback.take(buckets)
+
+    # --------------------
+    # CONCURRENCY
+    # --------------------
+    def _enter(self, route, limit):
+        with self._lock:
+            if self._in_flight.get(route, 0) >= limit:
+                return False
+            self._in_flight[route] = self._in_flight.get(route, 0) + 1
+            return True
+
+    def _release(self, exc=None):
+        route = g.pop("_admission_slot", None)
+        if route is not None:
+            with self._lock:
+                self._in_flight[route] -= 1
+
+    # --------------------
+    # HOOK
+    # --------------------
+    def _reject(self, endpoint, result, status, message, retry_after):
+        metrics.registry.inc("parking_admission_total", {"endpoint": endpoint, "result": result})
+        return jsonify({"error": message}), status, {"Retry-After": str(max(1, math.ceil(retry_after)))}
+
+    def _admit(self, principal):
+        view = current_app.view_functions.get(request.endpoint)
+        if self.backend is None or not getattr(view, "admission_controlled", False):
+            return None
+        endpoint = request.endpoint
+        route = endpoint.rpartition(".")[2]
+
+        buckets = []
+        who = principal()
+        if who is not None and self.user_rate > 0:
+            buckets.append((who, self.user_rate, self.user_burst))
+        if route in self.route_limits:
+            buckets.append((f"route:{route}", *self.route_limits[route]))
+        if buckets:
+            wait = self._take(buckets)
+            if wait:
+                return self._reject(endpoint, "throttled", 429, "Too many requests, please retry", wait)
+
+        if route in self.concurrency:
+            if not self._enter(route, self.concurrency[route]):
+                return self._reject(endpoint, "shed", 503, "Server busy, please retry", 1)
+            g._admission_slot = route
+
+        metrics.registry.inc("parking_admission_total", {"endpoint": endpoint, "result": "admitted"})
+        return None
+
+
+admission = AdmissionControl()
@@ -0,0 +1,220 @@
+# backend/allocator.py
+"""
+Per-lot free-spot allocator for the booking path.
+
+Keeps a free list of spot ids for every lot so ``book_spot`` can pick a
+candidate in O(1) instead of scanning ``parking_spot`` under a row lock.
+The list is only a hint: the caller still claims the spot with a
+conditional UPDATE, so a stale entry can never cause a double booking.
+"""
+import logging
+import threading
+import time
+
+import redis
+from sqlalchemy import select
+
+from app_factory import db
+from backend import shards
+
+log = logging.getLogger(__name__)
+
+
+class AllocatorUnavailable(Exception):
+    """The backing store cannot be used right now; fall back to the DB path."""
+
+
+def free_spots_query(lot_id=None):
+    """(lot_id, spot id) of the free spots of one lot, or of every lot."""
+    from backend.models import ParkingSpot
+
+    stmt = select(ParkingSpot.lot_id, ParkingSpot.id).where(ParkingSpot.status == "A")
+    return stmt if lot_id is None else stmt.where(ParkingSpot.lot_id == lot_id)
+
+
+def _free_spot_ids(lot_id=None):
+    """Return {lot_id: [free spot ids]} straight from ``parking_spot``."""
+    stmt = free_spots_query(lot_id)
+    if lot_id is not None:
+        with shards.lot_shard(lot_id):
+            rows = db.session.execute(stmt).all()
+    else:
+        rows = [row for part in shards.scatter(lambda: db.session.execute(stmt).all()) for row in part]
+
+    free = {}
+    for lid, sid in rows:
+        free.setdefault(lid, []).append(sid)
+    return free
+
+
+# --------------------
+# BACKENDS
+# --------------------
+class MemoryBackend:
+    """Free lists held in this process (one set per lot)."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._free = {}
+        self._loaded_at = {}
+
+    def is_loaded(self, lot_id):
+        loaded_at = self._loaded_at.get(lot_id)
+        return loaded_at is not None and time.monotonic() - loaded_at < self.ttl
+
+    def load(self, lot_id, spot_ids):
+        with self._lock:
+            self._free[lot_id] = set(spot_ids)
+            self._loaded_at[lot_id] = time.monotonic()
+
+    def pop(self, lot_id):
+        with self._lock:
+            free = self._free.get(lot_id)
+            return free.pop() if free else None
+
+    def push(self, lot_id, spot_ids):
+        with self._lock:
+            if lot_id in self._free:
+                self._free[lot_id].update(spot_ids)
+
+    def remove(self, lot_id, spot_ids):
+        with self._lock:
+            if lot_id in self._free:
+                self._free[lot_id].difference_update(spot_ids)
+
+    def drop(self, lot_id):
+        with self._lock:
+            self._free.pop(lot_id, None)
+            self._loaded_at.pop(lot_id, None)
+
+
+class RedisBackend:
+    """Free lists shared by every worker, one Redis set per lot."""
+
+    prefix = "parking:alloc"
+
+    def __init__(self, url, ttl):
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def _keys(self, lot_id):
+        return f"{self.prefix}:{lot_id}:free", f"{self.prefix}:{lot_id}:ready"
+
+    def is_loaded(self, lot_id):
+        return bool(self.client.exists(self._keys(lot_id)[1]))
+
+    def load(self, lot_id, spot_ids):
+        free_key, ready_key = self._keys(lot_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(free_key)
+        if spot_ids:
+            pipe.sadd(free_key, *spot_ids)
+        pipe.set(ready_key, 1, ex=self.ttl)
+        pipe.execute()
+
+    def pop(self, lot_id):
+        spot_id = self.client.spop(self._keys(lot_id)[0])
+        return int(spot_id) if spot_id is not None else None
+
+    def push(self, lot_id, spot_ids):
+        self.client.sadd(self._keys(lot_id)[0], *spot_ids)
+
+    def remove(self, lot_id, spot_ids):
+        self.client.srem(self._keys(lot_id)[0], *spot_ids)
+
+    def drop(self, lot_id):
+        self.client.delete(*self._keys(lot_id))
+
+
+# --------------------
+# ALLOCATOR
+# --------------------
+class SpotAllocator:
+    """
+    Front door used by the routes. Every backend error trips a short
+    circuit breaker and surfaces as ``AllocatorUnavailable`` so the booking
+    path can drop back to the plain DB query.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.retry_after = 30
+        self._down_until = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get("SPOT_ALLOCATOR", "redis")
+        ttl = app.config.get("SPOT_ALLOCATOR_TTL", 300)
+        self.retry_after = app.config.get("SPOT_ALLOCATOR_RETRY_AFTER", 30)
+
+        if kind == "redis":
+            self.backend = RedisBackend(app.config["SPOT_ALLOCATOR_REDIS_URL"], ttl)
+        elif kind == "memory":
+            self.backend = MemoryBackend(ttl)
+        else:
+            self.backend = None
+
+        app.extensions["spot_allocator"] = self
+
+    def _call(self, fn, *args):
+        if self.backend is None or time.monotonic() < self._down_until:
+            raise AllocatorUnavailable()
+        try:
+            return fn(*args)
+        except redis.RedisError as e:
+            log.warning("Spot allocator unavailable, using DB path: %s", e)
+            self._down_until = time.monotonic() + self.retry_after
+            raise AllocatorUnavailable() from e
+
+    def _acquire(self, lot_id):
+        if not self.backend.is_loaded(lot_id):
+            self.backend.load(lot_id, _free_spot_ids(lot_id).get(lot_id, []))
+            return self.backend.pop(lot_id)
+
+        spot_id = self.backend.pop(lot_id)
+        if spot_id is None:
+            # Looks full: reload once so a missed release can't hide a free spot
+            self.backend.load(lot_id, _free_spot_ids(lot_id).get(lot_id, []))
+            spot_id = self.backend.pop(lot_id)
+        return spot_id
+
+    def acquire(self, lot_id):
+        """
+        Pop a candidate free spot id for the lot, or None if it is full.
+        Raises ``AllocatorUnavailable`` when the caller should query the DB.
+        """
+        return self._call(self._acquire, lot_id)
+
+    def _best_effort(self, fn, *args):
+        try:
+            self._call(fn, *args)
+        except AllocatorUnavailable:
+            pass  # lists are rebuilt from the DB once the TTL runs out
+
+    def release(self, lot_id, *spot_ids):
+        """Return spots to the lot's free list (after release or lot growth)."""
+        if spot_ids:
+            self._best_effort(lambda: self.backend.push(lot_id, spot_ids))
+
+    def forget(self, lot_id, *spot_ids):
+        """Remove spots that no longer exist from the lot's free list."""
+        if spot_ids:
+            self._best_effort(lambda: self.backend.remove(lot_id, spot_ids))
+
+    def drop_lot(self, lot_id):
+        self._best_effort(lambda: self.backend.drop(lot_id))
+
+    def rebuild(self):
+        """Reload every lot's free list from ``parking_spot``."""
+        def _rebuild():
+            from backend.models import ParkingLot
+            free = _free_spot_ids()
+            for (lot_id,) in db.session.execute(select(ParkingLot.id)):
+                self.backend.load(lot_id, free.get(lot_id, []))
+
+        self._best_effort(_rebuild)
+
+
+allocator = SpotAllocator()
@@ -0,0 +1,314 @@
+# backend/analytics.py
+"""
+Occupancy, revenue and stay-duration analytics for the admin dashboard.
+
+``refresh_rollups()`` (Celery beat, ``tasks.refresh_analytics``) reads
+only the reservations closed since the watermark, in (leaving_timestamp,
+id) order, spreads each stay over the UTC hours it covers with NumPy
+(no Python loop per reservation) and adds the totals into
+``lot_hourly_rollup``. Each batch's rollup update and watermark move
+commit together, and the watermark is advanced with a compare-and-set,
+so an overlapping run can't fold the same reservations twice.
+
+``series()`` and ``lot_totals()`` read the rollups for the admin
+endpoints; day buckets are aggregated from the hourly rows with pandas.
+Reservations still open are not counted until they close.
+"""
+import heapq
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, insert, update, and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from app_factory import db, cache
+from backend import shards
+from backend.models import (
+    ParkingLot, ParkingSpot, Reservation, ReservationArchive, LotHourlyRollup, AnalyticsWatermark,
+)
+
+log = logging.getLogger(__name__)
+
+WATERMARK = "lot_hourly_rollup"
+ROLLUP_BATCH = 20000
+# Closes younger than this wait for the next run, so a release that commits
+# just after a later one is not left behind the watermark
+SETTLE = timedelta(minutes=2)
+
+TOTALS = ["occupied_seconds", "revenue", "stays", "stay_seconds"]
+BUCKETS = {"hour": ("h", 3600, timedelta(days=31)), "day": ("D", 86400, timedelta(days=366))}  # freq, seconds, max range
+SERIES_KEY = "analytics:{}:{}:{}:{}:{}"
+SERIES_TTL = 3600
+
+
+def _safe(fn, default=None):
+    try:
+        return fn()
+    except Exception as e:
+        log.warning("Analytics cache unavailable: %s", e)
+        return default
+
+
+# --------------------
+# VECTORIZED ROLLUP
+# --------------------
+def hourly_totals(frame):
+    """
+    ``frame`` has one closed stay per row (lot_id, start, end, cost).
+    Returns one row per (lot_id, hour) with TOTALS: occupied seconds and
+    revenue split by each stay's overlap with the hour, and the stay
+    counted (with its full duration) in the hour it ended.
+    """
+    end = frame["end"].to_numpy("datetime64[ns]")
+    start = np.minimum(frame["start"].fillna(frame["end"]).to_numpy("datetime64[ns]"), end)
+    cost = frame["cost"].fillna(0).to_numpy(float)
+    lots = frame["lot_id"].to_numpy(np.int64)
+    duration = (end - start) / np.timedelta64(1, "s")
+
+    first = start.astype("datetime64[h]")
+    spans = (end.astype("datetime64[h]") - first).astype(np.int64) + 1  # hours each stay touches
+    row = np.repeat(np.arange(len(frame)), spans)
+    offset = np.arange(len(row)) - np.repeat(np.cumsum(spans) - spans, spans)
+    hour = (first[row] + offset.astype("timedelta64[h]")).astype("datetime64[ns]")
+
+    overlap = (np.minimum(end[row], hour + np.timedelta64(1, "h")) - np.maximum(start[row], hour)) / np.timedelta64(1, "s")
+    share = np.divide(overlap, duration[row], out=np.ones_like(overlap), where=duration[row] > 0)
+    ended = offset == spans[row] - 1
+
+    pieces = pd.DataFrame({
+        "lot_id": lots[row],
+        "hour": hour,
+        "occupied_seconds": overlap,
+        "revenue": cost[row] * share,
+        "stays": ended.astype(np.int64),
+        "stay_seconds": np.where(ended, duration[row], 0.0),
+    })
+    return pieces.groupby(["lot_id", "hour"], as_index=False, sort=False).sum()
+
+
+def _closed_after(model, mark, until):
+    ts, rid = mark
+    stmt = select(model.id, model.parking_timestamp, model.leaving_timestamp, model.total_cost).where(
+        model.leaving_timestamp.is_not(None), model.leaving_timestamp < until
+    )
+    if ts is not None:
+        stmt = stmt.where(or_(model.leaving_timestamp > ts, and_(model.leaving_timestamp == ts, model.id > rid)))
+    return stmt.order_by(model.leaving_timestamp, model.id)
+
+
+def closed_batch_queries(mark, until, limit):
+    """(hot, archive) statements for the next ``limit`` stays closed after ``mark``, with lot ids."""
+    R, A = Reservation, ReservationArchive
+    hot = (
+        _closed_after(R, mark, until)
+        .add_columns(ParkingSpot.lot_id)
+        .outerjoin(ParkingSpot, ParkingSpot.id == R.spot_id)
+        .limit(limit)
+    )
+    cold = _closed_after(A, mark, until).add_columns(A.lot_id).limit(limit)
+    return hot, cold
+
+
+def _closed_batch(mark, until, limit):
+    """
+    The next ``limit`` closed stays after ``mark`` across the hot and
+    archive tables, in close order. Hot is read first: a row archived in
+    between is then seen twice (dropped below) rather than not at all.
+    """
+    hot, cold = closed_batch_queries(mark, until, limit)
+    sources = [*shards.each(lambda: db.session.execute(hot).all()), db.session.execute(cold).all()]
+    rows = list(heapq.merge(*sources, key=lambda r: (r.leaving_timestamp, r.id)))[:limit]
+
+    frame = pd.DataFrame(rows, columns=["id", "start", "end", "cost", "lot_id"])
+    return frame.drop_duplicates("id")
+
+
+def _add_to_rollup(totals):
+    """Add ``totals`` into the stored rows: one read, bulk UPDATE by key, bulk INSERT."""
+    H = LotHourlyRollup
+    existing = pd.DataFrame(
+        db.session.execute(
+            select(H.lot_id, H.hour, *(getattr(H, c) for c in TOTALS))
+            .where(H.lot_id.in_(totals["lot_id"].unique().tolist()),
+                   H.hour >= totals["hour"].min().to_pydatetime(),
+                   H.hour <= totals["hour"].max().to_pydatetime())
+        ).all(),
+        columns=["lot_id", "hour"] + TOTALS,
+    )
+    existing = existing.astype({"hour": "datetime64[ns]", **{c: float for c in TOTALS}})
+    merged = totals.merge(existing, on=["lot_id", "hour"], how="left", suffixes=("", "_old"), indicator=True)
+    for column in TOTALS:
+        merged[column] += merged[f"{column}_old"].fillna(0)
+    merged["stays"] = merged["stays"].astype(np.int64)
+
+    found = merged["_merge"] == "both"
+    columns = ["lot_id", "hour"] + TOTALS
+    if found.any():
+        db.session.execute(update(H), merged.loc[found, columns].to_dict("records"))
+    if (~found).any():
+        db.session.execute(insert(H), merged.loc[~found, columns].to_dict("records"))
+
+
+def _watermark():
+    row = db.session.get(AnalyticsWatermark, WATERMARK)
+    if row is None:
+        db.session.add(AnalyticsWatermark(name=WATERMARK, leaving_timestamp=None, reservation_id=0))
+        try:
+            db.session.commit()
+        except IntegrityError:  # another run created it first
+            db.session.rollback()
+        row = db.session.get(AnalyticsWatermark, WATERMARK)
+    return row.leaving_timestamp, row.reservation_id
+
+
+def _advance(mark, new_mark):
+    """Move the watermark only if nobody else did since we read it."""
+    W = AnalyticsWatermark
+    moved = db.session.execute(
+        update(W)
+        .where(W.name == WATERMARK,
+               W.leaving_timestamp.is_not_distinct_from(mark[0]),
+               W.reservation_id == mark[1])
+        .values(leaving_timestamp=new_mark[0], reservation_id=new_mark[1], updated_at=datetime.utcnow())
+    )
+    return moved.rowcount == 1
+
+
+def refresh_rollups(batch=ROLLUP_BATCH, now=None):
+    """Fold reservations closed since the watermark into the rollups. Returns a short report."""
+    until = (now or datetime.utcnow()) - SETTLE
+    mark = _watermark()
+    folded = 0
+
+    while True:
+        frame = _closed_batch(mark, until, batch)
+        if frame.empty:
+            break
+
+        stays = frame.dropna(subset=["lot_id"])  # spot gone and never archived: nothing to attribute
+        if not stays.empty:
+            _add_to_rollup(hourly_totals(stays))
+
+        last = frame.iloc[-1]
+        new_mark = (last["end"].to_pydatetime(), int(last["id"]))
+        if not _advance(mark, new_mark):
+            db.session.rollback()
+            log.warning("Analytics watermark moved by another run; stopping this one")
+            break
+        db.session.commit()
+
+        folded += len(frame)
+        mark = new_mark
+        if len(frame) < batch:
+            break
+
+    if folded:
+        log.info("Folded %s closed reservations into the analytics rollups", folded)
+    return {"folded": folded, "watermark": mark[0].isoformat() if mark[0] else None}
+
+
+# --------------------
+# READS
+# --------------------
+def default_range(bucket, now=None):
+    """The last 7 days of hours or 30 days of days, ending with the current one."""
+    freq, _, _ = BUCKETS[bucket]
+    end = pd.Timestamp(now or datetime.utcnow()).floor(freq) + pd.Timedelta(1, freq)
+    return (end - pd.Timedelta(7 if bucket == "hour" else 30, "D")).to_pydatetime(), end.to_pydatetime()
+
+
+def _validate(bucket, date_from, date_to):
+    if bucket not in BUCKETS:
+        raise ValueError("bucket must be hour or day")
+    if date_to <= date_from:
+        raise ValueError("to must be after from")
+    if date_to - date_from > BUCKETS[bucket][2]:
+        raise ValueError("range too long for this bucket")
+
+
+def rollup_query(date_from, date_to, lot_id=None):
+    H = LotHourlyRollup
+    stmt = select(H.lot_id, H.hour, *(getattr(H, c) for c in TOTALS)).where(H.hour >= date_from, H.hour < date_to)
+    return stmt if lot_id is None else stmt.where(H.lot_id == lot_id)
+
+
+def _rollup_frame(date_from, date_to, lot_id=None):
+    stmt = rollup_query(date_from, date_to, lot_id)
+    frame = pd.DataFrame(db.session.execute(stmt).all(), columns=["lot_id", "hour"] + TOTALS)
+    # typed even when empty: an empty frame's columns are object, which .round() rejects
+    return frame.astype({"lot_id": np.int64, "hour": "datetime64[ns]", **{c: float for c in TOTALS}})
+
+
+def _capacity(lot_id=None):
+    stmt = select(ParkingLot.id, ParkingLot.number_of_spots)
+    if lot_id is not None:
+        stmt = stmt.where(ParkingLot.id == lot_id)
+    return dict(db.session.execute(stmt).all())
+
+
+def _rates(frame, spot_seconds):
+    """Derived columns shared by the series and the per-lot totals."""
+    occupied = frame["occupied_seconds"]
+    return {
+        "occupied_hours": (occupied / 3600).round(2),
+        "occupancy_rate": (occupied / spot_seconds).where(spot_seconds > 0).round(4),
+        "revenue": frame["revenue"].round(2),
+        "stays": frame["stays"].astype(np.int64),
+        "avg_stay_minutes": (frame["stay_seconds"] / frame["stays"] / 60).where(frame["stays"] > 0).round(1),
+    }
+
+
+def _records(columns):
+    frame = pd.DataFrame(columns).astype(object)
+    return frame.where(frame.notna(), None).to_dict("records")
+
+
+def series(bucket="hour", date_from=None, date_to=None, lot_id=None):
+    """
+    One point per hour/day in [date_from, date_to) for one lot or all lots
+    together, empty buckets included. Cached until the next refresh.
+    """
+    if date_from is None or date_to is None:
+        default_from, default_to = default_range(bucket)
+        date_from, date_to = date_from or default_from, date_to or default_to
+    _validate(bucket, date_from, date_to)
+
+    mark = db.session.get(AnalyticsWatermark, WATERMARK)
+    key = SERIES_KEY.format(mark.reservation_id if mark else 0, bucket, lot_id, date_from.isoformat(), date_to.isoformat())
+    points = _safe(lambda: cache.get(key))
+    if points is not None:
+        return points
+
+    freq, seconds, _ = BUCKETS[bucket]
+    frame = _rollup_frame(date_from, date_to, lot_id)
+    index = pd.date_range(pd.Timestamp(date_from).floor(freq), date_to, freq=freq, inclusive="left")
+    totals = (
+        frame.assign(hour=frame["hour"].dt.floor(freq))
+        .groupby("hour")[TOTALS].sum()
+        .reindex(index, fill_value=0)
+        .astype(float)
+    )
+    spots = sum(_capacity(lot_id).values())
+    columns = {"t": [t.isoformat() for t in totals.index]}
+    columns.update(_rates(totals, pd.Series(spots * seconds, index=totals.index)))
+    points = _records(columns)
+
+    _safe(lambda: cache.set(key, points, timeout=SERIES_TTL))
+    return points
+
+
+def lot_totals(date_from, date_to):
+    """Per-lot totals over [date_from, date_to), busiest first."""
+    _validate("day", date_from, date_to)
+    frame = _rollup_frame(date_from, date_to)
+    totals = frame.groupby("lot_id")[TOTALS].sum()
+    if totals.empty:
+        return []
+
+    capacity = pd.Series(_capacity(), dtype=float).reindex(totals.index, fill_value=0).astype(float)
+    spot_seconds = capacity * (date_to - date_from).total_seconds()
+    columns = {"lot_id": totals.index.astype(int)}
+    columns.update(_rates(totals, spot_seconds))
+    return sorted(_records(columns), key=lambda r: -(r["occupied_hours"] or 0))
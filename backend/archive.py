@@ -0,0 +1,97 @@
+# backend/archive.py
+"""
+Hot/cold split of reservation history.
+
+``archive_closed()`` moves reservations that closed more than
+``RESERVATION_ARCHIVE_DAYS`` ago from ``reservation`` into
+``reservation_archive`` in id-ordered batches (INSERT ... SELECT then
+DELETE, one transaction per batch), so the hot table only holds active
+and recent rows. History pages, summaries and CSV exports read both
+tables; callers see one history.
+
+With sharding on, each shard is drained in turn: its rows are read off the
+shard and inserted into the primary's archive (skipping ids already
+there, so a batch whose shard DELETE failed is simply moved again).
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, literal
+
+from app_factory import db
+from backend import shards
+from backend.models import ParkingLot, ParkingSpot, Reservation, ReservationArchive
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_BATCH = 5000
+COLUMNS = ["id", "spot_id", "user_id", "lot_id", "lot_name",
+           "parking_timestamp", "leaving_timestamp", "total_cost", "archived_at"]
+
+
+def _archivable_ids(cutoff, limit):
+    return db.session.execute(
+        select(Reservation.id)
+        .where(Reservation.leaving_timestamp.is_not(None), Reservation.leaving_timestamp < cutoff)
+        .order_by(Reservation.id)
+        .limit(limit)
+    ).scalars().all()
+
+
+def _move_joined(ids, now):
+    """One database: INSERT ... SELECT with the lot name joined in."""
+    R = Reservation
+    rows = (
+        select(R.id, R.spot_id, R.user_id, ParkingSpot.lot_id, ParkingLot.prime_location_name,
+               R.parking_timestamp, R.leaving_timestamp, R.total_cost, literal(now))
+        .outerjoin(ParkingSpot, ParkingSpot.id == R.spot_id)
+        .outerjoin(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
+        .where(R.id.in_(ids))
+    )
+    db.session.execute(insert(ReservationArchive.__table__).from_select(COLUMNS, rows))
+
+
+def _move_sharded(ids, now):
+    """Reservations on the current shard -> the primary's archive."""
+    R = Reservation
+    rows = db.session.execute(
+        select(R.id, R.spot_id, R.user_id, ParkingSpot.lot_id, R.parking_timestamp, R.leaving_timestamp, R.total_cost)
+        .outerjoin(ParkingSpot, ParkingSpot.id == R.spot_id)
+        .where(R.id.in_(ids))
+    ).all()
+    archived = set(db.session.execute(
+        select(ReservationArchive.id).where(ReservationArchive.id.in_(ids))
+    ).scalars())
+    names = shards.lot_names(row.lot_id for row in rows)
+    values = [
+        dict(zip(COLUMNS, (rid, spot_id, user_id, lot_id, names.get(lot_id), parked, left, cost, now)))
+        for rid, spot_id, user_id, lot_id, parked, left, cost in rows if rid not in archived
+    ]
+    if values:
+        db.session.execute(insert(ReservationArchive.__table__), values)
+
+
+def archive_closed(older_than_days, batch=ARCHIVE_BATCH):
+    """Move closed reservations older than the cutoff. Returns the number moved."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    now = datetime.utcnow()
+    move = _move_sharded if shards.enabled() else _move_joined
+    moved = 0
+
+    def drain():
+        nonlocal moved
+        while True:
+            ids = _archivable_ids(cutoff, batch)
+            if not ids:
+                break
+            move(ids, now)
+            if shards.enabled():
+                db.session.commit()  # the primary's copy is durable before the shard deletes
+            db.session.execute(delete(Reservation.__table__).where(Reservation.id.in_(ids)))
+            db.session.commit()
+            moved += len(ids)
+
+    shards.each(drain)
+    if moved:
+        log.info("Archived %s reservations closed before %s", moved, cutoff.isoformat())
+    return moved
@@ -0,0 +1,102 @@
+# backend/bootstrap.py
+"""
+One-time database bootstrap, run at deploy time (``flask --app run
+bootstrap``) instead of on the first request of every worker.
+
+Brings the schema to the latest migration, makes sure the default admin
+exists and recomputes the stored counters. Safe to re-run. With
+``DATABASE_SHARDS`` set, the shards' tables are created as well.
+"""
+import click
+from flask.cli import with_appcontext
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+
+from app_factory import db
+from backend import counters, shards
+from backend.allocator import allocator
+from backend.models import User
+
+INITIAL_REVISION = "0001_initial"
+
+# Newest first: the revision a create_all() database is at when it has this table, index or column
+SCHEMA_MARKERS = [
+    ("0007_lot_counters", "table", "lot_counter"),
+    ("0006_analytics_rollups", "table", "lot_hourly_rollup"),
+    ("0005_reservation_archive", "table", "reservation_archive"),
+    ("0004_history_keyset_index", "index", ("reservation", "ix_reservation_user_parked")),
+    ("0003_hot_path_indexes", "index", ("parking_spot", "ix_parking_spot_lot_status")),
+    ("0002_counters_token_version", "column", ("users", "token_version")),
+]
+
+
+def detect_revision(inspector):
+    """The newest revision whose schema changes are all present, at least INITIAL_REVISION."""
+    tables = set(inspector.get_table_names())
+    for revision, kind, marker in SCHEMA_MARKERS:
+        if kind == "table":
+            found = marker in tables
+        elif kind == "index":
+            table, name = marker
+            found = table in tables and name in {i["name"] for i in inspector.get_indexes(table)}
+        else:
+            table, name = marker
+            found = table in tables and name in {c["name"] for c in inspector.get_columns(table)}
+        if found:
+            return revision
+    return INITIAL_REVISION
+
+
+def migrate_schema():
+    """
+    ``alembic upgrade head``. Databases created by ``db.create_all()``
+    before migrations existed are first stamped with the revision their
+    schema matches, so upgrade neither recreates their tables nor skips
+    the migrations they are missing.
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    if "users" in tables and "alembic_version" not in tables:
+        stamp(revision=detect_revision(inspector))
+    upgrade()
+
+
+def ensure_admin():
+    if User.query.filter_by(role="admin").first():
+        return False
+
+    admin = User(username="admin", email="admin@parking.com", role="admin")
+    admin.set_password("admin123")
+    db.session.add(admin)
+    try:
+        db.session.commit()
+    except IntegrityError:  # another process created it first
+        db.session.rollback()
+        return False
+    return True
+
+
+def bootstrap(create_all=False):
+    """Schema, default admin, counters and allocator. Returns a short report."""
+    if create_all:
+        db.create_all(bind_key=None)  # the primary; shard tables come from init_schema below
+    else:
+        migrate_schema()
+    if shards.enabled():
+        shards.init_schema()
+
+    created = ensure_admin()
+    reconciled = counters.reconcile()
+    allocator.rebuild()
+    return {"admin_created": created, "drifted_lots": reconciled["drifted_lots"]}
+
+
+@click.command("bootstrap")
+@with_appcontext
+@click.option("--create-all", is_flag=True, help="Use db.create_all() instead of running migrations.")
+def bootstrap_command(create_all):
+    """Create/upgrade the schema, the default admin and the counters."""
+    report = bootstrap(create_all=create_all)
+    click.echo(f"Bootstrap done: admin created={report['admin_created']}, "
+               f"lots with drifted counters={report['drifted_lots']}")
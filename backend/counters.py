@@ -0,0 +1,194 @@
+# backend/counters.py
+"""
+Denormalized occupancy counters.
+
+Every lot has one ``lot_counter`` row (free and occupied spots) in the
+same database as its spots: the primary, or the lot's shard. It is bumped
+with a relative UPDATE in the same transaction as the spot change, so a
+booking locks only its own lot's row on its own database and no global
+row serializes bookings across lots. The dashboard's spot totals are the
+sum of those rows (one small aggregate per database); the lot and user
+totals, which only change on lot CRUD and registration, stay in the
+single ``ParkingStats`` row.
+
+``reconcile()`` is run periodically from tasks.py to detect and repair
+any drift.
+"""
+import logging
+
+from sqlalchemy import select, insert, update, delete, func
+
+from app_factory import db
+from backend import http_cache, shards
+from backend.models import User, ParkingLot, ParkingSpot, ParkingStats, LotCounter
+
+log = logging.getLogger(__name__)
+
+STATS_ID = 1
+ID_CHUNK = 500
+
+
+def adjust(lot_id=None, available=0, occupied=0, lots=0, users=0):
+    """
+    Apply counter deltas inside the caller's transaction (not committed
+    here). Spot deltas go to the lot's counter: call inside its ``shards.lot_shard()``.
+    """
+    if lot_id is not None and (available or occupied):
+        db.session.execute(
+            update(LotCounter)
+            .where(LotCounter.lot_id == lot_id)
+            .values(
+                available_count=LotCounter.available_count + available,
+                occupied_count=LotCounter.occupied_count + occupied,
+            )
+        )
+
+    if lots or users:
+        db.session.execute(
+            update(ParkingStats)
+            .where(ParkingStats.id == STATS_ID)
+            .values(
+                total_lots=ParkingStats.total_lots + lots,
+                registered_users=ParkingStats.registered_users + users,
+            )
+        )
+
+
+def add_lots(free):
+    """Counter rows for new lots, {lot_id: free spots}, each on its lot's shard (uncommitted)."""
+    for bind, lot_ids in shards.by_lot(free).items():
+        with shards.using(bind):
+            db.session.execute(insert(LotCounter), [
+                {"lot_id": lot_id, "available_count": free[lot_id], "occupied_count": 0} for lot_id in lot_ids
+            ])
+
+
+def drop_lot(lot_id):
+    """Remove a deleted lot's counter (uncommitted; call inside its ``lot_shard``)."""
+    db.session.execute(delete(LotCounter).where(LotCounter.lot_id == lot_id))
+
+
+def available_counts(lot_ids=None):
+    """{lot_id: free spots} of these lots, or of every lot."""
+    stmt = select(LotCounter.lot_id, LotCounter.available_count)
+    if lot_ids is None:
+        return {lot_id: n for part in shards.scatter(lambda: db.session.execute(stmt).all()) for lot_id, n in part}
+
+    counts = {}
+    for bind, ids in shards.by_lot(lot_ids).items():
+        with shards.using(bind):
+            for start in range(0, len(ids), ID_CHUNK):
+                counts.update(db.session.execute(stmt.where(LotCounter.lot_id.in_(ids[start:start + ID_CHUNK]))).all())
+    return counts
+
+
+def summary():
+    """Global totals for the admin dashboard: one row plus one aggregate per database."""
+    stats = db.session.get(ParkingStats, STATS_ID)
+    if stats is None:
+        # not bootstrapped yet: count instead of writing from a read (the session may be a replica's);
+        # the row is created by bootstrap and the reconcile_counters job
+        total_lots = db.session.execute(select(func.count(ParkingLot.id))).scalar()
+        registered_users = db.session.execute(registered_users_query()).scalar()
+    else:
+        total_lots, registered_users = stats.total_lots, stats.registered_users
+
+    spots = spot_totals_query()
+    parts = shards.scatter(lambda: db.session.execute(spots).one())
+    available, occupied = sum(a for a, _ in parts), sum(o for _, o in parts)
+    return {
+        "total_lots": total_lots,
+        "total_spots": available + occupied,
+        "available_spots": available,
+        "occupied_spots": occupied,
+        "registered_users": registered_users,
+    }
+
+
+def spot_totals_query():
+    return select(func.coalesce(func.sum(LotCounter.available_count), 0),
+                  func.coalesce(func.sum(LotCounter.occupied_count), 0))
+
+
+def _spot_count(status):
+    return (
+        select(func.count(ParkingSpot.id))
+        .where(ParkingSpot.lot_id == LotCounter.lot_id, ParkingSpot.status == status)
+        .scalar_subquery()
+    )
+
+
+def recount_query():
+    """Recount every drifted counter of the current database from its spots, in one UPDATE."""
+    true_available, true_occupied = _spot_count("A"), _spot_count("O")
+    return (
+        update(LotCounter)
+        .where((LotCounter.available_count != true_available) | (LotCounter.occupied_count != true_occupied))
+        .values(available_count=true_available, occupied_count=true_occupied)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def registered_users_query():
+    return select(func.count(User.id)).where(User.role == "user")
+
+
+def _recount(lot_ids):
+    """
+    Repair the counters on the current database, which holds the spots
+    of ``lot_ids``: add missing rows, drop rows of lots that are gone or
+    live elsewhere, and recount the ones that drifted in one UPDATE.
+    Returns the number of lots repaired.
+    """
+    wanted = set(lot_ids)
+    have = set(db.session.execute(select(LotCounter.lot_id)).scalars())
+    stale, missing = sorted(have - wanted), sorted(wanted - have)
+    for start in range(0, len(stale), ID_CHUNK):
+        db.session.execute(delete(LotCounter).where(LotCounter.lot_id.in_(stale[start:start + ID_CHUNK])))
+    if missing:
+        db.session.execute(insert(LotCounter), [
+            {"lot_id": lot_id, "available_count": 0, "occupied_count": 0} for lot_id in missing
+        ])
+
+    drifted = db.session.execute(recount_query()).rowcount
+    return drifted + len(stale)
+
+
+def reconcile():
+    """
+    Recompute every counter from the source tables, fix the ones that
+    drifted and commit. Each UPDATE reads and writes in one statement, on
+    the database holding both the spots and their counters, so concurrent
+    bookings are not overwritten with stale values.
+    """
+    lot_ids = db.session.execute(select(ParkingLot.id)).scalars().all()
+    placed = shards.by_lot(lot_ids)
+    drifted_lots = 0
+    for bind in shards.binds():
+        with shards.using(bind):
+            drifted_lots += _recount(placed.get(bind, []))
+
+    true_values = {
+        "total_lots": select(func.count(ParkingLot.id)).scalar_subquery(),
+        "registered_users": registered_users_query().scalar_subquery(),
+    }
+
+    stats = db.session.get(ParkingStats, STATS_ID)
+    if stats is None:
+        stats = ParkingStats(id=STATS_ID)
+        db.session.add(stats)
+        db.session.flush()
+
+    before = (stats.total_lots, stats.registered_users)
+    db.session.execute(
+        update(ParkingStats).where(ParkingStats.id == STATS_ID).values(**true_values)
+    )
+    db.session.commit()
+
+    db.session.refresh(stats)
+    after = (stats.total_lots, stats.registered_users)
+    if drifted_lots or before != after:
+        log.warning("Counter drift repaired: %s lots, totals %s -> %s", drifted_lots, before, after)
+        http_cache.bump("spots", "users")
+
+    return {"drifted_lots": drifted_lots, "totals_drifted": before != after, "stats": stats}
@@ -0,0 +1,128 @@
+# backend/engine.py
+"""
+Database engine profiles and read-replica routing.
+
+``DB_PROFILE`` picks the tuning applied in ``create_app``:
+- "auto" (default): "sqlite-wal" for SQLite URLs, "postgres-pool" otherwise
+- "sqlite-wal": WAL journal, synchronous=NORMAL, busy timeout, mmap, set
+  on every new connection, so dashboard reads no longer block on writers
+- "postgres-pool": sized pool with pre-ping and recycle
+- "default": SQLAlchemy defaults
+
+If ``DATABASE_REPLICA_URL`` is set it becomes the "replica" bind, and
+``RoutingSession`` sends SELECTs issued while serving GET/HEAD requests
+to it; flushes, DML, other methods and ``use_primary()`` blocks stay on
+the primary. Routes need no changes.
+
+Statements on sharded tables inside a ``shards.using()`` block go to
+that shard (backend/shards.py) before any of the above.
+"""
+import os
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = "replica"
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def resolve_profile(uri):
+    profile = os.getenv("DB_PROFILE", "auto")
+    if profile == "auto":
+        return "sqlite-wal" if uri.startswith("sqlite") else "postgres-pool"
+    return profile
+
+
+def engine_options(profile):
+    """SQLALCHEMY_ENGINE_OPTIONS for a profile."""
+    if profile == "sqlite-wal":
+        return {
+            # sqlite3's own lock wait, in seconds; the PRAGMA below covers reconnects
+            "connect_args": {"timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000) / 1000},
+        }
+    if profile == "postgres-pool":
+        return {
+            "pool_size": _env_int("DB_POOL_SIZE", 10),
+            "max_overflow": _env_int("DB_MAX_OVERFLOW", 20),
+            "pool_timeout": _env_int("DB_POOL_TIMEOUT", 10),
+            "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+            "pool_pre_ping": True,
+        }
+    return {}
+
+
+def sqlite_pragmas():
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+        "cache_size": -_env_int("SQLITE_CACHE_SIZE_KB", 64 * 1024),
+        "temp_store": "MEMORY",
+    }
+
+
+def install_sqlite_pragmas(engine):
+    """Apply the WAL profile's PRAGMAs on every new DBAPI connection."""
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def configure_engines(app, db):
+    """Attach per-connection tuning once the engines exist (after db.init_app)."""
+    if app.config["DB_PROFILE"] != "sqlite-wal":
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                install_sqlite_pragmas(engine)
+
+
+# --------------------
+# READ ROUTING
+# --------------------
+@contextmanager
+def use_primary():
+    """Force reads in this block to the primary (read-your-own-writes)."""
+    previous = g.get("_db_force_primary", False)
+    g._db_force_primary = True
+    try:
+        yield
+    finally:
+        g._db_force_primary = previous
+
+
+def _reads_may_use_replica():
+    return (
+        has_request_context()
+        and request.method in ("GET", "HEAD")
+        and not g.get("_db_force_primary", False)
+    )
+
+
+class RoutingSession(Session):
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        from backend import shards
+        shard = shards.current()
+        if bind is None and shard is not None and shards.routes(mapper, clause):
+            return self._db.engines[shard]
+
+        # only plain SELECTs move; flushes and UPDATE/INSERT/DELETE keep the primary
+        is_read = clause is None or getattr(clause, "is_select", False)
+        if bind is None and is_read and not self._flushing and _reads_may_use_replica():
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,151 @@
+# backend/events.py
+"""
+Live occupancy feed.
+
+Write routes publish small delta events (a spot changed status, a lot was
+created/updated/deleted) on a Redis pub/sub channel. Every web worker runs
+one listener thread that fans the channel out to its own SSE subscribers,
+so N open dashboards cost one Redis subscription per worker and
+O(changes) work instead of N full table scans per poll interval.
+If Redis is down, events are delivered to this worker's subscribers only.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+import redis
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "parking:events"
+RESYNC = json.dumps({"type": "resync"})
+
+
+class _Subscriber:
+    """Bounded mailbox for one SSE connection; overflowing asks the client to resync."""
+
+    def __init__(self, maxlen):
+        self.cond = threading.Condition()
+        self.items = deque()
+        self.maxlen = maxlen
+        self.overflowed = False
+
+    def put(self, message):
+        with self.cond:
+            if len(self.items) >= self.maxlen:
+                self.items.clear()
+                self.overflowed = True
+            self.items.append(message)
+            self.cond.notify()
+
+    def get(self, timeout):
+        with self.cond:
+            if not self.items:
+                self.cond.wait(timeout)
+            if self.overflowed:
+                self.overflowed = False
+                self.items.clear()
+                return RESYNC
+            return self.items.popleft() if self.items else None
+
+
+class EventBus:
+
+    def __init__(self, app=None):
+        self.url = None
+        self.client = None
+        self.heartbeat = 15
+        self.queue_size = 1000
+        self.retry_after = 30
+        self._down_until = 0.0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._listener = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.url = app.config["EVENTS_REDIS_URL"]
+        self.client = redis.Redis.from_url(self.url, socket_connect_timeout=0.5, socket_timeout=0.5)
+        self.heartbeat = app.config.get("EVENTS_HEARTBEAT", 15)
+        self.queue_size = app.config.get("EVENTS_QUEUE_SIZE", 1000)
+        app.extensions["event_bus"] = self
+
+    # --------------------
+    # PUBLISH
+    # --------------------
+    def publish(self, event):
+        message = json.dumps(event)
+        if self.client is not None and time.monotonic() >= self._down_until:
+            try:
+                self.client.publish(CHANNEL, message)
+                return
+            except redis.RedisError as e:
+                log.warning("Event bus unavailable, delivering locally: %s", e)
+                self._down_until = time.monotonic() + self.retry_after
+        self._deliver(message)
+
+    def _deliver(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.put(message)
+
+    # --------------------
+    # SUBSCRIBE
+    # --------------------
+    def _listen(self):
+        # Own connection without a read timeout: the channel may be quiet for long
+        client = redis.Redis.from_url(self.url, socket_connect_timeout=0.5, health_check_interval=30)
+        connected = False
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                connected = True
+                while True:
+                    msg = pubsub.get_message(timeout=30)
+                    if msg and msg["type"] == "message":
+                        self._deliver(msg["data"].decode("utf-8"))
+            except redis.RedisError as e:
+                if connected:
+                    log.warning("Event listener disconnected: %s", e)
+                    # Anything published meanwhile was lost: make clients resync
+                    self._deliver(RESYNC)
+                connected = False
+                time.sleep(5)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name="event-listener", daemon=True)
+                self._listener.start()
+
+    def subscribe(self):
+        """
+        Yield event messages (JSON strings) for one client, or None every
+        ``heartbeat`` seconds when nothing happened.
+        """
+        sub = _Subscriber(self.queue_size)
+        with self._lock:
+            self._subscribers.add(sub)
+        self._ensure_listener()
+        try:
+            while True:
+                yield sub.get(self.heartbeat)
+        finally:
+            with self._lock:
+                self._subscribers.discard(sub)
+
+
+event_bus = EventBus()
+
+
+def spot_changed(lot_id, spot_id, old, new):
+    event_bus.publish({"type": "spot", "lot_id": lot_id, "spot_id": spot_id, "from": old, "to": new})
+
+
+def lot_changed(lot_id, action):
+    event_bus.publish({"type": "lot", "lot_id": lot_id, "action": action})
@@ -0,0 +1,194 @@
+# backend/exports.py
+"""
+Reservation history CSV export.
+
+Rows come from one joined query over ``reservation`` and one over
+``reservation_archive``, streamed in batches and merged by id (no per-row
+lazy loads), and are written either straight into an HTTP response or into
+``exports/``. Written files carry a fingerprint of the user's history, so
+an unchanged history is served from the existing file instead of being
+rewritten. With sharding on, each shard's reservations are one more
+stream in the merge and lot names come from the primary.
+"""
+import csv
+import gzip
+import heapq
+import io
+import json
+import os
+import tempfile
+import zlib
+from contextlib import contextmanager
+from itertools import islice
+
+from sqlalchemy import select, func
+
+from app_factory import db
+from backend import shards
+from backend.models import ParkingLot, ParkingSpot, Reservation, ReservationArchive
+
+EXPORT_DIR = "exports"
+HEADER = ["ID", "Lot", "Spot", "Start", "End", "Cost"]
+BATCH = 1000
+
+
+def export_queries(user_id, names=True):
+    """
+    (hot, archive) rows of the user in id order. Hot rows carry the lot
+    name, or the lot id with ``names=False`` (sharding on).
+    """
+    R, A = Reservation, ReservationArchive
+    cold = (
+        select(A.id, A.lot_name, A.spot_id, A.parking_timestamp, A.leaving_timestamp, A.total_cost)
+        .where(A.user_id == user_id)
+        .order_by(A.id)
+        .execution_options(yield_per=BATCH)
+    )
+    lot = ParkingLot.prime_location_name if names else ParkingSpot.lot_id
+    hot = (
+        select(R.id, lot, R.spot_id, R.parking_timestamp, R.leaving_timestamp, R.total_cost)
+        .outerjoin(ParkingSpot, ParkingSpot.id == R.spot_id)
+        .where(R.user_id == user_id)
+        .order_by(R.id)
+        .execution_options(yield_per=BATCH)
+    )
+    if names:
+        hot = hot.outerjoin(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
+    return hot, cold
+
+
+def history_rows(user_id):
+    """(id, lot name, spot id, start, end, cost) for every reservation, hot and archived, streamed."""
+    if shards.enabled():
+        hot, cold = export_queries(user_id, names=False)
+        names = shards.lot_names()
+        hot_sources = [
+            ((rid, names.get(lot_id), *rest) for rid, lot_id, *rest in result)
+            for result in shards.each(lambda: db.session.execute(hot))
+        ]
+    else:
+        hot, cold = export_queries(user_id)
+        hot_sources = [db.session.execute(hot)]
+    merged = heapq.merge(db.session.execute(cold), *hot_sources, key=lambda row: row[0])
+    while True:
+        partition = list(islice(merged, BATCH))
+        if not partition:
+            break
+        yield partition
+
+
+def csv_chunks(user_id):
+    """CSV text, one chunk per batch of rows."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(HEADER)
+    for rows in history_rows(user_id):
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Gzip a stream of text chunks on the fly."""
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = gzip container
+    for chunk in chunks:
+        out = z.compress(chunk.encode("utf-8"))
+        if out:
+            yield out
+    yield z.flush()
+
+
+def hot_lots_query(user_id):
+    """Lots of the user's hot reservations (on the current database)."""
+    return (
+        select(ParkingSpot.lot_id)
+        .join(Reservation, Reservation.spot_id == ParkingSpot.id)
+        .where(Reservation.user_id == user_id)
+        .distinct()
+    )
+
+
+def _hot_lot_names(user_id):
+    """Checksum of the current names of the lots the user's hot reservations are in."""
+    stmt = hot_lots_query(user_id)
+    lot_ids = {lot_id for part in shards.each(lambda: db.session.execute(stmt).scalars().all()) for lot_id in part}
+    names = sorted(shards.lot_names(lot_ids).items()) if lot_ids else []
+    return zlib.crc32(json.dumps(names).encode("utf-8"))
+
+
+def fingerprint_queries(user_id):
+    """(hot, archive) count, newest id, closed count and newest close of the user."""
+    return tuple(
+        select(func.count(model.id), func.max(model.id), func.count(model.leaving_timestamp),
+               func.max(model.leaving_timestamp))
+        .where(model.user_id == user_id)
+        for model in (Reservation, ReservationArchive)
+    )
+
+
+def history_fingerprint(user_id):
+    """
+    Changes whenever a reservation is added or closed (index-only queries)
+    or a lot of a hot reservation is renamed; archiving does not change it
+    (archived rows keep the name the lot had when they were archived).
+    """
+    hot, cold = fingerprint_queries(user_id)
+    count = closed = 0
+    last_id = last_left = None
+    for n, top_id, n_closed, top_left in shards.union_rows(hot, cold):
+        count, closed = count + n, closed + n_closed
+        last_id = max(filter(None, (last_id, top_id)), default=None)
+        last_left = max(filter(None, (last_left, top_left)), default=None)
+    return f"{count}:{last_id}:{closed}:{last_left.isoformat() if last_left else ''}:{_hot_lot_names(user_id):08x}"
+
+
+def history_size(user_id):
+    hot, cold = (select(func.count(model.id)).where(model.user_id == user_id) for model in (Reservation, ReservationArchive))
+    return sum(n for n, in shards.union_rows(hot, cold))
+
+
+def write_export(user_id, compress=False):
+    """
+    Write (or reuse) ``exports/user_<id>_history.csv[.gz]``.
+    Returns (filename, path, reused).
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    filename = f"user_{user_id}_history.csv" + (".gz" if compress else "")
+    path = os.path.join(EXPORT_DIR, filename)
+    meta_path = path + ".meta"
+
+    fingerprint = history_fingerprint(user_id)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            if json.load(f).get("fingerprint") == fingerprint and os.path.exists(path):
+                return filename, path, True
+    except (OSError, ValueError):
+        pass
+
+    opener = gzip.open if compress else open
+    with _replacing(path) as tmp_path, opener(tmp_path, "wt", newline="", encoding="utf-8") as f:
+        for chunk in csv_chunks(user_id):
+            f.write(chunk)
+    with _replacing(meta_path) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint}, f)
+
+    return filename, path, False
+
+
+@contextmanager
+def _replacing(path):
+    """
+    A temp file of its own next to ``path``, moved over it on success, so
+    concurrent exports of the same user never write into each other.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,269 @@
+# backend/group_commit.py
+"""
+Group-commit booking for surge events (opt-in, ``BOOKING_GROUP_COMMIT``).
+
+Instead of one write transaction per ``book_spot`` request, bookings for
+an enabled lot are queued to a per-lot batcher thread. The batcher takes
+everything that arrived within ``BOOKING_BATCH_WINDOW_MS`` (up to
+``BOOKING_BATCH_MAX``), claims spots for all of them and commits the
+whole batch in one transaction, so the writer lock is taken once per
+batch instead of once per request.
+
+The request waits up to ``BOOKING_WAIT_MS`` for its ticket; if the batch
+is not done by then it gets a 202 with the ticket id and polls
+``/api/user/booking/<ticket>``. Results are kept in the cache so any
+worker can answer the poll, and in a small in-process map so the worker
+that ran the batch can answer it while the cache is down.
+
+Queues are per process: with several workers each one batches its own
+requests (the conditional UPDATE in ``claim_spot`` still guarantees no
+double booking across them). A lot's batcher thread exits after
+``BOOKING_BATCHER_IDLE_SECONDS`` without bookings, so threads follow the
+lots that are actually surging instead of every lot ever booked.
+"""
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app_factory import db, cache
+
+log = logging.getLogger(__name__)
+
+TICKET_KEY = "booking_ticket:{}"
+UNAVAILABLE = object()
+
+
+class QueueFull(Exception):
+    """Too many bookings waiting for this lot; the client should retry."""
+
+
+class Ticket:
+
+    def __init__(self, lot_id, user_id):
+        self.id = uuid.uuid4().hex
+        self.lot_id = lot_id
+        self.user_id = user_id
+        self.result = None
+        self._done = threading.Event()
+
+    def finish(self, result):
+        self.result = result
+        self._done.set()
+
+    def wait(self, timeout):
+        """The result dict, or None if the batch has not committed yet."""
+        self._done.wait(timeout)
+        return self.result
+
+
+def _safe(fn, default=None):
+    try:
+        return fn()
+    except Exception as e:
+        log.warning("Booking ticket cache unavailable: %s", e)
+        return default
+
+
+def active_users_query(user_ids):
+    """Those of ``user_ids`` with an active reservation (on the current database)."""
+    from backend.models import Reservation
+
+    return select(Reservation.user_id).where(Reservation.user_id.in_(user_ids), Reservation.leaving_timestamp.is_(None))
+
+
+class GroupCommitter:
+
+    def __init__(self, app=None):
+        self.app = None
+        self.lots = set()
+        self.all_lots = False
+        self.batch_max = 200
+        self.window = 0.01
+        self.queue_max = 5000
+        self.ticket_ttl = 300
+        self.idle_timeout = 30
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._tickets = OrderedDict()  # ticket id -> (expires_at, ticket), this process only
+        self.batches = self.booked = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        mode = str(app.config.get("BOOKING_GROUP_COMMIT", "off")).strip().lower()
+        self.all_lots = mode == "all"
+        self.lots = set() if mode in ("", "off", "all") else {int(x) for x in mode.split(",") if x.strip()}
+        self.batch_max = app.config.get("BOOKING_BATCH_MAX", 200)
+        self.window = app.config.get("BOOKING_BATCH_WINDOW_MS", 10) / 1000
+        self.queue_max = app.config.get("BOOKING_QUEUE_MAX", 5000)
+        self.ticket_ttl = app.config.get("BOOKING_TICKET_TTL", 300)
+        self.idle_timeout = app.config.get("BOOKING_BATCHER_IDLE_SECONDS", 30)
+        app.extensions["group_commit"] = self
+
+    def enabled_for(self, lot_id):
+        return self.all_lots or lot_id in self.lots
+
+    # --------------------
+    # QUEUEING
+    # --------------------
+    def _queue(self, lot_id):
+        """The lot's queue, starting its batcher if there is none (call under ``_lock``)."""
+        q = self._queues.get(lot_id)
+        if q is None:
+            q = self._queues[lot_id] = queue.Queue(maxsize=self.queue_max)
+            threading.Thread(target=self._run, args=(lot_id, q),
+                             name=f"booking-batcher-{lot_id}", daemon=True).start()
+        return q
+
+    def submit(self, lot_id, user_id):
+        ticket = Ticket(lot_id, user_id)
+        # under the lock, so an idle batcher can't retire the queue between lookup and put
+        with self._lock:
+            try:
+                self._queue(lot_id).put_nowait(ticket)
+            except queue.Full:
+                raise QueueFull(lot_id)
+            self._remember(ticket)
+        return ticket
+
+    def _remember(self, ticket):
+        now = time.monotonic()
+        while self._tickets and next(iter(self._tickets.values()))[0] < now:
+            self._tickets.popitem(last=False)
+        self._tickets[ticket.id] = (now + self.ticket_ttl, ticket)
+
+    def _retire(self, lot_id, q):
+        """Drop an idle lot's queue; False if a booking arrived meanwhile."""
+        with self._lock:
+            if not q.empty():
+                return False
+            if self._queues.get(lot_id) is q:
+                del self._queues[lot_id]
+            return True
+
+    def batchers(self):
+        with self._lock:
+            return len(self._queues)
+
+    def publish_pending(self, ticket):
+        """Make a still-running ticket visible to polls on other workers."""
+        pending = {"status": "pending", "user_id": ticket.user_id}
+        _safe(lambda: cache.add(TICKET_KEY.format(ticket.id), pending, timeout=self.ticket_ttl))
+
+    def lookup(self, ticket_id):
+        """
+        The ticket's result dict (with ``user_id``), None if unknown, or
+        ``UNAVAILABLE`` if it did not run here and the cache can't be read.
+        """
+        with self._lock:
+            entry = self._tickets.get(ticket_id)
+        if entry is not None:
+            ticket = entry[1]
+            return dict(ticket.result or {"status": "pending"}, user_id=ticket.user_id)
+        return _safe(lambda: cache.get(TICKET_KEY.format(ticket_id)), UNAVAILABLE)
+
+    # --------------------
+    # BATCHER
+    # --------------------
+    def _run(self, lot_id, q):
+        while True:
+            try:
+                batch = [q.get(timeout=self.idle_timeout)]
+            except queue.Empty:
+                if self._retire(lot_id, q):
+                    return
+                continue
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_max:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                with self.app.app_context():
+                    results = self._commit_batch(lot_id, batch)
+            except Exception:
+                log.exception("Booking batch for lot %s failed", lot_id)
+                results = [{"status": "failed", "error": "Booking failed, please retry", "code": 503}] * len(batch)
+
+            for ticket, result in zip(batch, results):
+                ticket.finish(result)
+            _safe(lambda: cache.set_many(
+                {TICKET_KEY.format(t.id): dict(t.result, user_id=t.user_id) for t in batch},
+                timeout=self.ticket_ttl,
+            ))
+
+    def _commit_batch(self, lot_id, batch):
+        """Claim spots for every ticket and commit them in one transaction."""
+        from backend import counters, events, http_cache, shards
+        from backend.allocator import allocator
+        from backend.history import invalidate_summary
+        from backend.lot_cache import invalidate_free
+        from backend.models import Reservation
+        from backend.routes import claim_spot
+        from backend.spot_bitmap import spot_bitmap
+
+        active_stmt = active_users_query({t.user_id for t in batch})
+        active = {user_id for part in shards.each(lambda: db.session.execute(active_stmt).scalars().all())
+                  for user_id in part}
+
+        now = datetime.utcnow()
+        results, booked = [], []
+        full = False
+        with shards.lot_shard(lot_id):
+            for ticket in batch:
+                if ticket.user_id in active:
+                    results.append({"status": "failed", "error": "You already have an active parking reservation", "code": 400})
+                    continue
+                spot_id = None if full else claim_spot(lot_id)
+                if not spot_id:
+                    full = True
+                    results.append({"status": "failed", "error": "No free spots", "code": 400})
+                    continue
+                active.add(ticket.user_id)
+                res = Reservation(spot_id=spot_id, user_id=ticket.user_id, parking_timestamp=now)
+                db.session.add(res)
+                booked.append(res)
+                results.append(res)
+
+            if booked:  # autoflushes the last reservation, so still on the lot's shard
+                counters.adjust(lot_id, available=-len(booked), occupied=len(booked))
+        try:
+            with shards.lot_shard(lot_id):
+                db.session.flush()  # reservation ids, read before commit expires them
+            results = [
+                {"status": "booked", "reservation_id": r.id, "spot_id": r.spot_id} if isinstance(r, Reservation) else r
+                for r in results
+            ]
+            claimed = [(res.spot_id, res.user_id) for res in booked]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if booked:
+                allocator.release(lot_id, *(res.spot_id for res in booked))
+            raise
+
+        if claimed:
+            invalidate_free(lot_id)
+            spot_bitmap.set(lot_id, [spot_id for spot_id, _ in claimed], True)
+            http_cache.bump("spots")
+            invalidate_summary(*(user_id for _, user_id in claimed))
+        for spot_id, _ in claimed:
+            events.spot_changed(lot_id, spot_id, "A", "O")
+        self.batches += 1
+        self.booked += len(booked)
+        return results
+
+
+group_committer = GroupCommitter()
@@ -0,0 +1,210 @@
+# backend/history.py
+"""
+Reservation history for ``/api/user/history``.
+
+Pages are fetched with keyset pagination on (parking_timestamp, id),
+newest first, in one joined query that also returns the lot name, so a
+page costs the same whatever its depth. Hot (``reservation``) and cold
+(``reservation_archive``) rows are read in one UNION ALL statement, each
+branch an index range scan merged in (parking_timestamp, id) order. The
+per-user totals shown above the table (reservations, completed, spend)
+are cached and dropped whenever one of the user's reservations is booked
+or released.
+
+With sharding on (backend/shards.py) the hot rows come from every shard,
+lot names from the primary, and the streams are merged here instead.
+"""
+import heapq
+import logging
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import select, func, and_, or_, union_all
+
+from app_factory import db, cache
+from backend import shards
+from backend.models import ParkingLot, ParkingSpot, Reservation, ReservationArchive
+
+log = logging.getLogger(__name__)
+
+PAGE_DEFAULT = 50
+PAGE_MAX = 500
+SUMMARY_KEY = "history_summary:{}"
+SUMMARY_TTL = 600
+
+
+def _safe(fn, default=None):
+    try:
+        return fn()
+    except Exception as e:
+        log.warning("History cache unavailable: %s", e)
+        return default
+
+
+# --------------------
+# CURSORS / FILTERS
+# --------------------
+def encode_cursor(parking_timestamp, reservation_id):
+    return f"{parking_timestamp.isoformat()}_{reservation_id}"
+
+
+def decode_cursor(cursor):
+    """(parking_timestamp, id); raises ValueError on a malformed cursor."""
+    ts, _, rid = cursor.rpartition("_")
+    return datetime.fromisoformat(ts), int(rid)
+
+
+def parse_day(value, end=False):
+    """
+    ``YYYY-MM-DD`` or an ISO datetime. A bare date used as the end of a
+    range covers the whole day.
+    """
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+# --------------------
+# PAGES
+# --------------------
+def _keyset(stmt, model, cursor, date_from, date_to):
+    """Apply keyset and date range on one source table."""
+    ts_col, id_col = model.parking_timestamp, model.id
+    if cursor:
+        ts, rid = cursor
+        stmt = stmt.where(or_(ts_col < ts, and_(ts_col == ts, id_col < rid)))
+    if date_from:
+        stmt = stmt.where(ts_col >= date_from)
+    if date_to:
+        stmt = stmt.where(ts_col < date_to)
+    return stmt
+
+
+def archive_rows_query(user_id, cursor=None, date_from=None, date_to=None, lot_id=None):
+    """The user's archived rows in the page's range (unordered)."""
+    A = ReservationArchive
+    cold = (
+        select(A.id, A.spot_id, A.lot_name, A.parking_timestamp, A.leaving_timestamp, A.total_cost)
+        .where(A.user_id == user_id)
+    )
+    if lot_id is not None:
+        cold = cold.where(A.lot_id == lot_id)
+    return _keyset(cold, A, cursor, date_from, date_to)
+
+
+def page_query(user_id, limit, cursor=None, date_from=None, date_to=None, lot_id=None):
+    """Sharding off: the newest ``limit + 1`` rows of hot and archive in one statement."""
+    R = Reservation
+    hot = (
+        select(R.id, R.spot_id, ParkingLot.prime_location_name.label("lot_name"),
+               R.parking_timestamp, R.leaving_timestamp, R.total_cost)
+        .outerjoin(ParkingSpot, ParkingSpot.id == R.spot_id)
+        .outerjoin(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
+        .where(R.user_id == user_id)
+    )
+    if lot_id is not None:
+        hot = hot.where(ParkingSpot.lot_id == lot_id)
+    page = union_all(
+        _keyset(hot, R, cursor, date_from, date_to),
+        archive_rows_query(user_id, cursor, date_from, date_to, lot_id),
+    ).subquery()
+    return select(page).order_by(page.c.parking_timestamp.desc(), page.c.id.desc()).limit(limit + 1)
+
+
+def shard_page_queries(user_id, limit, cursor=None, date_from=None, date_to=None, lot_id=None):
+    """
+    Sharding on: (newest ``limit + 1`` hot rows of one shard, with lot ids
+    instead of names; newest ``limit + 1`` archive rows).
+    """
+    R, A = Reservation, ReservationArchive
+    hot = (
+        select(R.id, R.spot_id, ParkingSpot.lot_id, R.parking_timestamp, R.leaving_timestamp, R.total_cost)
+        .outerjoin(ParkingSpot, ParkingSpot.id == R.spot_id)
+        .where(R.user_id == user_id)
+    )
+    if lot_id is not None:
+        hot = hot.where(ParkingSpot.lot_id == lot_id)
+    hot = _keyset(hot, R, cursor, date_from, date_to).order_by(R.parking_timestamp.desc(), R.id.desc()).limit(limit + 1)
+    cold = (
+        archive_rows_query(user_id, cursor, date_from, date_to, lot_id)
+        .order_by(A.parking_timestamp.desc(), A.id.desc())
+        .limit(limit + 1)
+    )
+    return hot, cold
+
+
+def _sharded_rows(user_id, limit, cursor, date_from, date_to, lot_id):
+    """The newest ``limit + 1`` rows of each shard and of the archive, merged."""
+    hot, cold = shard_page_queries(user_id, limit, cursor, date_from, date_to, lot_id)
+    if lot_id is not None:
+        with shards.lot_shard(lot_id):
+            parts = [db.session.execute(hot).all()]
+    else:
+        parts = shards.each(lambda: db.session.execute(hot).all())
+    names = shards.lot_names(row.lot_id for part in parts for row in part)
+    sources = [[(rid, spot_id, names.get(lid), *rest) for rid, spot_id, lid, *rest in part] for part in parts]
+    sources.append(db.session.execute(cold).all())
+    merged = heapq.merge(*sources, key=lambda row: (row[3], row[0]), reverse=True)
+    return list(islice(merged, limit + 1))
+
+
+def history_page(user_id, limit=PAGE_DEFAULT, cursor=None, date_from=None, date_to=None, lot_id=None):
+    """Returns (rows, next_cursor). ``date_to`` is exclusive."""
+    if shards.enabled():
+        rows = _sharded_rows(user_id, limit, cursor, date_from, date_to, lot_id)
+    else:
+        rows = db.session.execute(page_query(user_id, limit, cursor, date_from, date_to, lot_id)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_id, _, _, last_parked, _, _ = rows[-1]  # merged shard rows are plain tuples
+        next_cursor = encode_cursor(last_parked, last_id)
+
+    return [
+        {
+            "reservation_id": rid,
+            "spot_id": spot_id,
+            "lot_name": lot_name,
+            "parking_timestamp": parked.isoformat() if parked else None,
+            "leaving_timestamp": left.isoformat() if left else None,
+            "total_cost": float(cost) if cost is not None else None,
+        }
+        for rid, spot_id, lot_name, parked, left, cost in rows
+    ], next_cursor
+
+
+# --------------------
+# SUMMARY
+# --------------------
+def summary_queries(user_id):
+    """(hot, archive) count, closed count and spend of the user."""
+    return tuple(
+        select(func.count(model.id), func.count(model.leaving_timestamp), func.coalesce(func.sum(model.total_cost), 0))
+        .where(model.user_id == user_id)
+        for model in (Reservation, ReservationArchive)
+    )
+
+
+def _load_summary(user_id):
+    hot, cold = summary_queries(user_id)
+    total = completed = spent = 0
+    for n, closed, cost in shards.union_rows(hot, cold):
+        total, completed, spent = total + n, completed + closed, spent + float(cost)
+    return {"total_reservations": total, "completed": completed, "total_spent": round(spent, 2)}
+
+
+def history_summary(user_id):
+    key = SUMMARY_KEY.format(user_id)
+    summary = _safe(lambda: cache.get(key))
+    if summary is None:
+        summary = _load_summary(user_id)
+        _safe(lambda: cache.set(key, summary, timeout=SUMMARY_TTL))
+    return summary
+
+
+def invalidate_summary(*user_ids):
+    """A reservation of these users was booked or released."""
+    if user_ids:
+        _safe(lambda: cache.delete_many(*(SUMMARY_KEY.format(u) for u in user_ids)))
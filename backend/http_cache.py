@@ -0,0 +1,216 @@
+# backend/http_cache.py
+"""
+Conditional GETs and response compression for the polled JSON endpoints.
+
+Each cacheable resource ("lots", "spots", "users") has a version token
+in the shared cache. Write paths call ``bump()`` after commit, which
+replaces the token with a fresh random one, and ``@conditional(...)``
+derives a strong ETag from the path, query string and the tokens the
+view depends on. A poll whose ``If-None-Match`` still matches gets a 304
+before the view runs: no SQL, no serialization. Tokens are random rather
+than counters, so an evicted or flushed key can never bring back a tag
+that was already handed out. The tokens are read before the view
+queries, so a tag can only be older than its body, never newer.
+
+Tokens expire after ``VERSION_TTL_POLLS`` polling intervals
+(``HTTP_POLL_SECONDS``), so a bump that was lost (cache error, worker
+killed between commit and bump) can keep a stale body alive for at most
+that long. Everything fails open, i.e. no ETag and no 304: when the
+tokens can't be read, for a TTL after this process failed to bump, and
+when the cache is not shared between workers (``HTTP_ETAGS="auto"``
+turns ETags on only for Redis/Memcached caches; "on" forces them, e.g.
+for a single worker, "off" disables them).
+
+JSON responses of at least ``HTTP_COMPRESS_MIN_BYTES`` are compressed
+with brotli (when the ``brotli`` package is installed and the client
+accepts it) or gzip; streamed JSON is compressed chunk by chunk. The
+encoding is appended to the ETag ("<tag>-gzip"), so each representation
+keeps its own strong tag.
+"""
+import hashlib
+import logging
+import secrets
+import time
+import zlib
+from functools import wraps
+
+from flask import current_app, request
+
+from app_factory import cache
+from backend import metrics
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+VERSION_KEY = "http_version:{}"
+RESOURCES = ("lots", "spots", "users")
+COMPRESSIBLE = ("application/json",)
+SHARED_CACHES = ("RedisCache", "RedisSentinelCache", "RedisClusterCache",
+                 "MemcachedCache", "SASLMemcachedCache", "SpreadSASLMemcachedCache")
+VERSION_TTL_POLLS = 6
+
+config = {"min_bytes": 1024, "level": 6, "etags": True, "ttl": 60, "blind_until": 0.0}
+
+metrics.METRICS.update({
+    "parking_http_conditional_total": ("counter", "Conditional GETs by endpoint and result (not_modified/full)."),
+    "parking_http_compressed_total": ("counter", "Compressed responses by encoding."),
+})
+
+
+def _safe(fn, default=None):
+    try:
+        return fn()
+    except Exception as e:
+        log.warning("HTTP cache versions unavailable: %s", e)
+        return default
+
+
+# --------------------
+# VERSIONS
+# --------------------
+def bump(*resources):
+    """These resources changed (call after commit)."""
+    tokens = {VERSION_KEY.format(r): secrets.token_hex(8) for r in resources}
+    stored = _safe(lambda: cache.set_many(tokens, timeout=config["ttl"]))
+    if not stored or len(stored) < len(tokens):
+        # the old tokens live on until they expire: don't hand out tags for them meanwhile
+        log.warning("Could not bump HTTP cache versions %s; ETags off for %ss", resources, config["ttl"])
+        config["blind_until"] = time.monotonic() + config["ttl"]
+
+
+def versions(resources):
+    """Current token of each resource, or None if the cache is unavailable."""
+    keys = [VERSION_KEY.format(r) for r in resources]
+    tokens = _safe(lambda: cache.get_many(*keys))
+    if tokens is None:
+        return None
+    if None in tokens:
+        for key, token in zip(keys, tokens):
+            if token is None:
+                _safe(lambda: cache.add(key, secrets.token_hex(8), timeout=config["ttl"]))
+        tokens = _safe(lambda: cache.get_many(*keys))
+        if tokens is None or None in tokens:
+            return None
+    return tokens
+
+
+def _etag(resources):
+    if not config["etags"] or time.monotonic() < config["blind_until"]:
+        return None
+    tokens = versions(resources)
+    if tokens is None:
+        return None
+    raw = "|".join([request.full_path, *tokens]).encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=12).hexdigest()
+
+
+def conditional(*resources):
+    """
+    ETag/304 for a GET view whose body only changes when one of
+    ``resources`` is bumped. Put it under ``token_required`` so auth is
+    still checked on every poll.
+    """
+    for resource in resources:
+        if resource not in RESOURCES:
+            raise ValueError(f"unknown resource {resource!r}")
+
+    def decorate(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            tag = _etag(resources)
+            if tag is None:
+                return view(*args, **kwargs)
+
+            for encoding in _accepted():
+                candidate = f"{tag}-{encoding}" if encoding else tag
+                if request.if_none_match.contains(candidate):
+                    metrics.registry.inc("parking_http_conditional_total",
+                                         {"endpoint": request.endpoint, "result": "not_modified"})
+                    response = current_app.response_class(status=304)
+                    response.set_etag(candidate)
+                    response.headers["Cache-Control"] = "private, no-cache"
+                    response.vary.add("Accept-Encoding")
+                    return response
+
+            metrics.registry.inc("parking_http_conditional_total", {"endpoint": request.endpoint, "result": "full"})
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(tag)
+                response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapper
+    return decorate
+
+
+# --------------------
+# COMPRESSION
+# --------------------
+def _accepted():
+    """Encodings we could have sent this client, best first; "" is identity."""
+    accepted = request.accept_encodings
+    found = [e for e in ("br", "gzip") if (e != "br" or brotli) and accepted.quality(e) > 0]
+    return [*found, ""]
+
+
+def _compressor(encoding):
+    if encoding == "br":
+        return brotli.Compressor(quality=min(config["level"], 11))
+    return zlib.compressobj(config["level"], zlib.DEFLATED, 31)  # 31 = gzip container
+
+
+def _compress_stream(chunks, encoding):
+    z = _compressor(encoding)
+    for chunk in chunks:
+        out = z.process(chunk) if encoding == "br" else z.compress(chunk)
+        if out:
+            yield out
+    yield z.finish() if encoding == "br" else z.flush()
+
+
+def compress(response):
+    """after_request: compress JSON bodies the client accepts an encoding for."""
+    if (response.status_code != 200 or response.mimetype not in COMPRESSIBLE
+            or "Content-Encoding" in response.headers or response.direct_passthrough):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _accepted()[0]
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.iter_encoded(), encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        body = response.get_data()
+        if len(body) < config["min_bytes"]:
+            return response
+        if encoding == "br":
+            body = brotli.compress(body, quality=min(config["level"], 11))
+        else:
+            body = zlib.compress(body, config["level"], wbits=31)
+        response.set_data(body)
+
+    response.headers["Content-Encoding"] = encoding
+    tag, weak = response.get_etag()
+    if tag:
+        response.set_etag(f"{tag}-{encoding}", weak)
+    metrics.registry.inc("parking_http_compressed_total", {"encoding": encoding})
+    return response
+
+
+def init_app(app):
+    config["min_bytes"] = app.config.get("HTTP_COMPRESS_MIN_BYTES", 1024)
+    config["level"] = app.config.get("HTTP_COMPRESS_LEVEL", 6)
+    config["ttl"] = app.config.get("HTTP_POLL_SECONDS", 10) * VERSION_TTL_POLLS
+    config["blind_until"] = 0.0
+
+    mode = app.config.get("HTTP_ETAGS", "auto")
+    backend = type(app.extensions["cache"][cache]).__name__
+    config["etags"] = mode == "on" or (mode == "auto" and backend in SHARED_CACHES)
+    if mode == "auto" and not config["etags"]:
+        log.info("ETags off: %s is not shared between workers (set HTTP_ETAGS=on for one worker)", backend)
+    app.after_request(compress)
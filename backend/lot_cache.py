@@ -0,0 +1,109 @@
+# backend/lot_cache.py
+"""
+Cached availability list for ``/api/user/lots``.
+
+Lot metadata and per-lot free counts are cached under separate keys so a
+booking only invalidates the count of the lot it touched, while lot CRUD
+invalidates the metadata. Whatever is missing from the cache is rebuilt
+from ``parking_lot`` and the per-lot counters (backend/counters.py).
+"""
+import logging
+
+from sqlalchemy import select
+
+from app_factory import db, cache
+
+log = logging.getLogger(__name__)
+
+META_KEY = "user_lots:meta"
+FREE_KEY = "user_lots:free:{}"
+
+
+def _safe(fn, default=None):
+    """Run a cache call; a cache outage must never fail the request."""
+    try:
+        return fn()
+    except Exception as e:
+        log.warning("Lot cache unavailable: %s", e)
+        return default
+
+
+def _lot_row(lot_id, name, price, address, pincode, total):
+    return {
+        "id": lot_id,
+        "prime_location_name": name,
+        "price_per_hour": float(price),
+        "address": address,
+        "pincode": pincode,
+        "total_spots": total,
+    }
+
+
+def _load_all():
+    """Lots plus their maintained free counts (one query per database)."""
+    from backend.counters import available_counts
+    from backend.models import ParkingLot
+
+    rows = db.session.execute(
+        select(
+            ParkingLot.id,
+            ParkingLot.prime_location_name,
+            ParkingLot.price_per_hour,
+            ParkingLot.address,
+            ParkingLot.pincode,
+            ParkingLot.number_of_spots,
+        )
+        .order_by(ParkingLot.id)
+    ).all()
+
+    meta = [_lot_row(*r) for r in rows]
+    return meta, available_counts()
+
+
+def _load_free_counts(lot_ids):
+    from backend.counters import available_counts
+
+    counts = dict.fromkeys(lot_ids, 0)
+    counts.update(available_counts(lot_ids))
+    return counts
+
+
+def free_counts(lot_ids):
+    """{lot_id: free spots} for these lots, from the cache where fresh."""
+    if not lot_ids:
+        return {}
+    cached = _safe(lambda: cache.get_many(*(FREE_KEY.format(i) for i in lot_ids)), [None] * len(lot_ids))
+    counts = {i: c for i, c in zip(lot_ids, cached) if c is not None}
+
+    missing = [i for i in lot_ids if i not in counts]
+    if missing:
+        fresh = _load_free_counts(missing)
+        counts.update(fresh)
+        _safe(lambda: cache.set_many({FREE_KEY.format(k): v for k, v in fresh.items()}))
+    return counts
+
+
+def lot_availability():
+    """Return the ``/api/user/lots`` payload, hitting the DB only for stale entries."""
+    meta = _safe(lambda: cache.get(META_KEY))
+
+    if meta is None:
+        meta, counts = _load_all()
+        _safe(lambda: cache.set(META_KEY, meta))
+        _safe(lambda: cache.set_many({FREE_KEY.format(k): v for k, v in counts.items()}))
+    else:
+        counts = free_counts([lot["id"] for lot in meta])
+
+    return [dict(lot, available_spots=counts.get(lot["id"], 0)) for lot in meta]
+
+
+def invalidate_free(*lot_ids):
+    """A spot changed status (book/release) in these lots."""
+    _safe(lambda: cache.delete_many(*(FREE_KEY.format(i) for i in lot_ids)))
+
+
+def invalidate_lots(*lot_ids):
+    """Lot CRUD: drop the metadata list and the touched lots' counts."""
+    _safe(lambda: cache.delete(META_KEY))
+    if lot_ids:
+        invalidate_free(*lot_ids)
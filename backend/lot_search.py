@@ -0,0 +1,281 @@
+# backend/lot_search.py
+"""
+In-process search index for ``/api/user/lots/search``.
+
+Each worker keeps the lots' static fields in memory with:
+- a sorted (pincode, id) list for pincode prefix lookups,
+- token -> lot ids postings over ``prime_location_name`` and ``address``,
+  with a sorted vocabulary so every query token also matches as a prefix,
+- id lists presorted by price and name, walked in order for pages.
+
+Lot CRUD calls ``lot_changed()`` after commit: the committing worker
+patches its index in place and bumps ``lot_search:version`` in the cache;
+other workers compare that version at most every
+``LOT_SEARCH_SYNC_SECONDS`` and rebuild when it moved. When the version
+can't be read (cache down, or a cache that is not shared such as
+SimpleCache/NullCache), an index older than ``LOT_SEARCH_MAX_AGE``
+seconds is rebuilt instead, so other workers' changes show up after at
+most that long.
+
+Free-spot counts change on every booking, so they are not indexed: a
+per-worker snapshot of the lot counters (at most
+``LOT_SEARCH_COUNTS_TTL`` seconds old) is used only when a query filters
+or sorts on availability, and the returned page always shows the live
+counts from ``lot_cache``.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from app_factory import db, cache
+
+log = logging.getLogger(__name__)
+
+VERSION_KEY = "lot_search:version"
+SORTS = ("id", "-id", "price", "-price", "name", "available", "-available")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _TOKEN.findall((text or "").lower())
+
+
+def _safe(fn, default=None):
+    try:
+        return fn()
+    except Exception as e:
+        log.warning("Lot search cache unavailable: %s", e)
+        return default
+
+
+def _load_lots(lot_ids=None):
+    from backend.models import ParkingLot
+
+    stmt = select(ParkingLot.id, ParkingLot.prime_location_name, ParkingLot.price_per_hour,
+                  ParkingLot.address, ParkingLot.pincode, ParkingLot.number_of_spots)
+    if lot_ids is not None:
+        stmt = stmt.where(ParkingLot.id.in_(lot_ids))
+    return [
+        {"id": i, "prime_location_name": name, "price_per_hour": float(price),
+         "address": address, "pincode": pincode, "total_spots": total}
+        for i, name, price, address, pincode, total in db.session.execute(stmt)
+    ]
+
+
+class LotSearchIndex:
+
+    def __init__(self, app=None):
+        self.sync_interval = 1
+        self.counts_ttl = 5
+        self.max_age = 60
+        self._lock = threading.RLock()
+        self._clear()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.sync_interval = app.config.get("LOT_SEARCH_SYNC_SECONDS", 1)
+        self.counts_ttl = app.config.get("LOT_SEARCH_COUNTS_TTL", 5)
+        self.max_age = app.config.get("LOT_SEARCH_MAX_AGE", 60)
+        with self._lock:
+            self._clear()  # built from another app's database, if any
+        app.extensions["lot_search"] = self
+
+    def _clear(self):
+        self._reset()
+        self._built = False
+        self._built_at = 0.0
+        self._version = None
+        self._checked = 0.0
+        self._counts = ({}, [])
+        self._counts_at = 0.0
+
+    # --------------------
+    # MAINTENANCE
+    # --------------------
+    def _reset(self):
+        self._lots = {}
+        self._postings = defaultdict(set)
+        self._vocab = []
+        self._pincodes = []  # (pincode, id)
+        self._orders = {"id": [], "price": [], "name": []}  # sorted (key, id)
+
+    @staticmethod
+    def _keys(lot):
+        return {"id": (lot["id"], lot["id"]),
+                "price": (lot["price_per_hour"], lot["id"]),
+                "name": (lot["prime_location_name"].lower(), lot["id"])}
+
+    def _add(self, lot):
+        self._lots[lot["id"]] = lot
+        for token in set(tokenize(lot["prime_location_name"]) + tokenize(lot["address"])):
+            if not self._postings[token]:
+                bisect.insort(self._vocab, token)
+            self._postings[token].add(lot["id"])
+        bisect.insort(self._pincodes, (lot["pincode"], lot["id"]))
+        for name, key in self._keys(lot).items():
+            bisect.insort(self._orders[name], key)
+
+    @staticmethod
+    def _discard(items, item):
+        i = bisect.bisect_left(items, item)
+        if i < len(items) and items[i] == item:
+            del items[i]
+
+    def _remove(self, lot_id):
+        lot = self._lots.pop(lot_id, None)
+        if lot is None:
+            return
+        for token in set(tokenize(lot["prime_location_name"]) + tokenize(lot["address"])):
+            ids = self._postings[token]
+            ids.discard(lot_id)
+            if not ids:
+                del self._postings[token]
+                self._discard(self._vocab, token)
+        self._discard(self._pincodes, (lot["pincode"], lot_id))
+        for name, key in self._keys(lot).items():
+            self._discard(self._orders[name], key)
+
+    def rebuild(self, version=None):
+        """Reload every lot from the DB (one query)."""
+        started = time.monotonic()
+        lots = _load_lots()
+        postings = defaultdict(set)
+        for lot in lots:
+            for token in tokenize(lot["prime_location_name"]) + tokenize(lot["address"]):
+                postings[token].add(lot["id"])
+        keys = [self._keys(lot) for lot in lots]
+
+        with self._lock:
+            self._lots = {lot["id"]: lot for lot in lots}
+            self._postings = postings
+            self._vocab = sorted(postings)
+            self._pincodes = sorted((lot["pincode"], lot["id"]) for lot in lots)
+            self._orders = {name: sorted(k[name] for k in keys) for name in self._orders}
+            self._built = True
+            self._built_at = started
+            self._version = version
+            self._counts_at = 0.0
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._built and now - self._checked < self.sync_interval:
+            return
+        self._checked = now
+        version = _safe(lambda: cache.get(VERSION_KEY))
+        if not self._built or version != self._version:
+            self.rebuild(version)
+        elif version is None and now - self._built_at > self.max_age:
+            # no shared version to compare: other workers' changes are only seen by reloading
+            self.rebuild(version)
+
+    def lot_changed(self, *lot_ids):
+        """
+        Lots were created, updated or deleted (committed). No ids means
+        "many lots changed": rebuild.
+        """
+        version = _safe(lambda: cache.cache.inc(VERSION_KEY))
+        if not self._built:
+            return
+        if not lot_ids:
+            self.rebuild(version)
+            return
+
+        lots = _load_lots(lot_ids)
+        with self._lock:
+            for lot_id in lot_ids:
+                self._remove(lot_id)
+            for lot in lots:
+                self._add(lot)
+            # only skip the next rebuild if nobody else changed lots meanwhile
+            if version is not None and self._version is not None and version == self._version + 1:
+                self._version = version
+            self._counts_at = 0.0
+
+    def _available(self):
+        """({lot_id: free spots}, sorted (free, lot_id)) snapshot, reloaded every ``counts_ttl``."""
+        now = time.monotonic()
+        if now - self._counts_at > self.counts_ttl:
+            from backend.counters import available_counts
+            counts = available_counts()
+            self._counts = (counts, sorted((free, lot_id) for lot_id, free in counts.items()))
+            self._counts_at = now
+        return self._counts
+
+    # --------------------
+    # QUERIES
+    # --------------------
+    def _pincode_ids(self, prefix):
+        lo = bisect.bisect_left(self._pincodes, (prefix,))
+        hi = bisect.bisect_left(self._pincodes, (prefix + "\uffff",))
+        return {lot_id for _, lot_id in self._pincodes[lo:hi]}
+
+    def _token_ids(self, prefix):
+        lo = bisect.bisect_left(self._vocab, prefix)
+        hi = bisect.bisect_left(self._vocab, prefix + "\uffff")
+        ids = set()
+        for token in self._vocab[lo:hi]:
+            ids |= self._postings[token]
+        return ids
+
+    def _candidates(self, q, pincode):
+        """Ids matching the pincode prefix and every query token, or None for "all lots"."""
+        found = self._pincode_ids(pincode) if pincode else None
+        for token in tokenize(q):
+            ids = self._token_ids(token)
+            found = ids if found is None else found & ids
+            if not found:
+                break
+        return found
+
+    def search(self, q="", pincode="", min_price=None, max_price=None, min_available=0,
+               sort="id", offset=0, limit=20):
+        """Returns (lot dicts without counts, has_more)."""
+        if sort not in SORTS:
+            raise ValueError(f"sort must be one of {', '.join(SORTS)}")
+        self._sync()
+        counts, by_available = self._available() if min_available > 0 or sort.endswith("available") else (None, None)
+
+        with self._lock:
+            found = self._candidates(q, pincode.strip())
+            if found is not None and not found:
+                return [], False
+            lots = self._lots
+
+            def keep(lot_id):
+                price = lots[lot_id]["price_per_hour"]
+                return ((min_price is None or price >= min_price)
+                        and (max_price is None or price <= max_price)
+                        and (counts is None or counts.get(lot_id, 0) >= min_available))
+
+            name, descending = sort.lstrip("-"), sort.startswith("-")
+            wanted = offset + limit + 1
+            if found is not None and len(found) * 8 < len(lots):
+                # few candidates: sort them directly
+                if name == "available":
+                    key = lambda i: (counts.get(i, 0), i)
+                else:
+                    key = lambda i: self._keys(lots[i])[name]
+                page = [i for i in sorted(found, key=key, reverse=descending) if keep(i)][:wanted]
+            else:
+                # many candidates: walk the presorted order until the page is full
+                order = by_available if name == "available" else self._orders[name]
+                walk = reversed(order) if descending else iter(order)
+                page = []
+                for _, lot_id in walk:
+                    if lot_id in lots and (found is None or lot_id in found) and keep(lot_id):
+                        page.append(lot_id)
+                        if len(page) == wanted:
+                            break
+
+            rows = [dict(lots[i]) for i in page[offset:offset + limit]]
+        return rows, len(page) == wanted
+
+
+lot_index = LotSearchIndex()
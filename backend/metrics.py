@@ -0,0 +1,261 @@
+# backend/metrics.py
+"""
+Per-request / per-task SQL and latency instrumentation.
+
+SQLAlchemy cursor events count statements and SQL time against whatever
+is running in the current context (a Flask endpoint or a Celery task).
+At the end of each request/task we record latency and query histograms,
+flag N+1 patterns (one statement repeated more than
+``METRICS_N_PLUS_ONE_THRESHOLD`` times) and log slow statements with
+their originating route. ``render()`` produces Prometheus text format for
+the ``/metrics`` route (served only with the ``METRICS_TOKEN`` bearer
+token); Celery worker children can serve their registry on
+``CELERY_METRICS_PORT`` (+ child index).
+
+Values are per process: scrape each worker (or sum in Prometheus).
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+slow_log = logging.getLogger("parking.slow_sql")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+TASK_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+METRICS = {
+    "parking_http_requests_total": ("counter", "HTTP requests by endpoint, method and status."),
+    "parking_http_request_duration_seconds": ("histogram", "HTTP request latency by endpoint."),
+    "parking_db_queries_per_request": ("histogram", "SQL statements executed per request."),
+    "parking_db_queries_total": ("counter", "SQL statements executed, by endpoint or task."),
+    "parking_db_query_seconds_total": ("counter", "Time spent in SQL, by endpoint or task."),
+    "parking_n_plus_one_total": ("counter", "Requests/tasks that repeated one statement too often."),
+    "parking_slow_queries_total": ("counter", "Statements slower than METRICS_SLOW_QUERY_MS."),
+    "parking_task_runs_total": ("counter", "Celery task runs by task and final state."),
+    "parking_task_duration_seconds": ("histogram", "Celery task run time."),
+}
+
+
+# --------------------
+# REGISTRY
+# --------------------
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)  # (name, labels) -> value
+        self._histograms = {}                # (name, labels) -> [bucket counts, sum, count]
+        self._buckets = {}
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._buckets[name] = buckets
+            hist = self._histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self._histograms.items()}
+
+        by_name = defaultdict(list)
+        for (name, labels), value in counters.items():
+            by_name[name].append((labels, value))
+        for (name, labels), value in histograms.items():
+            by_name[name].append((labels, value))
+
+        lines = []
+        for name in sorted(by_name):
+            kind, help_text = METRICS.get(name, ("untyped", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(by_name[name]):
+                if kind == "histogram":
+                    counts, total, count = value
+                    for bound, n in zip(self._buckets[name], counts):
+                        lines.append(f"{name}_bucket{_labels(labels, le=bound)} {n}")
+                    lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {count}')
+                    lines.append(f"{name}_sum{_labels(labels)} {total}")
+                    lines.append(f"{name}_count{_labels(labels)} {count}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+registry = Registry()
+render = registry.render
+
+# What the current context is working for: {"label": {...}, "queries", "sql_time", "statements"}
+_scope = contextvars.ContextVar("metrics_scope", default=None)
+
+config = {"slow_query_ms": 200, "n_plus_one_threshold": 10}
+
+
+def _open_scope(kind, name):
+    # the lock is for shards.scatter(), whose pool threads count against the caller's scope
+    return _scope.set({"label": {kind: name}, "queries": 0, "sql_time": 0.0, "statements": Counter(),
+                       "lock": threading.Lock()})
+
+
+def _close_scope(token):
+    scope = _scope.get()
+    try:
+        _scope.reset(token)
+    except ValueError:  # closed from a different context (e.g. streamed response)
+        _scope.set(None)
+    if scope is None:
+        return None
+
+    labels = scope["label"]
+    registry.inc("parking_db_queries_total", labels, scope["queries"])
+    registry.inc("parking_db_query_seconds_total", labels, scope["sql_time"])
+
+    if scope["statements"]:
+        statement, repeats = scope["statements"].most_common(1)[0]
+        if repeats > config["n_plus_one_threshold"]:
+            registry.inc("parking_n_plus_one_total", labels)
+            log.warning("Possible N+1 in %s: statement repeated %s times: %s", labels, repeats, statement[:300])
+    return scope
+
+
+# --------------------
+# SQL EVENTS
+# --------------------
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+
+    scope = _scope.get()
+    if scope is not None:
+        with scope["lock"]:
+            scope["queries"] += 1
+            scope["sql_time"] += elapsed
+            scope["statements"][statement] += 1
+
+    if elapsed * 1000 >= config["slow_query_ms"]:
+        origin = scope["label"] if scope else {"endpoint": "<none>"}
+        registry.inc("parking_slow_queries_total", origin)
+        slow_log.warning("%.1f ms in %s: %s", elapsed * 1000, origin, statement[:500])
+
+
+# --------------------
+# FLASK
+# --------------------
+def init_app(app):
+    config["slow_query_ms"] = app.config.get("METRICS_SLOW_QUERY_MS", 200)
+    config["n_plus_one_threshold"] = app.config.get("METRICS_N_PLUS_ONE_THRESHOLD", 10)
+
+    @app.before_request
+    def _start_request_metrics():
+        g._metrics_start = time.perf_counter()
+        g._metrics_token = _open_scope("endpoint", request.endpoint or "<unmatched>")
+
+    @app.after_request
+    def _record_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        token = g.pop("_metrics_token", None)
+        if token is None:
+            return
+        scope = _close_scope(token)
+        endpoint = request.endpoint or "<unmatched>"
+        status = 500 if exc is not None else g.pop("_metrics_status", 500)
+
+        registry.inc("parking_http_requests_total", {"endpoint": endpoint, "method": request.method, "status": status})
+        registry.observe("parking_http_request_duration_seconds", {"endpoint": endpoint},
+                         time.perf_counter() - g.pop("_metrics_start"), LATENCY_BUCKETS)
+        if scope is not None:
+            registry.observe("parking_db_queries_per_request", {"endpoint": endpoint},
+                             scope["queries"], QUERY_BUCKETS)
+
+
+# --------------------
+# CELERY
+# --------------------
+def init_celery(celery_app, port=None):
+    """Instrument task runs; optionally serve /metrics from the worker on ``port``."""
+    from celery import signals
+
+    tokens = {}
+
+    @signals.task_prerun.connect(weak=False)
+    def _task_start(task_id=None, task=None, **kwargs):
+        tokens[task_id] = (_open_scope("task", task.name), time.perf_counter())
+
+    @signals.task_postrun.connect(weak=False)
+    def _task_end(task_id=None, task=None, state=None, **kwargs):
+        entry = tokens.pop(task_id, None)
+        if entry is None:
+            return
+        token, started = entry
+        _close_scope(token)
+        registry.inc("parking_task_runs_total", {"task": task.name, "state": state or "UNKNOWN"})
+        registry.observe("parking_task_duration_seconds", {"task": task.name},
+                         time.perf_counter() - started, TASK_BUCKETS)
+
+    if port:
+        @signals.worker_process_init.connect(weak=False)
+        def _serve(**kwargs):
+            # each prefork child has its own registry: child N serves port + N
+            from billiard.process import current_process
+            serve(port + (getattr(current_process(), "index", 0) or 0))
+
+
+def serve(port):
+    """Expose ``render()`` on http://0.0.0.0:<port>/metrics from a daemon thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    except OSError as e:
+        log.warning("Metrics port %s unavailable: %s", port, e)
+        return
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
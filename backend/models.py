@@ -4,23 +4,29 @@ from app_factory import db
 
 class User(db.Model):
     __tablename__ = "users"
+    __table_args__ = (
+        db.Index("ix_users_role", "role"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(200), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     role = db.Column(db.String(20), nullable=False, default="user")
+    # Bumped on role change; JWTs carrying an older version are rejected
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     reservations = db.relationship("Reservation", backref="user", lazy=True)
 
+    # Both run on the bounded hashing pool and may raise passwords.HashingBusy
     def set_password(self, pwd):
-        from werkzeug.security import generate_password_hash
-        self.password_hash = generate_password_hash(pwd)
+        from backend.passwords import password_hasher
+        self.password_hash = password_hasher.hash(pwd)
 
     def check_password(self, pwd):
-        from werkzeug.security import check_password_hash
-        return check_password_hash(self.password_hash, pwd)
+        from backend.passwords import password_hasher
+        return password_hasher.verify(self.password_hash, pwd)
 
 
 class ParkingLot(db.Model):
@@ -37,8 +43,24 @@ class ParkingLot(db.Model):
     spots = db.relationship("ParkingSpot", backref="lot", lazy=True)
 
 
+class LotCounter(db.Model):
+    """
+    Free/occupied spots of one lot, maintained by backend/counters.py.
+    Lives in the same database as the lot's spots (its shard, if any).
+    """
+    __tablename__ = "lot_counter"
+
+    lot_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    available_count = db.Column(db.Integer, nullable=False, default=0)
+    occupied_count = db.Column(db.Integer, nullable=False, default=0)
+
+
 class ParkingSpot(db.Model):
     __tablename__ = "parking_spot"
+    __table_args__ = (
+        # free-spot claim, per-lot counts and lot-filtered listings
+        db.Index("ix_parking_spot_lot_status", "lot_id", "status"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     lot_id = db.Column(db.Integer, db.ForeignKey("parking_lot.id"), nullable=False)
@@ -50,6 +72,22 @@ class ParkingSpot(db.Model):
 
 class Reservation(db.Model):
     __tablename__ = "reservation"
+    __table_args__ = (
+        # history, summaries and "latest booking" lookups per user
+        db.Index("ix_reservation_user_leaving", "user_id", "leaving_timestamp"),
+        # keyset-paginated history, newest first
+        db.Index("ix_reservation_user_parked", "user_id", "parking_timestamp", "id"),
+        # active reservation of a spot (spot details)
+        db.Index("ix_reservation_spot_leaving", "spot_id", "leaving_timestamp"),
+        # closed since the analytics watermark, in close order
+        db.Index("ix_reservation_leaving", "leaving_timestamp", "id"),
+        # active reservation of a user (book/release); partial where supported
+        db.Index(
+            "ix_reservation_active_user", "user_id",
+            sqlite_where=db.text("leaving_timestamp IS NULL"),
+            postgresql_where=db.text("leaving_timestamp IS NULL"),
+        ),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     spot_id = db.Column(db.Integer, db.ForeignKey("parking_spot.id"), nullable=False)
@@ -57,3 +95,68 @@ class Reservation(db.Model):
     parking_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     leaving_timestamp = db.Column(db.DateTime, nullable=True)
     total_cost = db.Column(db.Float, nullable=True)
+
+
+class ReservationArchive(db.Model):
+    """
+    Closed reservations moved out of ``reservation`` by the archival job
+    (backend/archive.py). Keeps the original id, and the lot as it was
+    at archival time so history survives lot deletion.
+    """
+    __tablename__ = "reservation_archive"
+    __table_args__ = (
+        db.Index("ix_reservation_archive_user_parked", "user_id", "parking_timestamp", "id"),
+        db.Index("ix_reservation_archive_leaving", "leaving_timestamp", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    spot_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    lot_id = db.Column(db.Integer, nullable=True)
+    lot_name = db.Column(db.String(150), nullable=True)
+    parking_timestamp = db.Column(db.DateTime, nullable=True)
+    leaving_timestamp = db.Column(db.DateTime, nullable=False)
+    total_cost = db.Column(db.Float, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class LotHourlyRollup(db.Model):
+    """
+    Per lot, per UTC hour totals of closed reservations, maintained
+    incrementally by backend/analytics.py. Stays are counted in the hour
+    they ended; occupied time and revenue are spread over the hours the
+    stay covered.
+    """
+    __tablename__ = "lot_hourly_rollup"
+    __table_args__ = (
+        db.Index("ix_lot_hourly_rollup_hour", "hour"),
+    )
+
+    lot_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    hour = db.Column(db.DateTime, primary_key=True)
+    occupied_seconds = db.Column(db.Float, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    stays = db.Column(db.Integer, nullable=False, default=0)
+    stay_seconds = db.Column(db.Float, nullable=False, default=0)
+
+
+class AnalyticsWatermark(db.Model):
+    """Last closed reservation (leaving_timestamp, id) folded into the rollups."""
+    __tablename__ = "analytics_watermark"
+
+    name = db.Column(db.String(50), primary_key=True)
+    leaving_timestamp = db.Column(db.DateTime, nullable=True)
+    reservation_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ParkingStats(db.Model):
+    """
+    Single-row table of the lot and user totals, maintained by
+    backend/counters.py. Spot totals are summed from ``lot_counter``.
+    """
+    __tablename__ = "parking_stats"
+
+    id = db.Column(db.Integer, primary_key=True)
+    total_lots = db.Column(db.Integer, nullable=False, default=0)
+    registered_users = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,129 @@
+# backend/passwords.py
+"""
+Bounded password hashing for ``login``/``register``.
+
+Werkzeug's scrypt/pbkdf2 hashes are deliberately CPU-heavy; run inline, a
+burst of logins takes every core and booking requests queue behind them.
+Here each process hashes on at most ``PASSWORD_HASH_CONCURRENCY`` pool
+threads (hashlib releases the GIL, so they use real cores and nothing
+else), so the CPU left over stays available to the other routes.
+
+At most ``PASSWORD_HASH_QUEUE_MAX`` jobs may wait for a pool thread, and
+a job that could not start within ``PASSWORD_HASH_QUEUE_MS`` is dropped
+without hashing. Both raise ``HashingBusy``, which the routes turn into
+a fast 503 with Retry-After instead of a slow login.
+
+``PASSWORD_HASH_METHOD`` is passed to Werkzeug ("scrypt",
+"scrypt:65536:8:1", "pbkdf2:sha256:600000", ...). Hashes made with other
+parameters are upgraded on the user's next successful login.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from backend import metrics
+
+log = logging.getLogger(__name__)
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+metrics.METRICS.update({
+    "parking_password_hashes_total": ("counter", "Password hash/verify jobs by operation and outcome."),
+    "parking_password_hash_wait_seconds": ("histogram", "Time a hashing job waited for a pool thread."),
+})
+
+
+class HashingBusy(Exception):
+    """No hashing capacity right now; retry after ``retry_after`` seconds."""
+
+    def __init__(self, reason, retry_after=1):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class _Expired(Exception):
+    pass
+
+
+class PasswordHasher:
+
+    def __init__(self, app=None):
+        self.method = "scrypt"
+        self.concurrency = 0  # 0 = hash inline (no app, CLI)
+        self.queue_max = 64
+        self.queue_timeout = 1.0
+        self.retry_after = 1
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._prefix = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get("PASSWORD_HASH_METHOD", "scrypt")
+        self.concurrency = app.config.get("PASSWORD_HASH_CONCURRENCY", max(1, (os.cpu_count() or 2) // 2))
+        self.queue_max = app.config.get("PASSWORD_HASH_QUEUE_MAX", 64)
+        self.queue_timeout = app.config.get("PASSWORD_HASH_QUEUE_MS", 1000) / 1000
+        self.retry_after = app.config.get("PASSWORD_HASH_RETRY_AFTER", 1)
+        self._prefix = None
+        app.extensions["password_hasher"] = self
+
+    def _pool(self):
+        # created on first use, so importing the app never starts threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix="password-hash")
+                self._slots = threading.BoundedSemaphore(self.concurrency + self.queue_max)
+            return self._executor, self._slots
+
+    def _run(self, op, fn, *args):
+        if not self.concurrency:
+            return fn(*args)
+
+        executor, slots = self._pool()
+        if not slots.acquire(blocking=False):
+            metrics.registry.inc("parking_password_hashes_total", {"op": op, "result": "queue_full"})
+            raise HashingBusy("password hashing queue is full", self.retry_after)
+
+        submitted = time.monotonic()
+
+        def job():
+            waited = time.monotonic() - submitted
+            metrics.registry.observe("parking_password_hash_wait_seconds", {"op": op}, waited, WAIT_BUCKETS)
+            if waited > self.queue_timeout:
+                raise _Expired()
+            return fn(*args)
+
+        try:
+            result = executor.submit(job).result()
+        except _Expired:
+            metrics.registry.inc("parking_password_hashes_total", {"op": op, "result": "timed_out"})
+            raise HashingBusy("password hashing queue wait exceeded", self.retry_after)
+        finally:
+            slots.release()
+        metrics.registry.inc("parking_password_hashes_total", {"op": op, "result": "ok"})
+        return result
+
+    # --------------------
+    # API
+    # --------------------
+    def hash(self, password):
+        return self._run("hash", generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run("verify", check_password_hash, pwhash, password or "")
+
+    def needs_rehash(self, pwhash):
+        """True if ``pwhash`` was made with other parameters than PASSWORD_HASH_METHOD."""
+        if self._prefix is None:
+            # Werkzeug fills in defaults ("scrypt" -> "scrypt:32768:8:1"); learn them once
+            self._prefix = generate_password_hash("", method=self.method).split("$", 1)[0]
+        return pwhash.split("$", 1)[0] != self._prefix
+
+
+password_hasher = PasswordHasher()
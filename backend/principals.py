@@ -0,0 +1,210 @@
+# backend/principals.py
+"""
+Principal cache for ``token_required``.
+
+Authenticated requests resolve the JWT's user id to a small read-only
+``Principal`` through this cache instead of loading ``User`` from the DB
+every time. Tokens carry the user's ``token_version``; changing a user's
+role or deleting the user bumps/invalidates it, so outstanding tokens
+stop working as soon as the change is committed.
+
+Backends:
+- "redis" (default): shared across workers, invalidation is immediate
+  everywhere. While Redis is unreachable every request reads the DB.
+- "memory": bounded LRU with TTL per process, opt-in for single-worker
+  setups. Invalidation is immediate only in the worker that committed
+  the change; every other worker keeps accepting a revoked token or a
+  demoted admin for up to ``PRINCIPAL_CACHE_TTL`` seconds.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import redis
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app_factory import db
+from backend.engine import use_primary
+from backend.models import User
+
+log = logging.getLogger(__name__)
+
+Principal = namedtuple("Principal", "id username email role token_version")
+
+
+class PrincipalCache:
+
+    prefix = "parking:principal"
+
+    def __init__(self, app=None):
+        self.kind = "redis"
+        self.maxsize = 10000
+        self.ttl = 30
+        self.client = None
+        self.retry_after = 30
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # user_id -> (expires_at, principal)
+        self.hits = self.misses = self.evictions = self.errors = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.kind = app.config.get("PRINCIPAL_CACHE", "redis")
+        self.maxsize = app.config.get("PRINCIPAL_CACHE_SIZE", 10000)
+        self.ttl = app.config.get("PRINCIPAL_CACHE_TTL", 30)
+        self.retry_after = app.config.get("PRINCIPAL_CACHE_RETRY_AFTER", 30)
+        self._down_until = 0.0
+        self._entries = OrderedDict()  # entries of a previous app's database are not ours
+        if self.kind == "redis":
+            self.client = redis.Redis.from_url(
+                app.config["PRINCIPAL_CACHE_REDIS_URL"], socket_connect_timeout=0.5, socket_timeout=0.5
+            )
+        else:
+            self.client = None
+            log.info("Per-process principal cache: revocations reach other workers within %ss", self.ttl)
+        app.extensions["principal_cache"] = self
+
+    # --------------------
+    # BACKENDS
+    # --------------------
+    def _local_get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def _local_set(self, principal):
+        with self._lock:
+            self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _redis_get(self, user_id):
+        raw = self.client.get(f"{self.prefix}:{user_id}")
+        return Principal(*json.loads(raw)) if raw else None
+
+    def _redis_set(self, principal):
+        self.client.set(f"{self.prefix}:{principal.id}", json.dumps(principal), ex=self.ttl)
+
+    def _redis(self, fn, *args):
+        """Run a Redis call; an error trips a short breaker during which users come from the DB."""
+        if time.monotonic() < self._down_until:
+            return None
+        try:
+            return fn(*args)
+        except redis.RedisError as e:
+            self._count("errors")
+            log.warning("Principal cache unavailable, reading users from the DB: %s", e)
+            self._down_until = time.monotonic() + self.retry_after
+            return None
+
+    # --------------------
+    # API
+    # --------------------
+    def get(self, user_id):
+        """Return the ``Principal`` for a user id, or None if the user does not exist."""
+        if self.client is not None:
+            principal = self._redis(self._redis_get, user_id)
+        else:
+            principal = self._local_get(user_id)
+
+        if principal is not None:
+            self._count("hits")
+            return principal
+
+        self._count("misses")
+        principal = _load_principal(user_id)
+        if principal is not None:
+            if self.client is not None:
+                self._redis(self._redis_set, principal)
+            else:
+                self._local_set(principal)
+        return principal
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+        if self.client is not None:
+            try:
+                self.client.delete(f"{self.prefix}:{user_id}")
+            except redis.RedisError as e:
+                self._count("errors")
+                log.warning("Could not invalidate principal %s: %s", user_id, e)
+
+    def _count(self, name):
+        # request threads of one worker share the cache; += alone can lose updates
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            hits, misses, evictions, errors = self.hits, self.misses, self.evictions, self.errors
+            size = len(self._entries)
+        total = hits + misses
+        return {
+            "backend": self.kind,
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else None,
+            "evictions": evictions,
+            "errors": errors,
+        }
+
+
+principal_cache = PrincipalCache()
+
+
+def principal_query(user_id):
+    return select(User.id, User.username, User.email, User.role, User.token_version).where(User.id == user_id)
+
+
+def _load_principal(user_id):
+    # primary, so a token issued a moment ago never misses on a lagging replica
+    with use_primary():
+        row = db.session.execute(principal_query(user_id)).first()
+    return Principal(*row) if row else None
+
+
+# --------------------
+# REVOCATION
+# --------------------
+# Role changes bump ``token_version``; cached principals are dropped after commit
+def _revoked(session):
+    return session.info.setdefault("revoked_principals", set())
+
+
+@event.listens_for(User, "before_update")
+def _bump_on_role_change(mapper, connection, user):
+    if inspect(user).attrs.role.history.has_changes():
+        user.token_version = (user.token_version or 0) + 1
+        _revoked(inspect(user).session).add(user.id)
+
+
+@event.listens_for(User, "after_delete")
+def _drop_on_delete(mapper, connection, user):
+    _revoked(inspect(user).session).add(user.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_revoked(session):
+    for user_id in session.info.pop("revoked_principals", ()):
+        principal_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_revoked(session):
+    session.info.pop("revoked_principals", None)
@@ -0,0 +1,103 @@
+# backend/provisioning.py
+"""
+Lot provisioning helpers shared by ``create_lot``, ``update_lot`` and the
+bulk import endpoint.
+
+Spots are written with chunked Core ``executemany`` INSERTs instead of one
+ORM object per spot, and a whole import runs in one transaction.
+"""
+import csv
+import io
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app_factory import db
+from backend import counters, shards
+from backend.models import ParkingLot, ParkingSpot
+
+LOT_FIELDS = ["prime_location_name", "price_per_hour", "address", "pincode", "number_of_spots"]
+SPOT_CHUNK = 10000
+
+
+def parse_lot(data):
+    """Validate one lot payload. Returns (values, None) or (None, error message)."""
+    if any(k not in data or data[k] in ("", None) for k in LOT_FIELDS):
+        return None, "All fields are required"
+
+    try:
+        price = float(data["price_per_hour"])
+        spots_count = int(data["number_of_spots"])
+    except (TypeError, ValueError):
+        return None, "Price and spots must be numeric"
+
+    if spots_count <= 0:
+        return None, "Number of spots must be > 0"
+
+    return {
+        "prime_location_name": str(data["prime_location_name"]).strip(),
+        "price_per_hour": price,
+        "address": str(data["address"]).strip(),
+        "pincode": str(data["pincode"]).strip(),
+        "number_of_spots": spots_count,
+    }, None
+
+
+def add_spots(lot_id, count):
+    """Bulk-insert ``count`` free spots for a lot (uncommitted; call inside its ``lot_shard``)."""
+    now = datetime.utcnow()
+    row = {"lot_id": lot_id, "status": "A", "created_at": now}
+    for start in range(0, count, SPOT_CHUNK):
+        db.session.execute(insert(ParkingSpot.__table__), [row] * min(SPOT_CHUNK, count - start))
+
+
+def provision_lots(lot_values):
+    """
+    Create lots and all of their spots in the caller's transaction.
+    Returns the new ``ParkingLot`` objects (not committed).
+    """
+    lots = [ParkingLot(**v) for v in lot_values]
+    db.session.add_all(lots)
+    db.session.flush()  # so lot ids are available
+
+    for lot in lots:
+        with shards.lot_shard(lot.id):
+            add_spots(lot.id, lot.number_of_spots)
+
+    counters.add_lots({lot.id: lot.number_of_spots for lot in lots})
+    counters.adjust(lots=len(lots))
+    return lots
+
+
+def read_import_rows(req):
+    """
+    Lot rows from an import request: a JSON list (or {"lots": [...]}),
+    an uploaded CSV file field ``file``, or a text/csv body.
+    """
+    if req.is_json:
+        data = req.get_json(silent=True)
+        rows = data.get("lots") if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            raise ValueError("Expected a JSON list of lots")
+        return rows
+
+    upload = req.files.get("file")
+    raw = upload.read() if upload else req.get_data()
+    if not raw:
+        raise ValueError("No lots supplied")
+    return list(csv.DictReader(io.StringIO(raw.decode("utf-8-sig"))))
+
+
+def validate_rows(rows):
+    """Returns (values list, errors list); errors carry the 1-based row number."""
+    values, errors = [], []
+    for i, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({"row": i, "error": "Each lot must be an object"})
+            continue
+        parsed, error = parse_lot(row)
+        if error:
+            errors.append({"row": i, "error": error})
+        else:
+            values.append(parsed)
+    return values, errors
@@ -1,12 +1,37 @@
-from flask import Blueprint, request, jsonify, render_template, current_app, send_from_directory
+from flask import Blueprint, Response, g, request, jsonify, render_template, current_app, send_from_directory, stream_with_context
 from functools import wraps
 from datetime import datetime, timedelta
+import base64
+import csv
+import heapq
+import hmac
+import json
 import jwt
 import re
+import secrets
+from itertools import islice
 
-from celery.result import AsyncResult
+from sqlalchemy import select, update, delete, func, case
 from app_factory import db, cache
-from backend.models import User, ParkingLot, ParkingSpot, Reservation
+from backend.admission import admission
+from backend.allocator import allocator, AllocatorUnavailable
+from backend import counters
+from backend.events import event_bus
+from backend.group_commit import group_committer, QueueFull, UNAVAILABLE
+from backend import events, http_cache, metrics, shards
+from backend.http_cache import conditional
+from backend.lot_cache import lot_availability, free_counts, invalidate_free, invalidate_lots
+from backend.lot_search import lot_index
+from backend.principals import principal_cache
+from backend.spot_bitmap import spot_bitmap
+from backend.passwords import password_hasher, HashingBusy
+from backend.exports import csv_chunks, gzip_chunks, history_size
+from backend.history import (
+    PAGE_DEFAULT as HISTORY_PAGE_DEFAULT, PAGE_MAX as HISTORY_PAGE_MAX,
+    history_page, history_summary, invalidate_summary, decode_cursor, parse_day,
+)
+from backend.provisioning import parse_lot, provision_lots, add_spots, read_import_rows, validate_rows
+from backend.models import User, ParkingLot, ParkingSpot, Reservation, ReservationArchive
 
 bp = Blueprint("app_routes", __name__)
 
@@ -17,6 +42,7 @@ def create_token(user):
     payload = {
         "user_id": user.id,
         "role": user.role,
+        "ver": user.token_version or 0,
         "exp": datetime.utcnow() + timedelta(hours=6)
     }
     token = jwt.encode(payload, current_app.config["SECRET_KEY"], algorithm="HS256")
@@ -24,24 +50,38 @@ def create_token(user):
     return token if isinstance(token, str) else token.decode("utf-8")
 
 
+def _request_token():
+    auth = request.headers.get("Authorization", "")
+    return auth.split(" ")[1] if " " in auth else None
+
+
+def _token_claims(token):
+    """Verified JWT payload, decoded once per request (admission control reads it first)."""
+    if g.get("_jwt_token") != token:
+        claims = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
+        g._jwt_token, g._jwt_claims = token, claims
+    return g._jwt_claims
+
+
 def token_required(f):
     @wraps(f)
     def decorator(*args, **kwargs):
-        auth = request.headers.get("Authorization", "")
-        token = auth.split(" ")[1] if " " in auth else None
-
+        token = _request_token()
         if not token:
             return jsonify({"error": "Token missing"}), 401
 
         try:
-            data = jwt.decode(token, current_app.config["SECRET_KEY"], algorithms=["HS256"])
-            current_user = User.query.get(data["user_id"])
+            data = _token_claims(token)
+            current_user = principal_cache.get(data["user_id"])
             if not current_user:
                 return jsonify({"error": "Invalid user"}), 401
+            if data.get("ver", 0) != current_user.token_version:
+                return jsonify({"error": "Token revoked"}), 401
         except Exception:
             return jsonify({"error": "Invalid or expired token"}), 401
 
         return f(current_user, *args, **kwargs)
+    decorator.admission_controlled = True
     return decorator
 
 
@@ -55,33 +95,124 @@ def admin_required(f):
 
 
 # --------------------
-# AUTO-CREATE ADMIN
+# ADMISSION CONTROL
+# --------------------
+def _admission_principal():
+    """Per-user bucket of the caller: none for admins, the address when the token is bad."""
+    token = _request_token()
+    try:
+        claims = _token_claims(token) if token else None
+    except jwt.PyJWTError:
+        claims = None
+    if not claims or "user_id" not in claims:
+        return f"ip:{request.remote_addr}"
+    return None if claims.get("role") == "admin" else f"user:{claims['user_id']}"
+
+
+admission.protect(bp, _admission_principal)
+
+
+# --------------------
+# SPOT CLAIMING
 # --------------------
-admin_initialized = False
+CLAIM_ATTEMPTS = 5
+
 
-@bp.before_app_request
-def create_admin():
+def _mark_occupied(lot_id, spot_id):
     """
-    Ensure DB tables exist and a default admin user is present.
+    Flip a spot A -> O only if it is still free. The WHERE clause is what
+    prevents double allocation, on SQLite as well as Postgres.
     """
-    global admin_initialized
-    if admin_initialized:
-        return
+    result = db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.id == spot_id, ParkingSpot.lot_id == lot_id, ParkingSpot.status == "A")
+        .values(status="O")
+    )
+    return result.rowcount == 1
 
-    db.create_all()
 
-    if not User.query.filter_by(role="admin").first():
-        admin = User(username="admin", email="admin@parking.com", role="admin")
-        admin.set_password("admin123")
-        db.session.add(admin)
-        db.session.commit()
+def free_spot_query(lot_id):
+    """One free spot of the lot, skipping rows other transactions have locked."""
+    return (
+        select(ParkingSpot.id)
+        .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == "A")
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
 
-    admin_initialized = True
+
+def claim_spot(lot_id):
+    """
+    Mark one free spot of the lot occupied (uncommitted) and return its id,
+    or None if the lot is full. Call inside the lot's ``shards.lot_shard()``.
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        try:
+            candidate = allocator.acquire(lot_id)
+        except AllocatorUnavailable:
+            break
+        if candidate is None:
+            return None
+        if _mark_occupied(lot_id, candidate):
+            return candidate
+        # stale entry (taken or deleted meanwhile) -> try the next one
+
+    # DB fallback
+    for _ in range(CLAIM_ATTEMPTS):
+        candidate = db.session.execute(free_spot_query(lot_id)).scalar()
+        if candidate is None:
+            return None
+        if _mark_occupied(lot_id, candidate):
+            return candidate
+    return None
+
+
+# --------------------
+# WRITE HOOKS (call after commit)
+# --------------------
+def _after_spot_change(lot_id, spot_id, old, new):
+    invalidate_free(lot_id)
+    spot_bitmap.set(lot_id, [spot_id], new == "O")
+    http_cache.bump("spots")
+    events.spot_changed(lot_id, spot_id, old, new)
+
+
+def _after_lot_change(lot_id, action):
+    invalidate_lots(lot_id)
+    lot_index.lot_changed(lot_id)
+    spot_bitmap.drop_lot(lot_id)
+    http_cache.bump("lots", "spots")
+    events.lot_changed(lot_id, action)
 
 
 # ----------------------------------------------------------
 # AUTH ROUTES
 # ----------------------------------------------------------
+def _hashing_busy(e):
+    return jsonify({"error": "Too many sign-ins right now, please retry"}), 503, {"Retry-After": str(e.retry_after)}
+
+
+def _upgrade_hash(user, password):
+    """Rehash with the current PASSWORD_HASH_METHOD; best effort, never bumps token_version."""
+    old = user.password_hash
+    try:
+        new = password_hasher.hash(password)
+    except HashingBusy:
+        return  # next login will try again
+    db.session.execute(
+        update(User).where(User.id == user.id, User.password_hash == old).values(password_hash=new)
+    )
+    db.session.commit()
+
+
+def user_by_username_query(username):
+    return select(User).where(User.username == username).limit(1)
+
+
+def user_by_email_query(email):
+    return select(User).where(User.email == email).limit(1)
+
+
 @bp.route("/api/register", methods=["POST"])
 def register():
     data = request.json or {}
@@ -95,15 +226,20 @@ def register():
     if len(data["password"]) < 6:
         return jsonify({"error": "Password must be at least 6 characters"}), 400
 
-    if User.query.filter_by(username=data["username"]).first():
+    if db.session.scalar(user_by_username_query(data["username"])):
         return jsonify({"error": "Username exists"}), 400
-    if User.query.filter_by(email=data["email"]).first():
+    if db.session.scalar(user_by_email_query(data["email"])):
         return jsonify({"error": "Email exists"}), 400
 
     user = User(username=data["username"], email=data["email"])
-    user.set_password(data["password"])
+    try:
+        user.set_password(data["password"])
+    except HashingBusy as e:
+        return _hashing_busy(e)
     db.session.add(user)
+    counters.adjust(users=1)
     db.session.commit()
+    http_cache.bump("users")
 
     return jsonify({"message": "Registered"}), 201
 
@@ -111,21 +247,32 @@ def register():
 @bp.route("/api/login", methods=["POST"])
 def login():
     data = request.json or {}
-    user = User.query.filter_by(username=data.get("username")).first()
-    if not user or not user.check_password(data.get("password")):
-        return jsonify({"error": "Invalid credentials"}), 401
+    user = db.session.scalar(user_by_username_query(data.get("username")))
+    try:
+        if not user or not user.check_password(data.get("password")):
+            return jsonify({"error": "Invalid credentials"}), 401
+    except HashingBusy as e:
+        return _hashing_busy(e)
+
+    if password_hasher.needs_rehash(user.password_hash):
+        _upgrade_hash(user, data.get("password"))
 
     return jsonify({"token": create_token(user), "role": user.role})
 
 
 @bp.route("/api/guest-login", methods=["POST"])
 def guest_login():
-    guest_user = User.query.filter_by(username="guest_user").first()
+    guest_user = db.session.scalar(user_by_username_query("guest_user"))
     if not guest_user:
         guest_user = User(username="guest_user", email="guest@parking.com", role="user")
-        guest_user.set_password("guest123456")
+        try:
+            guest_user.set_password("guest123456")
+        except HashingBusy as e:
+            return _hashing_busy(e)
         db.session.add(guest_user)
+        counters.adjust(users=1)
         db.session.commit()
+        http_cache.bump("users")
 
     return jsonify({"token": create_token(guest_user), "role": guest_user.role, "username": guest_user.username})
 
@@ -136,41 +283,284 @@ def guest_login():
 @bp.route("/api/admin/dashboard_summary", methods=["GET"])
 @token_required
 @admin_required
+@conditional("lots", "spots", "users")
 def admin_dashboard_summary(current_user):
+    return jsonify(counters.summary())
+
+
+# --------------------
+# LIVE FEED TICKETS
+# --------------------
+LIVE_TICKET_AUDIENCE = "admin-live"
+
+
+def create_live_ticket(user):
+    """
+    Short-lived token for the live feed's URL (EventSource cannot send
+    headers). Its audience keeps it from passing ``token_required``.
+    """
+    payload = {
+        "sub": str(user.id),
+        "ver": user.token_version or 0,
+        "aud": LIVE_TICKET_AUDIENCE,
+        "jti": secrets.token_urlsafe(16),
+        "exp": datetime.utcnow() + timedelta(seconds=current_app.config["LIVE_TICKET_SECONDS"])
+    }
+    return jwt.encode(payload, current_app.config["SECRET_KEY"], algorithm="HS256")
+
+
+def redeem_live_ticket(ticket):
+    """The admin a live ticket was issued to, or None if it is invalid, expired or already used."""
+    try:
+        claims = jwt.decode(ticket, current_app.config["SECRET_KEY"], algorithms=["HS256"],
+                            audience=LIVE_TICKET_AUDIENCE)
+    except jwt.PyJWTError:
+        return None
+    try:
+        # cache.add only succeeds for the first caller (SET NX on Redis)
+        first_use = cache.add(f"live_ticket:{claims['jti']}", 1, timeout=current_app.config["LIVE_TICKET_SECONDS"])
+    except Exception as e:
+        current_app.logger.warning("Cannot check live ticket use, refusing it: %s", e)
+        return None
+    if not first_use:
+        return None
+
+    user = principal_cache.get(int(claims["sub"]))
+    if user is None or user.role != "admin" or user.token_version != claims["ver"]:
+        return None
+    return user
+
+
+@bp.route("/api/admin/live/ticket", methods=["POST"])
+@token_required
+@admin_required
+def admin_live_ticket(current_user):
     return jsonify({
-        "total_lots": ParkingLot.query.count(),
-        "total_spots": ParkingSpot.query.count(),
-        "available_spots": ParkingSpot.query.filter_by(status="A").count(),
-        "occupied_spots": ParkingSpot.query.filter_by(status="O").count(),
-        "registered_users": User.query.filter_by(role="user").count()
+        "ticket": create_live_ticket(current_user),
+        "expires_in": current_app.config["LIVE_TICKET_SECONDS"]
     })
 
 
+@bp.route("/api/admin/live", methods=["GET"])
+def admin_live():
+    """
+    Server-Sent Events feed: one ``snapshot`` event, then only deltas
+    (``spot``, ``lot``, ``resync``) and a comment line as heartbeat.
+    Authenticated with a ``?ticket=`` from ``/api/admin/live/ticket``, so
+    the admin's JWT never ends up in a URL (or in access logs).
+    Long-lived, so run gunicorn with threaded or gevent workers.
+    """
+    if redeem_live_ticket(request.args.get("ticket", "")) is None:
+        return jsonify({"error": "Invalid or expired ticket"}), 401
+
+    snapshot = json.dumps({"type": "snapshot", "summary": counters.summary()})
+    db.session.close()  # don't hold a pooled connection for the stream's lifetime
+
+    def generate():
+        yield "retry: 5000\n"
+        yield f"data: {snapshot}\n\n"
+        for message in event_bus.subscribe():
+            yield f"data: {message}\n\n" if message else ": ping\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+SPOTS_PAGE_DEFAULT = 500
+SPOTS_PAGE_MAX = 5000
+
+
+def spots_page_query(after, limit, lot_id=None, status=None, names=True):
+    """Keyset page of (id, lot name, status); (id, lot_id, status) with ``names=False``."""
+    label = ParkingLot.prime_location_name if names else ParkingSpot.lot_id
+    stmt = (
+        select(ParkingSpot.id, label, ParkingSpot.status)
+        .where(ParkingSpot.id > after)
+        .order_by(ParkingSpot.id)
+        .limit(limit)
+    )
+    if names:
+        stmt = stmt.join(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)
+    if lot_id is not None:
+        stmt = stmt.where(ParkingSpot.lot_id == lot_id)
+    if status is not None:
+        stmt = stmt.where(ParkingSpot.status == status)
+    return stmt
+
+
+def _spots_page(after, limit, lot_id=None, status=None):
+    """One keyset page of (id, lot name, status), lot name joined in SQL."""
+    if shards.enabled():
+        return _sharded_spots_page(after, limit, lot_id, status)
+    stmt = spots_page_query(after, limit, lot_id, status)
+    return [{"id": i, "lot_name": name, "status": st} for i, name, st in db.session.execute(stmt)]
+
+
+def _sharded_spots_page(after, limit, lot_id, status):
+    """The same page merged from each shard's first ``limit`` spots; names from the primary."""
+    stmt = spots_page_query(after, limit, lot_id, status, names=False)
+    if lot_id is not None:
+        with shards.lot_shard(lot_id):
+            rows = db.session.execute(stmt).all()
+    else:
+        parts = shards.scatter(lambda: db.session.execute(stmt).all())
+        rows = list(islice(heapq.merge(*parts, key=lambda row: row[0]), limit))
+    names = shards.lot_names(lid for _, lid, _ in rows)
+    return [{"id": i, "lot_name": names.get(lid), "status": st} for i, lid, st in rows]
+
+
 @bp.route("/api/admin/spots", methods=["GET"])
 @token_required
 @admin_required
+@conditional("lots", "spots")
 def admin_spots(current_user):
-    spots = ParkingSpot.query.all()
-    return jsonify([
+    """
+    Keyset-paginated spot list: ?after=<last id>&limit=&lot_id=&status=A|O.
+    ?stream=1 streams every matching spot as one JSON array instead.
+    """
+    try:
+        after = request.args.get("after", 0, type=int)
+        limit = min(int(request.args.get("limit", SPOTS_PAGE_DEFAULT)), SPOTS_PAGE_MAX)
+        lot_id = request.args.get("lot_id", type=int)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid pagination parameters"}), 400
+
+    status = request.args.get("status") or None
+    if status not in (None, "A", "O"):
+        return jsonify({"error": "Status must be A or O"}), 400
+    if limit <= 0:
+        return jsonify({"error": "Limit must be > 0"}), 400
+
+    if request.args.get("stream") == "1":
+        def generate():
+            cursor, first = after, True
+            yield "["
+            while True:
+                page = _spots_page(cursor, SPOTS_PAGE_MAX, lot_id, status)
+                for spot in page:
+                    yield ("" if first else ",") + json.dumps(spot)
+                    first = False
+                if len(page) < SPOTS_PAGE_MAX:
+                    break
+                cursor = page[-1]["id"]
+            yield "]"
+
+        return Response(stream_with_context(generate()), mimetype="application/json")
+
+    spots = _spots_page(after, limit, lot_id, status)
+    return jsonify({
+        "spots": spots,
+        "next_cursor": spots[-1]["id"] if len(spots) == limit else None
+    })
+
+
+def _bitmap_lots():
+    """[(id, name)] of ?lot_id= or of every lot; None if that lot does not exist."""
+    stmt = select(ParkingLot.id, ParkingLot.prime_location_name).order_by(ParkingLot.id)
+    if request.args.get("lot_id"):
+        stmt = stmt.where(ParkingLot.id == int(request.args["lot_id"]))
+    lots = db.session.execute(stmt).all()
+    return lots if lots or not request.args.get("lot_id") else None
+
+
+@bp.route("/api/admin/spots/bitmap", methods=["GET"])
+@token_required
+@admin_required
+@conditional("lots", "spots")
+def admin_spot_bitmap(current_user):
+    """
+    Occupancy as one packed bitmap per lot, base64 (bit i = i-th spot of
+    the lot's layout, 1 = occupied, MSB first). ?lot_id= for one lot;
+    ?lot_id=&format=binary returns that lot's raw bytes with the layout
+    and counts in X-Spot-* headers. Spot ids come from /api/admin/spots/layout.
+    """
+    try:
+        lots = _bitmap_lots()
+    except ValueError:
+        return jsonify({"error": "Invalid lot_id"}), 400
+    if lots is None:
+        return jsonify({"error": "Lot not found"}), 404
+
+    snapshots = spot_bitmap.snapshots([lot_id for lot_id, _ in lots])
+    if request.args.get("format") == "binary":
+        if not request.args.get("lot_id"):
+            return jsonify({"error": "format=binary needs a lot_id"}), 400
+        snap = snapshots[lots[0][0]]
+        return Response(snap["bits"], mimetype="application/octet-stream", headers={
+            "X-Spot-Layout": snap["layout"],
+            "X-Spot-Count": str(snap["spots"]),
+            "X-Spot-Occupied": str(snap["occupied"]),
+        })
+
+    return jsonify({"lots": [
         {
-            "id": s.id,
-            "lot_name": s.lot.prime_location_name,
-            "status": s.status
-        } for s in spots
-    ])
+            "lot_id": lot_id,
+            "layout": snapshots[lot_id]["layout"],
+            "spots": snapshots[lot_id]["spots"],
+            "occupied": snapshots[lot_id]["occupied"],
+            "available": snapshots[lot_id]["spots"] - snapshots[lot_id]["occupied"],
+            "bitmap": base64.b64encode(snapshots[lot_id]["bits"]).decode("ascii"),
+        } for lot_id, _ in lots
+    ]})
+
+
+@bp.route("/api/admin/spots/layout", methods=["GET"])
+@token_required
+@admin_required
+@conditional("lots")
+def admin_spot_layout(current_user):
+    """
+    Spot ids behind each lot's bitmap as runs [[first_id, count], ...];
+    refetch when a bitmap's ``layout`` differs from the one cached here.
+    """
+    try:
+        lots = _bitmap_lots()
+    except ValueError:
+        return jsonify({"error": "Invalid lot_id"}), 400
+    if lots is None:
+        return jsonify({"error": "Lot not found"}), 404
+
+    snapshots = spot_bitmap.snapshots([lot_id for lot_id, _ in lots])
+    return jsonify({"lots": [
+        {
+            "lot_id": lot_id,
+            "lot_name": name,
+            "layout": snapshots[lot_id]["layout"],
+            "spots": snapshots[lot_id]["spots"],
+            "runs": snapshots[lot_id]["runs"],
+        } for lot_id, name in lots
+    ]})
+
+
+@bp.route("/api/admin/auth_cache_stats", methods=["GET"])
+@token_required
+@admin_required
+def auth_cache_stats(current_user):
+    return jsonify(principal_cache.stats())
+
+
+def spot_reservation_query(spot_id):
+    """The spot's active reservation, newest first."""
+    return (
+        select(Reservation)
+        .where(Reservation.spot_id == spot_id, Reservation.leaving_timestamp.is_(None))
+        .order_by(Reservation.parking_timestamp.desc())
+        .limit(1)
+    )
 
 
 @bp.route("/api/admin/spot-details/<int:spot_id>", methods=["GET"])
 @token_required
 @admin_required
 def spot_details(current_user, spot_id):
-    spot = ParkingSpot.query.get_or_404(spot_id)
+    with shards.row_shard(spot_id):
+        spot = ParkingSpot.query.get_or_404(spot_id)
 
-    # If spot marked available or no active reservation => treat as free
-    active_res = Reservation.query.filter_by(
-        spot_id=spot.id,
-        leaving_timestamp=None
-    ).order_by(Reservation.parking_timestamp.desc()).first()
+        # If spot marked available or no active reservation => treat as free
+        active_res = db.session.scalar(spot_reservation_query(spot.id))
 
     if not active_res or spot.status == "A":
         return jsonify({"status": "Available"})
@@ -204,12 +594,55 @@ def admin_users(current_user):
     ])
 
 
+def _analytics_range(bucket):
+    """(date_from, date_to) from ?from=&to=, defaulting to the bucket's usual window."""
+    from backend.analytics import default_range  # pandas/numpy load on first use, not at worker start
+    default_from, default_to = default_range(bucket)
+    date_from = parse_day(request.args["from"]) if request.args.get("from") else default_from
+    date_to = parse_day(request.args["to"], end=True) if request.args.get("to") else default_to
+    return date_from, date_to
+
+
+@bp.route("/api/admin/analytics/series", methods=["GET"])
+@token_required
+@admin_required
+def analytics_series(current_user):
+    """
+    Occupancy, revenue and average stay per hour or day, from the rollups.
+    ?bucket=hour|day&from=YYYY-MM-DD&to=YYYY-MM-DD&lot_id= (all lots if omitted)
+    """
+    from backend.analytics import series
+    bucket = request.args.get("bucket", "hour")
+    try:
+        lot_id = int(request.args["lot_id"]) if request.args.get("lot_id") else None
+        date_from, date_to = _analytics_range(bucket if bucket in ("hour", "day") else "hour")
+        points = series(bucket, date_from, date_to, lot_id)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid analytics query: {e}"}), 400
+    return jsonify({"bucket": bucket, "lot_id": lot_id, "series": points})
+
+
+@bp.route("/api/admin/analytics/lots", methods=["GET"])
+@token_required
+@admin_required
+def analytics_lots(current_user):
+    """Per-lot occupancy, revenue and average stay over ?from=&to= (default last 30 days)."""
+    from backend.analytics import lot_totals
+    try:
+        date_from, date_to = _analytics_range("day")
+        lots = lot_totals(date_from, date_to)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid analytics query: {e}"}), 400
+    return jsonify({"from": date_from.isoformat(), "to": date_to.isoformat(), "lots": lots})
+
+
 # ----------------------------------------------------------
 # ADMIN LOT CRUD
 # ----------------------------------------------------------
 @bp.route("/api/admin/lots", methods=["GET"])
 @token_required
 @admin_required
+@conditional("lots")
 def get_lots(current_user):
     lots = ParkingLot.query.all()
     return jsonify([
@@ -228,36 +661,71 @@ def get_lots(current_user):
 @token_required
 @admin_required
 def create_lot(current_user):
-    data = request.json or {}
-    required = ["prime_location_name", "price_per_hour", "address", "pincode", "number_of_spots"]
-    if any(k not in data or data[k] in ("", None) for k in required):
-        return jsonify({"error": "All fields are required"}), 400
+    values, error = parse_lot(request.json or {})
+    if error:
+        return jsonify({"error": error}), 400
 
-    try:
-        price = float(data["price_per_hour"])
-        spots_count = int(data["number_of_spots"])
-    except (TypeError, ValueError):
-        return jsonify({"error": "Price and spots must be numeric"}), 400
+    lot, = provision_lots([values])
+    db.session.commit()
 
-    if spots_count <= 0:
-        return jsonify({"error": "Number of spots must be > 0"}), 400
+    allocator.drop_lot(lot.id)  # free list is built from the DB on first booking
+    _after_lot_change(lot.id, "created")
 
-    lot = ParkingLot(
-        prime_location_name=data["prime_location_name"],
-        price_per_hour=price,
-        address=data["address"],
-        pincode=data["pincode"],
-        number_of_spots=spots_count
-    )
-    db.session.add(lot)
-    db.session.commit()  # so lot.id is available
+    return jsonify({"message": "Lot created"}), 201
+
+
+@bp.route("/api/admin/import_lots", methods=["POST"])
+@token_required
+@admin_required
+def import_lots(current_user):
+    """
+    Create many lots (and their spots) in one transaction from a JSON list
+    or CSV with the create_lot fields. ?dry_run=1 only validates.
+    Nothing is written if any row is invalid.
+    """
+    try:
+        rows = read_import_rows(request)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": f"Could not read lots: {e}"}), 400
+
+    values, errors = validate_rows(rows)
+    summary = {
+        "lots": len(values),
+        "spots": sum(v["number_of_spots"] for v in values),
+        "errors": errors
+    }
+    if errors:
+        return jsonify(summary), 400
+    if not values:
+        return jsonify({"error": "No lots supplied"}), 400
+
+    if request.args.get("dry_run") == "1":
+        return jsonify(dict(summary, dry_run=True))
 
-    # create spots
-    for _ in range(lot.number_of_spots):
-        db.session.add(ParkingSpot(lot_id=lot.id, status="A"))
+    lots = provision_lots(values)
     db.session.commit()
 
-    return jsonify({"message": "Lot created"}), 201
+    invalidate_lots()
+    lot_index.lot_changed()
+    http_cache.bump("lots", "spots")
+    events.lot_changed(None, "imported")
+
+    return jsonify(dict(summary, lot_ids=[lot.id for lot in lots])), 201
+
+
+def spot_count_query(lot_id, status=None):
+    stmt = select(func.count(ParkingSpot.id)).where(ParkingSpot.lot_id == lot_id)
+    return stmt if status is None else stmt.where(ParkingSpot.status == status)
+
+
+def removable_spots_query(lot_id, count):
+    """The lot's ``count`` newest free spots, the ones a shrink removes."""
+    return (
+        select(ParkingSpot.id)
+        .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == "A")
+        .order_by(ParkingSpot.id.desc())
+        .limit(count)
+    )
 
 
 @bp.route("/api/admin/update_lot/<int:lot_id>", methods=["PUT"])
@@ -279,6 +747,8 @@ def update_lot(current_user, lot_id):
             return jsonify({"error": "Invalid price"}), 400
 
     # Handle change in total number of spots
+    new_count = current_count = 0
+    removed_ids = []
     if "number_of_spots" in data and data["number_of_spots"] not in ("", None):
         try:
             new_count = int(data["number_of_spots"])
@@ -288,28 +758,41 @@ def update_lot(current_user, lot_id):
         if new_count <= 0:
             return jsonify({"error": "Number of spots must be > 0"}), 400
 
-        current_spots = ParkingSpot.query.filter_by(lot_id=lot.id).all()
-        current_count = len(current_spots)
-
-        if new_count > current_count:
-            # add extra spots
-            for _ in range(new_count - current_count):
-                db.session.add(ParkingSpot(lot_id=lot.id, status="A"))
-        elif new_count < current_count:
-            # only delete free spots
-            removable_needed = current_count - new_count
-            removable = ParkingSpot.query.filter_by(lot_id=lot.id, status="A")\
-                                         .order_by(ParkingSpot.id.desc())\
-                                         .limit(removable_needed).all()
-            if len(removable) != removable_needed:
-                return jsonify({"error": "Cannot reduce spots while some are occupied"}), 400
-
-            for s in removable:
-                db.session.delete(s)
+        with shards.lot_shard(lot.id):
+            current_count = db.session.execute(spot_count_query(lot.id)).scalar()
+
+            if new_count > current_count:
+                # add extra spots
+                add_spots(lot.id, new_count - current_count)
+                counters.adjust(lot.id, available=new_count - current_count)
+            elif new_count < current_count:
+                # only delete free spots
+                removable_needed = current_count - new_count
+                removed_ids = db.session.execute(removable_spots_query(lot.id, removable_needed)).scalars().all()
+                if len(removed_ids) != removable_needed:
+                    return jsonify({"error": "Cannot reduce spots while some are occupied"}), 400
+
+                removed = db.session.execute(
+                    delete(ParkingSpot)
+                    .where(ParkingSpot.id.in_(removed_ids), ParkingSpot.status == "A")
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                if removed != removable_needed:
+                    # one of them was booked since the SELECT: keep the lot as it was
+                    db.session.rollback()
+                    return jsonify({"error": "Spots changed while resizing, try again"}), 409
+                counters.adjust(lot.id, available=-removed)
 
         lot.number_of_spots = new_count
 
     db.session.commit()
+
+    if new_count > current_count:
+        allocator.drop_lot(lot.id)
+    elif removed_ids:
+        allocator.forget(lot.id, *removed_ids)
+    _after_lot_change(lot.id, "updated")
+
     return jsonify({"message": "Lot updated"})
 
 
@@ -319,85 +802,243 @@ def update_lot(current_user, lot_id):
 def delete_lot(current_user, lot_id):
     lot = ParkingLot.query.get_or_404(lot_id)
 
-    occupied_count = ParkingSpot.query.filter_by(lot_id=lot_id, status="O").count()
-    if occupied_count > 0:
-        return jsonify({"error": "Cannot delete, some spots are occupied"}), 400
+    # the flush of the lot's delete loads lot.spots too, so commit on its shard
+    with shards.lot_shard(lot_id):
+        occupied_count = db.session.execute(spot_count_query(lot_id, "O")).scalar()
+        if occupied_count > 0:
+            return jsonify({"error": "Cannot delete, some spots are occupied"}), 400
 
-    ParkingSpot.query.filter_by(lot_id=lot_id).delete()
-    db.session.delete(lot)
-    db.session.commit()
+        ParkingSpot.query.filter_by(lot_id=lot_id).delete()
+        counters.drop_lot(lot_id)
+        db.session.delete(lot)
+        counters.adjust(lots=-1)
+        db.session.commit()
+
+    allocator.drop_lot(lot_id)
+    _after_lot_change(lot_id, "deleted")
 
     return jsonify({"message": "Lot deleted"})
 
 
+BULK_RELEASE_MAX_IDS = 50000
+
+
+@bp.route("/api/admin/bulk_release", methods=["POST"])
+@token_required
+@admin_required
+def bulk_release(current_user):
+    """
+    Check out every active reservation of a lot ({"lot_id": 3}) or a list
+    of them ({"reservation_ids": [...]}) in one transaction, and return
+    the billing summary.
+    """
+    from backend.checkout import active_reservations, close_reservations, StaleRelease
+    data = request.json or {}
+    lot_id, ids = data.get("lot_id"), data.get("reservation_ids")
+    if (lot_id is None) == (ids is None):
+        return jsonify({"error": "Give either lot_id or reservation_ids"}), 400
+
+    try:
+        if lot_id is not None:
+            lot_id = int(lot_id)
+        else:
+            ids = [int(i) for i in ids]
+    except (TypeError, ValueError):
+        return jsonify({"error": "lot_id and reservation_ids must be integers"}), 400
+    if ids is not None and len(ids) > BULK_RELEASE_MAX_IDS:
+        return jsonify({"error": f"At most {BULK_RELEASE_MAX_IDS} reservations per call"}), 400
+    if lot_id is not None and db.session.get(ParkingLot, lot_id) is None:
+        return jsonify({"error": "Lot not found"}), 404
+
+    rows = active_reservations(lot_id=lot_id, reservation_ids=ids)
+    try:
+        billing, freed = close_reservations(rows)
+        db.session.commit()
+    except StaleRelease:
+        db.session.rollback()
+        return jsonify({"error": "Some reservations were released meanwhile, please retry"}), 409
+
+    for freed_lot, spot_ids in freed.items():
+        allocator.release(freed_lot, *spot_ids)
+        spot_bitmap.set(freed_lot, spot_ids, False)
+        invalidate_free(freed_lot)
+        events.lot_changed(freed_lot, "released")  # one reload instead of a delta per spot
+    if freed:
+        http_cache.bump("spots")
+    invalidate_summary(*{r["user_id"] for r in billing["reservations"]})
+
+    return jsonify(billing)
+
+
 # ----------------------------------------------------------
 # USER ROUTES
 # ----------------------------------------------------------
 @bp.route("/api/user/lots", methods=["GET"])
 @token_required
+@conditional("lots", "spots")
 def user_lots(current_user):
-    lots = ParkingLot.query.all()
-    data = []
-    for lot in lots:
-        free = ParkingSpot.query.filter_by(lot_id=lot.id, status="A").count()
-        data.append({
-            "id": lot.id,
-            "prime_location_name": lot.prime_location_name,
-            "price_per_hour": float(lot.price_per_hour),
-            "address": lot.address,
-            "pincode": lot.pincode,
-            "total_spots": lot.number_of_spots,
-            "available_spots": free
-        })
-    return jsonify(data)
+    return jsonify(lot_availability())
+
+
+LOT_SEARCH_PAGE_DEFAULT = 20
+LOT_SEARCH_PAGE_MAX = 100
+
+
+@bp.route("/api/user/lots/search", methods=["GET"])
+@token_required
+def search_lots(current_user):
+    """
+    ?q=<words of name/address>&pincode=<prefix>&min_price=&max_price=
+    &available=<min free spots>&sort=id|-id|price|-price|name|available|-available
+    &offset=&limit=
+    """
+    args = request.args
+    try:
+        limit = min(max(int(args.get("limit", LOT_SEARCH_PAGE_DEFAULT)), 1), LOT_SEARCH_PAGE_MAX)
+        offset = max(int(args.get("offset", 0)), 0)
+        min_price = float(args["min_price"]) if args.get("min_price") else None
+        max_price = float(args["max_price"]) if args.get("max_price") else None
+        min_available = int(args.get("available") or 0)
+        rows, more = lot_index.search(
+            q=args.get("q", ""), pincode=args.get("pincode", ""), min_price=min_price, max_price=max_price,
+            min_available=min_available, sort=args.get("sort", "id"), offset=offset, limit=limit,
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Invalid search: {e}"}), 400
+
+    counts = free_counts([lot["id"] for lot in rows])
+    for lot in rows:
+        lot["available_spots"] = counts.get(lot["id"], 0)
+    return jsonify({"lots": rows, "next_offset": offset + limit if more else None})
+
+
+def active_reservation_query(user_id):
+    """The user's active reservation (at most one)."""
+    return (
+        select(Reservation)
+        .where(Reservation.user_id == user_id, Reservation.leaving_timestamp.is_(None))
+        .limit(1)
+    )
 
 
 @bp.route("/api/user/book/<int:lot_id>", methods=["POST"])
 @token_required
 def book_spot(current_user, lot_id):
     # 1. Prevent same user from booking multiple active spots concurrently
-    existing_res = Reservation.query.filter_by(user_id=current_user.id, leaving_timestamp=None).first()
-    if existing_res:
+    existing_res = shards.each(lambda: db.session.scalar(active_reservation_query(current_user.id)))
+    if any(existing_res):
         return jsonify({"error": "You already have an active parking reservation"}), 400
 
-    # 2. Use with_for_update() to lock row/table and prevent race conditions between concurrent users
-    spot = ParkingSpot.query.filter_by(lot_id=lot_id, status="A").with_for_update().first()
-    if not spot:
-        return jsonify({"error": "No free spots"}), 400
+    if group_committer.enabled_for(lot_id):
+        return _book_batched(current_user, lot_id)
+
+    # 2. Claim a free spot (allocator first, DB scan as fallback) on the lot's shard
+    with shards.lot_shard(lot_id):
+        spot_id = claim_spot(lot_id)
+        if not spot_id:
+            return jsonify({"error": "No free spots"}), 400
+
+        res = Reservation(
+            spot_id=spot_id,
+            user_id=current_user.id,
+            parking_timestamp=datetime.utcnow()
+        )
+        db.session.add(res)
+        counters.adjust(lot_id, available=-1, occupied=1)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            allocator.release(lot_id, spot_id)
+            raise
+        reservation_id = res.id  # reloaded after commit, from the lot's shard
 
-    res = Reservation(
-        spot_id=spot.id,
-        user_id=current_user.id,
-        parking_timestamp=datetime.utcnow()
-    )
-    db.session.add(res)
-    spot.status = "O"
-    db.session.commit()
+    _after_spot_change(lot_id, spot_id, "A", "O")
+    invalidate_summary(current_user.id)
+    return jsonify({"reservation_id": reservation_id, "spot_id": spot_id})
 
-    return jsonify({"reservation_id": res.id, "spot_id": spot.id})
 
 
+def _booking_response(result):
+    if result["status"] == "booked":
+        return jsonify({"reservation_id": result["reservation_id"], "spot_id": result["spot_id"]})
+    if result["status"] == "pending":
+        return jsonify({"status": "pending"}), 202
+    return jsonify({"error": result["error"]}), result["code"]
+
+
+def _active_booking(user_id):
+    """
+    Ticket fallback while the cache is down: the user's active reservation,
+    if any. A user holds at most one, so it is the one the ticket booked.
+    """
+    found = [res for res in shards.each(lambda: db.session.scalar(active_reservation_query(user_id))) if res]
+    if not found:
+        return {"status": "pending", "user_id": user_id}
+    return {"status": "booked", "reservation_id": found[0].id, "spot_id": found[0].spot_id, "user_id": user_id}
+
+
+def _book_batched(current_user, lot_id):
+    """Surge mode: queue the booking for the lot's group commit."""
+    db.session.close()  # don't hold a pooled connection while the batcher needs one
+    try:
+        ticket = group_committer.submit(lot_id, current_user.id)
+    except QueueFull:
+        return jsonify({"error": "Too many bookings in progress, please retry"}), 503, {"Retry-After": "1"}
+
+    result = ticket.wait(current_app.config["BOOKING_WAIT_MS"] / 1000)
+    if result is None:
+        group_committer.publish_pending(ticket)
+        return jsonify({
+            "status": "pending",
+            "ticket": ticket.id,
+            "poll": f"/api/user/booking/{ticket.id}",
+        }), 202
+    return _booking_response(result)
+
+
+@bp.route("/api/user/booking/<ticket_id>", methods=["GET"])
+@token_required
+def booking_status(current_user, ticket_id):
+    result = group_committer.lookup(ticket_id)
+    if result is UNAVAILABLE:
+        result = _active_booking(current_user.id)
+    if not result or result.get("user_id") != current_user.id:
+        return jsonify({"error": "Unknown booking ticket"}), 404
+    return _booking_response(result)
+
+
+def open_reservation_query(reservation_id, user_id):
+    return select(Reservation).where(
+        Reservation.id == reservation_id,
+        Reservation.user_id == user_id,
+        Reservation.leaving_timestamp.is_(None),
+    )
+
 
 @bp.route("/api/user/release/<int:reservation_id>", methods=["POST"])
 @token_required
 def release_spot(current_user, reservation_id):
-    res = Reservation.query.filter_by(
-        id=reservation_id,
-        user_id=current_user.id,
-        leaving_timestamp=None
-    ).first()
-
-    if not res:
-        return jsonify({"error": "No active booking"}), 404
-
-    now = datetime.utcnow()
-    hours = (now - res.parking_timestamp).total_seconds() / 3600.0
-    cost = round(hours * float(res.spot.lot.price_per_hour), 2)
-
-    res.leaving_timestamp = now
-    res.total_cost = cost
-    res.spot.status = "A"
-    db.session.commit()
+    with shards.row_shard(reservation_id):
+        res = db.session.scalar(open_reservation_query(reservation_id, current_user.id))
+
+        if not res:
+            return jsonify({"error": "No active booking"}), 404
+
+        now = datetime.utcnow()
+        hours = (now - res.parking_timestamp).total_seconds() / 3600.0
+        cost = round(hours * float(res.spot.lot.price_per_hour), 2)
+
+        res.leaving_timestamp = now
+        res.total_cost = cost
+        res.spot.status = "A"
+        lot_id, spot_id = res.spot.lot_id, res.spot_id
+        counters.adjust(lot_id, available=1, occupied=-1)
+        db.session.commit()
+
+    allocator.release(lot_id, spot_id)
+    _after_spot_change(lot_id, spot_id, "O", "A")
+    invalidate_summary(current_user.id)
 
     return jsonify({"message": "Released", "total_cost": cost})
 
@@ -405,25 +1046,48 @@ def release_spot(current_user, reservation_id):
 @bp.route("/api/user/history", methods=["GET"])
 @token_required
 def history(current_user):
-    reservations = Reservation.query.filter_by(user_id=current_user.id).all()
-    return jsonify([
-        {
-            "reservation_id": r.id,
-            "spot_id": r.spot_id,
-            "lot_name": r.spot.lot.prime_location_name,
-            "parking_timestamp": r.parking_timestamp.isoformat() if r.parking_timestamp else None,
-            "leaving_timestamp": r.leaving_timestamp.isoformat() if r.leaving_timestamp else None,
-            "total_cost": float(r.total_cost) if r.total_cost is not None else None
-        }
-        for r in reservations
-    ])
+    """
+    One page of the user's reservations, newest first.
+    ?cursor=<next_cursor>&limit=50&from=YYYY-MM-DD&to=YYYY-MM-DD&lot_id=
+    The first page (no cursor) also carries the cached summary.
+    """
+    try:
+        limit = min(max(int(request.args.get("limit", HISTORY_PAGE_DEFAULT)), 1), HISTORY_PAGE_MAX)
+        cursor = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        date_from = parse_day(request.args["from"]) if request.args.get("from") else None
+        date_to = parse_day(request.args["to"], end=True) if request.args.get("to") else None
+        lot_id = int(request.args["lot_id"]) if request.args.get("lot_id") else None
+    except ValueError:
+        return jsonify({"error": "Invalid cursor, limit, date or lot_id"}), 400
+
+    rows, next_cursor = history_page(current_user.id, limit, cursor, date_from, date_to, lot_id)
+    payload = {"reservations": rows, "next_cursor": next_cursor}
+    if cursor is None:
+        payload["summary"] = history_summary(current_user.id)
+    return jsonify(payload)
+
+
+def user_summary_queries(user_id):
+    """(total and active reservations of the user, archived count)."""
+    counts = (
+        select(func.count(Reservation.id), func.count(case((Reservation.leaving_timestamp.is_(None), 1))))
+        .where(Reservation.user_id == user_id)
+    )
+    archived = select(func.count(ReservationArchive.id)).where(ReservationArchive.user_id == user_id)
+    return counts, archived
 
 
 @bp.route("/api/user/dashboard_summary", methods=["GET"])
 @token_required
 def user_summary(current_user):
-    total = Reservation.query.filter_by(user_id=current_user.id).count()
-    active = Reservation.query.filter_by(user_id=current_user.id, leaving_timestamp=None).count()
+    counts, archived = user_summary_queries(current_user.id)
+    if shards.enabled():
+        parts = shards.each(lambda: db.session.execute(counts).one())
+        total = sum(n for n, _ in parts) + db.session.execute(archived).scalar()
+        active = sum(n for _, n in parts)
+    else:
+        total, active, n_archived = db.session.execute(counts.add_columns(archived.scalar_subquery())).one()
+        total += n_archived
     return jsonify({
         "total_bookings": total,
         "active_reservations": active,
@@ -438,14 +1102,41 @@ def user_summary(current_user):
 @token_required
 def export_csv(current_user):
     from tasks import export_user_history_csv
-    task = export_user_history_csv.delay(current_user.id)
+    compress = bool((request.json or {}).get("gzip")) if request.is_json else False
+    task = export_user_history_csv.delay(current_user.id, compress)
     return jsonify({"task_id": task.id, "status": "started"})
 
 
+@bp.route("/api/user/history.csv", methods=["GET"])
+@token_required
+def download_history_csv(current_user):
+    """
+    Stream the CSV straight from the DB for small histories (?gzip=1 to
+    compress); larger ones must go through the Celery export.
+    """
+    limit = current_app.config["EXPORT_DIRECT_MAX_ROWS"]
+    if history_size(current_user.id) > limit:
+        return jsonify({"error": "History too large for direct download, use /api/user/export_csv"}), 413
+
+    filename = f"user_{current_user.id}_history.csv"
+    body = csv_chunks(current_user.id)
+    headers = {}
+    if request.args.get("gzip") == "1":
+        body = gzip_chunks(body)
+        filename += ".gz"
+        mimetype = "application/gzip"
+    else:
+        mimetype = "text/csv"
+
+    headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
 @bp.route("/api/user/export_status/<task_id>", methods=["GET"])
 @token_required
 def export_status(current_user, task_id):
-    result = AsyncResult(task_id)
+    from celery_app import celery
+    result = celery.AsyncResult(task_id)
     if result.state == "SUCCESS":
         return jsonify({"status": "completed", "filename": result.result["filename"]})
     return jsonify({"status": result.state})
@@ -454,7 +1145,8 @@ def export_status(current_user, task_id):
 @bp.route("/api/user/download_csv/<task_id>", methods=["GET"])
 @token_required
 def download_csv(current_user, task_id):
-    result = AsyncResult(task_id)
+    from celery_app import celery
+    result = celery.AsyncResult(task_id)
     if result.state != "SUCCESS":
         return jsonify({"status": result.state})
 
@@ -469,6 +1161,20 @@ def serve_csv(filename):
     return send_from_directory("exports", filename, as_attachment=True)
 
 
+# --------------------
+# METRICS
+# --------------------
+@bp.route("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape, only with ``Authorization: Bearer <METRICS_TOKEN>``; 404 while unset."""
+    token = current_app.config.get("METRICS_TOKEN")
+    if not token:
+        return jsonify({"error": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return jsonify({"error": "Metrics token required"}), 401
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 # --------------------
 # FRONTEND RENDERS
 # --------------------
@@ -0,0 +1,261 @@
+# backend/shards.py
+"""
+Optional sharding of spots and reservations by lot.
+
+``DATABASE_SHARDS`` maps lot id ranges to databases::
+
+    DATABASE_SHARDS="1-9999=postgresql://.../lots_a;10000-19999=postgresql://.../lots_b"
+
+Entry n (1, 2, ...) becomes the bind "shard<n>". A lot's ``parking_spot``,
+``reservation`` and ``lot_counter`` rows live on its shard; lots outside
+every range and all other tables (users, lots, global stats, archive,
+rollups) stay on the primary database. Unset, nothing changes.
+
+- Routing: ``RoutingSession`` sends statements on the sharded tables to
+  the bind made current with ``using()``/``lot_shard()``, otherwise to the
+  primary. ``flask --app run init-shards`` creates the tables on every
+  shard and starts shard n's ids at ``n * SHARD_ID_BLOCK``, so ids stay
+  unique across databases and an id alone names its shard (``for_row()``).
+- Reads over every shard use ``each()`` (one after another, in the
+  current session) or ``scatter()`` (in parallel, one session per shard)
+  and merge in Python: once sharding is on, sharded tables are never
+  joined with primary tables in SQL.
+- A booking, release or spot change and its lot counter commit together
+  on the lot's shard. Requests that write a shard and the primary (lot
+  create/delete) commit them one after the other, not atomically; drift
+  is repaired by ``counters.reconcile()``.
+"""
+import bisect
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import Column, Index, MetaData, Table, select, text, union_all
+from sqlalchemy.sql.util import find_tables
+
+from app_factory import db
+
+log = logging.getLogger(__name__)
+
+SHARDED_TABLES = frozenset({"parking_spot", "reservation", "lot_counter"})
+
+config = {"ranges": [], "lows": [], "block": 10 ** 8}
+_current = contextvars.ContextVar("db_shard", default=None)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def parse_shards(spec):
+    """``"lo-hi=url;..."`` -> [(lo, hi, bind, url), ...] ordered by ``lo``."""
+    ranges = []
+    for n, entry in enumerate(filter(None, (e.strip() for e in (spec or "").split(";"))), 1):
+        span, _, url = entry.partition("=")
+        low, _, high = span.partition("-")
+        if not url or not low.strip().isdigit() or not high.strip().isdigit():
+            raise ValueError(f"DATABASE_SHARDS entry must look like 'lo-hi=url', got {entry!r}")
+        ranges.append((int(low), int(high), f"shard{n}", url.strip()))
+    ranges.sort()
+    for (_, high, *_), (low, *_) in zip(ranges, ranges[1:]):
+        if low <= high:
+            raise ValueError("DATABASE_SHARDS lot ranges overlap")
+    return ranges
+
+
+def init_app(app):
+    config["ranges"] = [r[:3] for r in app.config.get("DATABASE_SHARDS", [])]
+    config["lows"] = [low for low, _, _ in config["ranges"]]
+    config["block"] = app.config.get("SHARD_ID_BLOCK", 10 ** 8)
+    app.extensions["shards"] = config
+
+
+# --------------------
+# ROUTING
+# --------------------
+def enabled():
+    return bool(config["ranges"])
+
+
+def binds():
+    """Every database holding spots/reservations: None (primary) first."""
+    return [None] + [bind for _, _, bind in config["ranges"]]
+
+
+def for_lot(lot_id):
+    """Bind of the lot's spots and reservations (None = primary)."""
+    i = bisect.bisect_right(config["lows"], lot_id) - 1
+    if i >= 0 and lot_id <= config["ranges"][i][1]:
+        return config["ranges"][i][2]
+    return None
+
+
+def for_row(row_id):
+    """Bind a spot or reservation id was allocated on."""
+    n = row_id // config["block"]
+    return f"shard{n}" if 0 < n <= len(config["ranges"]) else None
+
+
+def current():
+    return _current.get()
+
+
+def routes(mapper, clause):
+    """True if a statement touches a sharded table (called by RoutingSession)."""
+    if mapper is not None and mapper.local_table.name in SHARDED_TABLES:
+        return True
+    if clause is None:
+        return False
+    return any(getattr(t, "name", None) in SHARDED_TABLES for t in find_tables(clause, include_crud=True))
+
+
+@contextmanager
+def using(bind):
+    """Send sharded-table statements in this block to ``bind``."""
+    token = _current.set(bind)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def lot_shard(lot_id):
+    return using(for_lot(lot_id))
+
+
+def row_shard(row_id):
+    return using(for_row(row_id))
+
+
+def by_lot(lot_ids):
+    """{bind: [lot ids]} for these lots."""
+    grouped = {}
+    for lot_id in lot_ids:
+        grouped.setdefault(for_lot(lot_id), []).append(lot_id)
+    return grouped
+
+
+def by_row(row_ids):
+    """{bind: [ids]} for these spot or reservation ids."""
+    grouped = {}
+    for row_id in row_ids:
+        grouped.setdefault(for_row(row_id), []).append(row_id)
+    return grouped
+
+
+# --------------------
+# FAN-OUT
+# --------------------
+def each(fn):
+    """[fn() with each bind current], one after another in this session."""
+    if not enabled():
+        return [fn()]
+    results = []
+    for bind in binds():
+        with using(bind):
+            results.append(fn())
+    return results
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(len(binds()), thread_name_prefix="shard-scatter")
+        return _executor
+
+
+def scatter(fn):
+    """
+    [fn() with each bind current] run in parallel, each in its own app
+    context and session. Read-only callers; results in ``binds()`` order.
+    Each call runs in a copy of the caller's context, so context variables
+    (the metrics scope of the request) carry over to the pool threads.
+    """
+    if not enabled():
+        return [fn()]
+    app = current_app._get_current_object()
+
+    def run(bind):
+        with app.app_context(), using(bind):
+            return fn()
+
+    futures = [_pool().submit(contextvars.copy_context().run, run, bind) for bind in binds()]
+    return [future.result() for future in futures]
+
+
+def union_rows(hot, cold):
+    """
+    Rows of ``hot`` (on sharded tables) and ``cold`` (primary only): one
+    UNION ALL when sharding is off, else ``hot`` on every bind plus ``cold``.
+    """
+    if not enabled():
+        return db.session.execute(union_all(hot, cold)).all()
+    rows = [row for part in each(lambda: db.session.execute(hot).all()) for row in part]
+    return rows + db.session.execute(cold).all()
+
+
+def lot_names(lot_ids=None):
+    """{lot_id: name} from the primary, for rows read off a shard without the join."""
+    from backend.models import ParkingLot
+
+    stmt = select(ParkingLot.id, ParkingLot.prime_location_name)
+    if lot_ids is not None:
+        stmt = stmt.where(ParkingLot.id.in_(set(lot_ids)))
+    return dict(db.session.execute(stmt).all())
+
+
+# --------------------
+# SCHEMA
+# --------------------
+def _shard_table(table, metadata):
+    """Copy of a sharded table without foreign keys (their targets live on the primary)."""
+    copy = Table(
+        table.name, metadata,
+        *(Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable,
+                 autoincrement=c.autoincrement) for c in table.columns),
+        sqlite_autoincrement="id" in table.c,  # so the id start below is honoured
+    )
+    for index in table.indexes:
+        Index(index.name, *(copy.c[c.name] for c in index.columns), unique=index.unique, **index.dialect_kwargs)
+    return copy
+
+
+def _start_ids(conn, table, start):
+    """Make the next id of ``table`` at least ``start + 1``."""
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) SELECT :t, 0 "
+                          "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :t)"), {"t": table})
+        conn.execute(text("UPDATE sqlite_sequence SET seq = MAX(seq, :s) WHERE name = :t"), {"t": table, "s": start})
+    elif conn.dialect.name == "postgresql":
+        conn.execute(text(f"SELECT setval(pg_get_serial_sequence(:t, 'id'), "
+                          f"GREATEST(:s, (SELECT COALESCE(MAX(id), 0) FROM {table})))"), {"t": table, "s": start})
+    else:
+        raise click.ClickException(f"init-shards does not support {conn.dialect.name}")
+
+
+def init_schema():
+    """Create the sharded tables on every shard and move their ids into the shard's block."""
+    metadata = MetaData()
+    tables = [_shard_table(db.metadata.tables[name], metadata) for name in sorted(SHARDED_TABLES)]
+    for n, bind in enumerate(binds()[1:], 1):
+        engine = db.engines[bind]
+        metadata.create_all(engine)
+        with engine.begin() as conn:
+            for table in tables:
+                if "id" in table.c:
+                    _start_ids(conn, table.name, n * config["block"])
+        log.info("Shard %s ready, ids from %s", bind, n * config["block"] + 1)
+
+
+@click.command("init-shards")
+@with_appcontext
+def init_shards_command():
+    """Create spot/reservation tables on every DATABASE_SHARDS database."""
+    if not enabled():
+        raise click.ClickException("DATABASE_SHARDS is not set")
+    init_schema()
+    click.echo(f"{len(binds()) - 1} shards ready.")
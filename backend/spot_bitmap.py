@@ -0,0 +1,377 @@
+# backend/spot_bitmap.py
+"""
+Packed per-lot occupancy bitmaps for the admin dashboard.
+
+A lot's *layout* is its spot ids in ascending order, stored as runs
+``[[first_id, count], ...]`` (spots are provisioned in blocks, so a lot is
+usually one or two runs). Bit ``i`` of the lot's bitmap is 1 when the
+``i``-th spot of the layout is occupied, most significant bit first (the
+Redis SETBIT order). ``layout`` in every payload is a hash of the runs, so
+clients only refetch the runs when it changes.
+
+Bitmaps live in Redis (shared by every worker) or in this process, like
+the allocator's free lists. ``book_spot``/``release_spot`` flip one bit
+after commit; a lot is rebuilt from ``parking_spot`` with one query when
+it is missing, when lot CRUD dropped it, and every ``SPOT_BITMAP_TTL``
+seconds as a backstop. Every write bumps the lot's change counter, built
+or not, and a rebuild is stored only if the counter did not move while it
+read the DB, so a booking racing a rebuild never leaves a stale bitmap
+behind. A write whose worker held an out-of-date layout drops the bitmap
+instead of guessing.
+"""
+import bisect
+import hashlib
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+import redis
+from sqlalchemy import select
+
+from app_factory import db
+from backend import shards
+
+log = logging.getLogger(__name__)
+
+
+class BitmapUnavailable(Exception):
+    """The backing store cannot be used right now; build from the DB instead."""
+
+
+def _runs(spot_ids):
+    """Sorted id array -> [[first_id, count], ...]."""
+    if not len(spot_ids):
+        return []
+    breaks = np.flatnonzero(np.diff(spot_ids) != 1) + 1
+    starts = np.concatenate(([0], breaks))
+    counts = np.diff(np.concatenate((starts, [len(spot_ids)])))
+    return [[first, count] for first, count in zip(spot_ids[starts].tolist(), counts.tolist())]
+
+
+def _layout_id(runs):
+    return hashlib.blake2b(json.dumps(runs).encode(), digest_size=6).hexdigest()
+
+
+class _Layout:
+    """Spot id -> bit offset for one lot, O(number of runs) memory."""
+
+    __slots__ = ("id", "runs", "starts", "offsets", "size")
+
+    def __init__(self, runs, layout_id=None):
+        self.runs = runs
+        self.id = layout_id or _layout_id(runs)
+        self.starts = [first for first, _ in runs]
+        self.offsets, total = [], 0
+        for _, count in runs:
+            self.offsets.append(total)
+            total += count
+        self.size = total
+
+    def offset(self, spot_id):
+        i = bisect.bisect_right(self.starts, spot_id) - 1
+        if i < 0 or spot_id >= self.starts[i] + self.runs[i][1]:
+            return None
+        return self.offsets[i] + spot_id - self.starts[i]
+
+
+def layout_query(lot_ids):
+    """The spots of these lots in ix_parking_spot_lot_status order: free ones first, by id."""
+    from backend.models import ParkingSpot
+
+    spots = ParkingSpot.__table__.c
+    return (
+        select(spots.lot_id, spots.status, spots.id)
+        .where(spots.lot_id.in_(lot_ids))
+        .order_by(spots.lot_id, spots.status, spots.id)
+    )
+
+
+def _build(lot_ids):
+    """
+    {lot_id: (runs, packed bits)} for these lots, from ``parking_spot`` in
+    one query (per shard) that walks ix_parking_spot_lot_status in index order.
+    """
+    rows = []
+    for bind, shard_lots in shards.by_lot(lot_ids).items():
+        with shards.using(bind):
+            rows += db.session.execute(layout_query(shard_lots)).all()
+    per_lot = {lot_id: ([], []) for lot_id in lot_ids}
+    for lot_id, status, spot_id in rows:
+        per_lot[lot_id][status == "O"].append(spot_id)
+
+    built = {}
+    for lot_id, (free, occupied) in per_lot.items():
+        ids = np.array(free + occupied, dtype=np.int64)
+        is_occupied = np.zeros(len(ids), dtype=bool)
+        is_occupied[len(free):] = True
+        order = np.argsort(ids, kind="stable")
+        built[lot_id] = (_runs(ids[order]), np.packbits(is_occupied[order]).tobytes())
+    return built
+
+
+# --------------------
+# BACKENDS
+# --------------------
+class MemoryBackend:
+    """Bitmaps held in this process (one bytearray per lot)."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._lots = {}  # lot_id -> [layout id, runs, bytearray, loaded at]
+        self._changes = {}  # lot_id -> writes so far
+
+    def _entry(self, lot_id):
+        entry = self._lots.get(lot_id)
+        if entry is not None and time.monotonic() - entry[3] < self.ttl:
+            return entry
+        return None
+
+    def read(self, lot_id):
+        with self._lock:
+            entry = self._entry(lot_id)
+            return (entry[0], entry[1], bytes(entry[2])) if entry else None
+
+    def layout(self, lot_id):
+        with self._lock:
+            entry = self._entry(lot_id)
+            return (entry[0], entry[1]) if entry else None
+
+    def changes(self, lot_id):
+        with self._lock:
+            return self._changes.get(lot_id, 0)
+
+    def store(self, lot_id, layout_id, runs, bits, changes):
+        """Keep a rebuilt bitmap unless the lot was written since ``changes`` was read."""
+        with self._lock:
+            if self._changes.get(lot_id, 0) != changes:
+                return False
+            self._lots[lot_id] = [layout_id, runs, bytearray(bits), time.monotonic()]
+            return True
+
+    def changed(self, lot_id):
+        with self._lock:
+            self._changes[lot_id] = self._changes.get(lot_id, 0) + 1
+
+    def set_bits(self, lot_id, offsets, value):
+        with self._lock:
+            self._changes[lot_id] = self._changes.get(lot_id, 0) + 1
+            entry = self._entry(lot_id)
+            if entry is None:
+                return None
+            bits = entry[2]
+            for offset in offsets:
+                if value:
+                    bits[offset >> 3] |= 0x80 >> (offset & 7)
+                else:
+                    bits[offset >> 3] &= ~(0x80 >> (offset & 7)) & 0xFF
+            return entry[0]
+
+    def drop(self, lot_id):
+        with self._lock:
+            self._changes[lot_id] = self._changes.get(lot_id, 0) + 1
+            self._lots.pop(lot_id, None)
+
+
+class RedisBackend:
+    """Bitmaps shared by every worker: one Redis string per lot, flipped with SETBIT."""
+
+    prefix = "parking:bitmap"
+
+    def __init__(self, url, ttl):
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+    def _keys(self, lot_id):
+        return tuple(f"{self.prefix}:{lot_id}:{part}" for part in ("id", "runs", "bits"))
+
+    def _changes_key(self, lot_id):
+        return f"{self.prefix}:{lot_id}:changes"
+
+    def _bump(self, pipe, lot_id):
+        # outlives the bitmap, so a rebuild that started before it expired still sees the writes
+        pipe.incr(self._changes_key(lot_id))
+        pipe.expire(self._changes_key(lot_id), self.ttl * 10)
+
+    def read(self, lot_id):
+        layout_id, runs, bits = self.client.mget(self._keys(lot_id))
+        if layout_id is None or runs is None:
+            return None
+        return layout_id.decode(), json.loads(runs), bits or b""
+
+    def layout(self, lot_id):
+        layout_id, runs = self.client.mget(self._keys(lot_id)[:2])
+        if layout_id is None or runs is None:
+            return None
+        return layout_id.decode(), json.loads(runs)
+
+    def changes(self, lot_id):
+        return int(self.client.get(self._changes_key(lot_id)) or 0)
+
+    def store(self, lot_id, layout_id, runs, bits, changes):
+        """Keep a rebuilt bitmap unless the lot was written since ``changes`` was read."""
+        id_key, runs_key, bits_key = self._keys(lot_id)
+        with self.client.pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(self._changes_key(lot_id))
+                if int(pipe.get(self._changes_key(lot_id)) or 0) != changes:
+                    return False
+                pipe.multi()
+                pipe.set(bits_key, bits, ex=self.ttl)
+                pipe.set(runs_key, json.dumps(runs), ex=self.ttl)
+                pipe.set(id_key, layout_id, ex=self.ttl)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def changed(self, lot_id):
+        pipe = self.client.pipeline(transaction=True)
+        self._bump(pipe, lot_id)
+        pipe.execute()
+
+    def set_bits(self, lot_id, offsets, value):
+        id_key, _, bits_key = self._keys(lot_id)
+        # one MULTI so a concurrent store() lands wholly before or after these bits
+        pipe = self.client.pipeline(transaction=True)
+        self._bump(pipe, lot_id)
+        pipe.get(id_key)
+        for offset in offsets:
+            pipe.setbit(bits_key, offset, int(value))
+        layout_id = pipe.execute()[2]
+        return layout_id.decode() if layout_id is not None else None
+
+    def drop(self, lot_id):
+        pipe = self.client.pipeline(transaction=True)
+        self._bump(pipe, lot_id)
+        pipe.delete(*self._keys(lot_id))
+        pipe.execute()
+
+
+# --------------------
+# BITMAPS
+# --------------------
+class SpotBitmap:
+    """
+    Front door used by the routes. Backend errors trip a short circuit
+    breaker: reads are then built from the DB, writes are skipped (the
+    bitmap is rebuilt once its TTL runs out).
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.retry_after = 30
+        self._down_until = 0.0
+        self._layouts = {}  # lot_id -> _Layout last seen by this worker
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        kind = app.config.get("SPOT_BITMAP", "redis")
+        ttl = app.config.get("SPOT_BITMAP_TTL", 10)
+        self.retry_after = app.config.get("SPOT_BITMAP_RETRY_AFTER", 30)
+
+        if kind == "redis":
+            self.backend = RedisBackend(app.config["SPOT_BITMAP_REDIS_URL"], ttl)
+        elif kind == "memory":
+            self.backend = MemoryBackend(ttl)
+        else:
+            self.backend = None
+
+        app.extensions["spot_bitmap"] = self
+
+    def _call(self, fn, *args):
+        if self.backend is None or time.monotonic() < self._down_until:
+            raise BitmapUnavailable()
+        try:
+            return fn(*args)
+        except redis.RedisError as e:
+            log.warning("Spot bitmap store unavailable, using DB: %s", e)
+            self._down_until = time.monotonic() + self.retry_after
+            raise BitmapUnavailable() from e
+
+    def _best_effort(self, fn, *args):
+        try:
+            return self._call(fn, *args)
+        except BitmapUnavailable:
+            return None
+
+    # --------------------
+    # READ
+    # --------------------
+    def snapshots(self, lot_ids):
+        """
+        {lot_id: {"layout", "runs", "spots", "occupied", "bits"}} for these
+        lots; whatever the store is missing is built with one query.
+        """
+        found, missing = {}, {}
+        for lot_id in lot_ids:
+            got = self._best_effort(self.backend.read, lot_id) if self.backend else None
+            if got is None:
+                # read before the DB: a write landing during the build moves it and skips the store
+                missing[lot_id] = self._best_effort(self.backend.changes, lot_id) if self.backend else None
+            else:
+                found[lot_id] = got
+        if missing:
+            for lot_id, (runs, bits) in _build(list(missing)).items():
+                layout_id = _layout_id(runs)
+                found[lot_id] = (layout_id, runs, bits)
+                if missing[lot_id] is not None:
+                    self._best_effort(self.backend.store, lot_id, layout_id, runs, bits, missing[lot_id])
+
+        result = {}
+        for lot_id in lot_ids:
+            layout_id, runs, bits = found[lot_id]
+            layout = _Layout(runs, layout_id)
+            self._layouts[lot_id] = layout
+            bits = bits[:(layout.size + 7) // 8].ljust((layout.size + 7) // 8, b"\0")
+            result[lot_id] = {
+                "layout": layout_id,
+                "runs": runs,
+                "spots": layout.size,
+                "occupied": int.from_bytes(bits, "big").bit_count(),
+                "bits": bits,
+            }
+        return result
+
+    # --------------------
+    # WRITE (call after commit)
+    # --------------------
+    def _layout(self, lot_id):
+        layout = self._layouts.get(lot_id)
+        if layout is None:
+            got = self._call(self.backend.layout, lot_id)
+            if got is None:
+                return None  # not built anywhere yet; the next read builds it
+            layout = self._layouts[lot_id] = _Layout(got[1], got[0])
+        return layout
+
+    def _set(self, lot_id, spot_ids, occupied):
+        layout = self._layout(lot_id)
+        if layout is None:
+            self.backend.changed(lot_id)  # a rebuild may be reading the DB right now
+            return
+        offsets = [layout.offset(spot_id) for spot_id in spot_ids]
+        if None in offsets:
+            self._drop(lot_id)  # spots added since this worker saw the layout
+            return
+        if self.backend.set_bits(lot_id, offsets, occupied) != layout.id:
+            self._drop(lot_id)  # layout changed meanwhile: the bits may have landed anywhere
+
+    def _drop(self, lot_id):
+        self._layouts.pop(lot_id, None)
+        self.backend.drop(lot_id)
+
+    def set(self, lot_id, spot_ids, occupied):
+        """Mark spots of one lot occupied (True) or free (False)."""
+        if spot_ids:
+            self._best_effort(self._set, lot_id, spot_ids, occupied)
+
+    def drop_lot(self, lot_id):
+        """Lot CRUD: spots were added or removed, rebuild on next read."""
+        self._best_effort(self._drop, lot_id)
+
+
+spot_bitmap = SpotBitmap()
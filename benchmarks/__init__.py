@@ -0,0 +1,11 @@
+"""
+Endpoint benchmarks for backend/routes.py.
+
+    python -m benchmarks.run --lots 50 --spots 200 --users 500 --reservations 50000 --out bench.json
+    python -m benchmarks.compare baseline.json bench.json
+
+The runner builds the real app with create_app() against a scratch
+SQLite file (or --database-url, e.g. a local Postgres), seeds it with
+benchmarks.datagen, and drives every API route through the Flask test
+client, recording latency percentiles and SQL statements per request.
+"""
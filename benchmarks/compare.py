@@ -0,0 +1,60 @@
+# benchmarks/compare.py
+"""
+Diff a benchmark run against a baseline; exits 1 on regression.
+
+    python -m benchmarks.compare baseline.json bench.json --threshold 0.25
+"""
+import argparse
+import json
+import sys
+
+
+def compare(baseline, current, threshold, min_ms):
+    """Return a list of human-readable regressions."""
+    regressions = []
+    for name, base in baseline["routes"].items():
+        cur = current["routes"].get(name)
+        if cur is None:
+            regressions.append(f"{name}: missing from current run")
+            continue
+
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            # ignore sub-millisecond noise
+            if cur[key] > base[key] * (1 + threshold) and cur[key] - base[key] > min_ms:
+                regressions.append(f"{name}: {key} {base[key]:.2f} -> {cur[key]:.2f}")
+
+        if cur["queries_per_request"] > base["queries_per_request"]:
+            regressions.append(
+                f"{name}: queries/request {base['queries_per_request']} -> {cur['queries_per_request']}"
+            )
+        if cur["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {cur['errors']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    if baseline["meta"]["sizes"] != current["meta"]["sizes"]:
+        print("warning: runs used different data sizes", file=sys.stderr)
+
+    regressions = compare(baseline, current, args.threshold, args.min_ms)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
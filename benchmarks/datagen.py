@@ -0,0 +1,71 @@
+# benchmarks/datagen.py
+"""
+Deterministic synthetic data: N lots x M spots, U users and K closed
+historical reservations, written with bulk Core INSERTs.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from app_factory import db
+from backend import counters
+from backend.models import User, ParkingLot, ParkingSpot, Reservation
+
+PASSWORD = "bench-pass"
+CHUNK = 10000
+
+
+def _bulk(table, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.session.execute(insert(table), rows[start:start + CHUNK])
+
+
+def seed(lots=50, spots_per_lot=200, users=500, reservations=50000, seed=42):
+    """Create the schema and fill it. Returns the generated sizes."""
+    rnd = random.Random(seed)
+    now = datetime.utcnow()
+
+    db.create_all(bind_key=None)  # the primary, as bootstrap does
+
+    # one hash for everyone: hashing is not what we are measuring here
+    pw_hash = generate_password_hash(PASSWORD)
+    _bulk(User.__table__, [
+        {"username": f"bench_user_{i}", "email": f"bench_user_{i}@example.com",
+         "password_hash": pw_hash, "role": "user", "created_at": now}
+        for i in range(users)
+    ])
+    if not User.query.filter_by(role="admin").first():
+        _bulk(User.__table__, [{"username": "admin", "email": "admin@parking.com",
+                                "password_hash": generate_password_hash("admin123"),
+                                "role": "admin", "created_at": now}])
+
+    _bulk(ParkingLot.__table__, [
+        {"prime_location_name": f"Bench Lot {i}", "price_per_hour": rnd.choice([20, 30, 40, 50, 60]),
+         "address": f"{i} Bench Street", "pincode": f"{560000 + i % 100:06d}",
+         "number_of_spots": spots_per_lot, "created_at": now}
+        for i in range(lots)
+    ])
+    lot_ids = [i for (i,) in db.session.query(ParkingLot.id)]
+    _bulk(ParkingSpot.__table__, [
+        {"lot_id": lot_id, "status": "A", "created_at": now}
+        for lot_id in lot_ids for _ in range(spots_per_lot)
+    ])
+
+    user_ids = [i for (i,) in db.session.query(User.id).filter(User.role == "user")]
+    spot_ids = [i for (i,) in db.session.query(ParkingSpot.id)]
+    rows = []
+    for _ in range(reservations):
+        start = now - timedelta(minutes=rnd.randint(60, 90 * 24 * 60))
+        hours = rnd.uniform(0.25, 8)
+        rows.append({
+            "spot_id": rnd.choice(spot_ids), "user_id": rnd.choice(user_ids),
+            "parking_timestamp": start, "leaving_timestamp": start + timedelta(hours=hours),
+            "total_cost": round(hours * 40, 2),
+        })
+    _bulk(Reservation.__table__, rows)
+    db.session.commit()
+
+    counters.reconcile()
+    return {"lots": lots, "spots": lots * spots_per_lot, "users": users, "reservations": reservations}
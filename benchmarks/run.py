@@ -0,0 +1,166 @@
+# benchmarks/run.py
+"""
+Time every API route against a seeded database and save a JSON baseline.
+
+    python -m benchmarks.run --lots 50 --spots 200 --users 500 \
+        --reservations 50000 --iterations 200 --out bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def summarize(samples):
+    """samples: (elapsed ms, statements, failed) tuples -> route stats."""
+    timings = sorted(t for t, _, _ in samples)
+    return {
+        "iterations": len(samples),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "queries_per_request": round(sum(q for _, q, _ in samples) / len(samples), 2),
+        "errors": sum(failed for _, _, failed in samples),
+    }
+
+
+def timed(counter, request_fn, i):
+    before = counter.count
+    start = time.perf_counter()
+    response = request_fn(i)
+    return (time.perf_counter() - start) * 1000, counter.count - before, response.status_code >= 400
+
+
+def report_line(name, stats):
+    print(f"{name:28s} p50={stats['p50_ms']:8.2f}ms p95={stats['p95_ms']:8.2f}ms "
+          f"p99={stats['p99_ms']:8.2f}ms q/req={stats['queries_per_request']}", file=sys.stderr)
+
+
+def run(args):
+    from app_factory import create_app, db
+    from backend.models import User, ParkingLot
+    from backend.routes import create_token
+    from benchmarks.datagen import seed
+
+    app = create_app()
+    results = {}
+    with app.app_context():
+        sizes = seed(args.lots, args.spots, args.users, args.reservations, args.seed)
+        counter = QueryCounter(db.engine)
+
+        admin = User.query.filter_by(role="admin").first()
+        users = User.query.filter_by(role="user").order_by(User.id).all()
+        admin_h = {"Authorization": f"Bearer {create_token(admin)}"}
+        user_h = [{"Authorization": f"Bearer {create_token(u)}"} for u in users]
+        lot_ids = [i for (i,) in db.session.query(ParkingLot.id).order_by(ParkingLot.id)]
+
+    with app.app_context():
+        from backend.allocator import allocator
+        allocator.rebuild()  # what `flask bootstrap` leaves behind in a deployment
+
+    client = app.test_client()
+    client.get("/")
+    n = args.iterations
+
+    def admin(path):
+        return lambda i: client.get(path, headers=admin_h)
+
+    def per_user(path):
+        return lambda i: client.get(path, headers=user_h[i % len(user_h)])
+
+    routes = [
+        ("user_lots", per_user("/api/user/lots")),
+        ("history", per_user("/api/user/history")),
+        ("user_summary", per_user("/api/user/dashboard_summary")),
+        ("admin_dashboard_summary", admin("/api/admin/dashboard_summary")),
+        ("admin_spots", admin("/api/admin/spots?limit=500")),
+        ("admin_lots", admin("/api/admin/lots")),
+        ("admin_users", admin("/api/admin/users")),
+    ]
+    for name, fn in routes:
+        fn(0)  # warm-up (caches, lazy imports)
+        results[name] = summarize([timed(counter, fn, i) for i in range(n)])
+        report_line(name, results[name])
+
+    # book/release in pairs: each booking is released again, so nobody keeps a spot
+    reservations = {}
+
+    def book(i):
+        response = client.post(f"/api/user/book/{lot_ids[i % len(lot_ids)]}", headers=user_h[i % len(user_h)])
+        if response.status_code == 200:
+            reservations[i] = response.get_json()["reservation_id"]
+        return response
+
+    def release(i):
+        return client.post(f"/api/user/release/{reservations.pop(i, 0)}", headers=user_h[i % len(user_h)])
+
+    book(-1), release(-1)  # warm-up
+    samples = {"book_spot": [], "release_spot": []}
+    for i in range(n):
+        samples["book_spot"].append(timed(counter, book, i))
+        samples["release_spot"].append(timed(counter, release, i))
+    for name, route_samples in samples.items():
+        results[name] = summarize(route_samples)
+        report_line(name, results[name])
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "database": app.config["SQLALCHEMY_DATABASE_URI"].split(":", 1)[0],
+            "python": platform.python_version(),
+            "iterations": n,
+            "sizes": sizes,
+        },
+        "routes": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lots", type=int, default=50)
+    parser.add_argument("--spots", type=int, default=200, help="spots per lot")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--reservations", type=int, default=50000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="default: a scratch SQLite file (must be an empty database)")
+    parser.add_argument("--out", default="bench.json")
+    args = parser.parse_args(argv)
+
+    # create_app() reads its configuration from the environment
+    tmpdir = tempfile.mkdtemp(prefix="parking-bench-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ.setdefault("CACHE_TYPE", "SimpleCache")
+    os.environ.setdefault("SPOT_ALLOCATOR", "memory")
+
+    report = run(args)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Saved {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
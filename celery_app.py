@@ -1,41 +1,73 @@
 import os
+import threading
 from celery import Celery
 from celery.schedules import crontab
-from app_factory import create_app
-
-flask_app = create_app()
+from flask import has_app_context
 
 # ✅ Use REDIS_URL from environment (Render/Railway)
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 
+_flask_app = None
+_flask_app_lock = threading.Lock()
+
+
+def get_flask_app():
+    """
+    The Flask app tasks run in, built on first use. Importing this module
+    (e.g. from the web process to enqueue a task) no longer creates one.
+    """
+    global _flask_app
+    if _flask_app is None:
+        with _flask_app_lock:
+            if _flask_app is None:
+                from app_factory import create_app
+                _flask_app = create_app()
+    return _flask_app
+
 
-def make_celery(app):
+def make_celery():
     celery = Celery(
-        app.import_name,
+        "app_factory",
         broker=REDIS_URL,
         backend=REDIS_URL,
         include=["tasks"]
     )
 
-    celery.conf.update(app.config)
-
     class ContextTask(celery.Task):
         def __call__(self, *args, **kwargs):
-            with app.app_context():
+            if has_app_context():  # eager call from inside a request
+                return super().__call__(*args, **kwargs)
+            with get_flask_app().app_context():
                 return super().__call__(*args, **kwargs)
 
     celery.Task = ContextTask
     return celery
 
 
-celery = make_celery(flask_app)
+celery = make_celery()
+
+# ✅ Same SQL/latency counters as the web app; set CELERY_METRICS_PORT to scrape workers
+from backend import metrics
+metrics.init_celery(celery, port=int(os.getenv("CELERY_METRICS_PORT", 0)) or None)
 
 # ✅ Runs daily at 6 PM IST
 celery.conf.beat_schedule = {
     "daily-reminder-job": {
         "task": "tasks.send_daily_reminders",
         "schedule": crontab(hour=18, minute=0),
-    }
+    },
+    "reconcile-counters-job": {
+        "task": "tasks.reconcile_counters",
+        "schedule": crontab(minute="*/15"),
+    },
+    "archive-reservations-job": {
+        "task": "tasks.archive_reservations",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    "refresh-analytics-job": {
+        "task": "tasks.refresh_analytics",
+        "schedule": crontab(minute="*/10"),
+    },
 }
 
 celery.conf.timezone = "Asia/Kolkata"
@@ -1,9 +1,17 @@
+from flask import current_app
 from flask_mail import Mail, Message
-from celery_app import flask_app
 
-mail = Mail(flask_app)
+mail = Mail()
 
-def send_email(to, subject, body, html=False):
+
+def _mail():
+    """Bind Flask-Mail to the current app on first use (web workers never pay for it)."""
+    if "mail" not in current_app.extensions:
+        mail.init_app(current_app)
+    return mail
+
+
+def send_email(to, subject, body, html=False, connection=None):
     msg = Message(subject, recipients=[to])
 
     if html:
@@ -11,4 +19,12 @@ def send_email(to, subject, body, html=False):
     else:
         msg.body = body
 
-    mail.send(msg)
+    if connection is not None:
+        connection.send(msg)
+    else:
+        _mail().send(msg)
+
+
+def mail_connection():
+    """One SMTP connection for sending many messages (use as a context manager)."""
+    return _mail().connect()
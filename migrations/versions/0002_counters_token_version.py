@@ -0,0 +1,47 @@
+"""occupancy counters and token version
+
+Revision ID: 0002_counters_token_version
+Revises: 0001_initial
+Create Date: 2026-10-17 09:10:00.000000
+
+Counters start at zero; they are filled in by counters.reconcile()
+(run at bootstrap and by the reconcile_counters beat job).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_counters_token_version'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('available_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('occupied_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+    op.create_table('parking_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('total_lots', sa.Integer(), nullable=False),
+    sa.Column('available_spots', sa.Integer(), nullable=False),
+    sa.Column('occupied_spots', sa.Integer(), nullable=False),
+    sa.Column('registered_users', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('parking_stats')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
+
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.drop_column('occupied_count')
+        batch_op.drop_column('available_count')
@@ -0,0 +1,46 @@
+"""indexes for the hot booking/history queries
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_counters_token_version
+Create Date: 2026-10-17 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_hot_path_indexes'
+down_revision = '0002_counters_token_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index('ix_users_role', ['role'], unique=False)
+
+    with op.batch_alter_table('parking_spot', schema=None) as batch_op:
+        batch_op.create_index('ix_parking_spot_lot_status', ['lot_id', 'status'], unique=False)
+
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_user_leaving', ['user_id', 'leaving_timestamp'], unique=False)
+        batch_op.create_index('ix_reservation_spot_leaving', ['spot_id', 'leaving_timestamp'], unique=False)
+        batch_op.create_index(
+            'ix_reservation_active_user', ['user_id'], unique=False,
+            sqlite_where=sa.text('leaving_timestamp IS NULL'),
+            postgresql_where=sa.text('leaving_timestamp IS NULL'),
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_active_user')
+        batch_op.drop_index('ix_reservation_spot_leaving')
+        batch_op.drop_index('ix_reservation_user_leaving')
+
+    with op.batch_alter_table('parking_spot', schema=None) as batch_op:
+        batch_op.drop_index('ix_parking_spot_lot_status')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_role')
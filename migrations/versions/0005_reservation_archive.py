@@ -0,0 +1,44 @@
+"""cold archive of closed reservations
+
+Revision ID: 0005_reservation_archive
+Revises: 0004_history_keyset_index
+Create Date: 2026-10-17 15:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_reservation_archive'
+down_revision = '0004_history_keyset_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'reservation_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('spot_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('lot_id', sa.Integer(), nullable=True),
+        sa.Column('lot_name', sa.String(length=150), nullable=True),
+        sa.Column('parking_timestamp', sa.DateTime(), nullable=True),
+        sa.Column('leaving_timestamp', sa.DateTime(), nullable=False),
+        sa.Column('total_cost', sa.Float(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('reservation_archive', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_reservation_archive_user_parked', ['user_id', 'parking_timestamp', 'id'], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('reservation_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_archive_user_parked')
+
+    op.drop_table('reservation_archive')
@@ -0,0 +1,61 @@
+"""hourly analytics rollups and close-order indexes
+
+Revision ID: 0006_analytics_rollups
+Revises: 0005_reservation_archive
+Create Date: 2026-10-17 17:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_analytics_rollups'
+down_revision = '0005_reservation_archive'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'lot_hourly_rollup',
+        sa.Column('lot_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('hour', sa.DateTime(), nullable=False),
+        sa.Column('occupied_seconds', sa.Float(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.Column('stays', sa.Integer(), nullable=False),
+        sa.Column('stay_seconds', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('lot_id', 'hour')
+    )
+    with op.batch_alter_table('lot_hourly_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_lot_hourly_rollup_hour', ['hour'], unique=False)
+
+    op.create_table(
+        'analytics_watermark',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('leaving_timestamp', sa.DateTime(), nullable=True),
+        sa.Column('reservation_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_leaving', ['leaving_timestamp', 'id'], unique=False)
+
+    with op.batch_alter_table('reservation_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_reservation_archive_leaving', ['leaving_timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservation_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_archive_leaving')
+
+    with op.batch_alter_table('reservation', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservation_leaving')
+
+    op.drop_table('analytics_watermark')
+
+    with op.batch_alter_table('lot_hourly_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_lot_hourly_rollup_hour')
+
+    op.drop_table('lot_hourly_rollup')
@@ -0,0 +1,64 @@
+"""per-lot counter rows instead of global spot totals
+
+Revision ID: 0007_lot_counters
+Revises: 0006_analytics_rollups
+Create Date: 2026-10-18 10:20:00.000000
+
+Moves the occupancy counters out of parking_lot into lot_counter, and
+drops the spot totals from parking_stats (they are summed from
+lot_counter now). counters.reconcile() (bootstrap, beat job) also
+creates the rows on the shards when DATABASE_SHARDS is set.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_lot_counters'
+down_revision = '0006_analytics_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'lot_counter',
+        sa.Column('lot_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('available_count', sa.Integer(), nullable=False),
+        sa.Column('occupied_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('lot_id')
+    )
+    op.execute(
+        "INSERT INTO lot_counter (lot_id, available_count, occupied_count) "
+        "SELECT id, available_count, occupied_count FROM parking_lot"
+    )
+
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.drop_column('occupied_count')
+        batch_op.drop_column('available_count')
+
+    with op.batch_alter_table('parking_stats', schema=None) as batch_op:
+        batch_op.drop_column('occupied_spots')
+        batch_op.drop_column('available_spots')
+
+
+def downgrade():
+    with op.batch_alter_table('parking_stats', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('available_spots', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('occupied_spots', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('parking_lot', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('available_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('occupied_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        "UPDATE parking_lot SET "
+        "available_count = COALESCE((SELECT available_count FROM lot_counter WHERE lot_id = parking_lot.id), 0), "
+        "occupied_count = COALESCE((SELECT occupied_count FROM lot_counter WHERE lot_id = parking_lot.id), 0)"
+    )
+    op.execute(
+        "UPDATE parking_stats SET "
+        "available_spots = (SELECT COALESCE(SUM(available_count), 0) FROM lot_counter), "
+        "occupied_spots = (SELECT COALESCE(SUM(occupied_count), 0) FROM lot_counter)"
+    )
+    op.drop_table('lot_counter')
@@ -1,7 +1,10 @@
 from app_factory import create_app
-from celery_app import celery   # Only import celery, NOT init_celery
 
 app = create_app()
 
 if __name__ == "__main__":
+    # production runs `flask --app run bootstrap` once at deploy time instead
+    from backend.bootstrap import bootstrap
+    with app.app_context():
+        bootstrap()
     app.run(port=7000, debug=True)
@@ -1,90 +1,190 @@
 # tasks.py
 
-from celery_app import celery
+from celery import group
+from celery_app import celery, REDIS_URL
+from app_factory import db
+from backend import shards
 from backend.models import User, Reservation
 from datetime import datetime, timedelta
-from mail_helper import send_email
+from mail_helper import send_email, mail_connection
 import csv
 import os
-from sqlalchemy import func
+import redis
+from sqlalchemy import func, or_, select
 
 
 # ======================
 # 1️⃣ DAILY REMINDER JOB
 # ======================
-@celery.task
-def send_daily_reminders():
-    """
-    Send email reminder to users who have no parking in the last 7 days.
-    """
+REMINDER_CHUNK = 500          # users per subtask
+REMINDER_DISPATCH_BATCH = 20  # subtasks per dispatched group
+REMINDER_STATE_TTL = 2 * 24 * 3600
 
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
-    users = User.query.all()
-    inactive_users = []
+REMINDER_SUBJECT = "Reminder: Need to Park Today?"
+REMINDER_BODY = """
+Hi {username},
 
-    for user in users:
+We haven't seen you parking lately 🚗
+Book a parking spot anytime easily from your Park With Ease dashboard!
+"""
 
-        # Find most recent completed reservation
-        last_reservation = Reservation.query.filter_by(user_id=user.id)\
-            .order_by(Reservation.leaving_timestamp.desc())\
-            .first()
 
-        # If user never booked -> reminder
-        if last_reservation is None:
-            inactive_users.append(user)
-            continue
+def _reminder_state():
+    return redis.Redis.from_url(REDIS_URL)
 
-        # If last booking too old -> reminder
-        if last_reservation.leaving_timestamp is None or \
-           last_reservation.leaving_timestamp < seven_days_ago:
-            inactive_users.append(user)
 
-    count = 0
-    for user in inactive_users:
-        if user.email:
-            subject = "Reminder: Need to Park Today?"
-            body = f"""
-Hi {user.username},
+def _inactive_users(cutoff, after_id):
+    """
+    Users whose latest completed parking is older than ``cutoff`` (or who
+    never completed one), computed in one aggregated query.
+    """
+    last_left = (
+        select(Reservation.user_id, func.max(Reservation.leaving_timestamp).label("last_left"))
+        .group_by(Reservation.user_id)
+        .subquery()
+    )
+    return (
+        select(User.id)
+        .outerjoin(last_left, last_left.c.user_id == User.id)
+        .where(User.id > after_id)
+        .where(or_(last_left.c.last_left.is_(None), last_left.c.last_left < cutoff))
+        .order_by(User.id)
+        .execution_options(yield_per=REMINDER_CHUNK)
+    )
+
+
+def _recently_parked(user_ids, cutoff):
+    """Those of ``user_ids`` who completed a parking since ``cutoff`` (on the current database)."""
+    return (
+        select(Reservation.user_id)
+        .where(Reservation.user_id.in_(user_ids), Reservation.leaving_timestamp >= cutoff)
+        .distinct()
+    )
+
+
+def _drop_recent(user_ids, cutoff):
+    """
+    Sharding on: ``user_ids`` minus those who completed a parking since
+    ``cutoff`` on any shard (same users as ``_inactive_users``).
+    """
+    recent_stmt = _recently_parked(user_ids, cutoff)
+    recent = {uid for part in shards.each(lambda: db.session.execute(recent_stmt).scalars().all()) for uid in part}
+    return [uid for uid in user_ids if uid not in recent]
 
-We haven't seen you parking lately 🚗
-Book a parking spot anytime easily from your Park With Ease dashboard!
-"""
-            send_email(user.email, subject, body)
-            count += 1
 
-    return f"Daily reminders sent to {count} inactive users!"
+@celery.task(bind=True)
+def send_daily_reminders(self, run_id=None):
+    """
+    Send email reminder to users who have no parking in the last 7 days.
+
+    Streams the inactive users in chunks and fans them out to
+    ``send_reminder_chunk`` subtasks. Progress lives in the Redis hash
+    ``reminders:<run_id>``; re-running the same run_id resumes after the
+    last dispatched user, chunks skip users already emailed, and a run
+    that already dispatched everyone returns without querying again.
+    """
+    run_id = run_id or datetime.utcnow().date().isoformat()
+    task_id = self.request.id
+    state_key = f"reminders:{run_id}"
+    state = _reminder_state()
+
+    cursor, dispatched, complete = state.hmget(state_key, "cursor", "dispatched", "dispatch_complete")
+    cursor, dispatched = int(cursor or 0), int(dispatched or 0)
+    if complete:
+        return {"run_id": run_id, "dispatched": dispatched, "already_complete": True}
+
+    cutoff = datetime.utcnow() - timedelta(days=7)
+
+    def flush(pending):
+        group(pending).apply_async()
+        state.hset(state_key, mapping={"cursor": cursor, "dispatched": dispatched})
+        state.expire(state_key, REMINDER_STATE_TTL)
+        if task_id:
+            self.update_state(task_id=task_id, state="PROGRESS", meta={"run_id": run_id, "dispatched": dispatched})
+
+    pending = []
+    if shards.enabled():
+        # reservations are spread over the shards: page the users, filter each chunk
+        stmt = select(User.id).where(User.id > cursor).order_by(User.id).execution_options(yield_per=REMINDER_CHUNK)
+    else:
+        stmt = _inactive_users(cutoff, cursor)
+    result = db.session.execute(stmt)
+    for partition in result.scalars().partitions():
+        cursor = partition[-1]
+        if shards.enabled():
+            partition = _drop_recent(partition, cutoff)
+            if not partition:
+                continue
+        pending.append(send_reminder_chunk.s(run_id, list(partition)))
+        dispatched += len(partition)
+        if len(pending) == REMINDER_DISPATCH_BATCH:
+            flush(pending)
+            pending = []
+    if pending:
+        flush(pending)
+
+    state.hset(state_key, mapping={"cursor": cursor, "dispatched": dispatched, "dispatch_complete": 1})
+    state.expire(state_key, REMINDER_STATE_TTL)
+    return {"run_id": run_id, "dispatched": dispatched}
+
+
+@celery.task
+def send_reminder_chunk(run_id, user_ids):
+    """
+    Email one chunk of inactive users over a single SMTP connection.
+    A user is claimed in ``reminders:<run_id>:sent`` before sending, so a
+    retried or duplicated chunk never emails anyone twice.
+    """
+    state = _reminder_state()
+    state_key = f"reminders:{run_id}"
+    sent_key = f"{state_key}:sent"
+
+    users = db.session.execute(
+        select(User.id, User.username, User.email).where(User.id.in_(user_ids))
+    ).all()
+
+    sent = skipped = failed = 0
+    with mail_connection() as conn:
+        for user_id, username, email in users:
+            if not email or not state.sadd(sent_key, user_id):
+                skipped += 1
+                continue
+            try:
+                send_email(email, REMINDER_SUBJECT, REMINDER_BODY.format(username=username), connection=conn)
+                sent += 1
+            except Exception:
+                state.srem(sent_key, user_id)  # let a resumed run retry this user
+                failed += 1
+
+    pipe = state.pipeline()
+    pipe.hincrby(state_key, "sent", sent)
+    pipe.hincrby(state_key, "skipped", skipped)
+    pipe.hincrby(state_key, "failed", failed)
+    pipe.expire(sent_key, REMINDER_STATE_TTL)
+    pipe.execute()
+
+    return {"sent": sent, "skipped": skipped, "failed": failed}
+
+
+def reminder_progress(run_id):
+    """Counters of a reminder run (dispatched/sent/skipped/failed) and whether dispatch finished."""
+    raw = {k.decode(): int(v) for k, v in _reminder_state().hgetall(f"reminders:{run_id}").items()}
+    raw["dispatch_complete"] = bool(raw.get("dispatch_complete"))
+    return raw
 
 # ======================
 # 2️⃣ CSV EXPORT JOB (Already in your project — improved version)
 # ======================
 @celery.task
-def export_user_history_csv(user_id):
+def export_user_history_csv(user_id, compress=False):
     """
     Export user's reservation history to CSV and notify via email.
+    The file is only rewritten when the history changed since the last export.
     """
 
-    from backend.models import User
-
-    folder = "exports"
-    os.makedirs(folder, exist_ok=True)
-
-    filename = f"user_{user_id}_history.csv"
-    path = os.path.join(folder, filename)
+    from backend.exports import write_export
 
-    reservations = Reservation.query.filter_by(user_id=user_id).all()
-
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["ID", "Lot", "Spot", "Start", "End", "Cost"])
-        for r in reservations:
-            writer.writerow([
-                r.id,
-                r.spot.lot.prime_location_name,
-                r.spot_id,
-                r.parking_timestamp,
-                r.leaving_timestamp,
-                r.total_cost,
-            ])
+    filename, path, reused = write_export(user_id, compress)
 
     # Notify user when export is ready
     user = User.query.get(user_id)
@@ -102,4 +202,48 @@ You can download it using the link below:
 
         send_email(user.email, subject, message)
 
-    return {"filename": filename, "path": path}
+    return {"filename": filename, "path": path, "reused": reused}
+
+
+# ======================
+# 3️⃣ COUNTER RECONCILIATION JOB
+# ======================
+@celery.task
+def reconcile_counters():
+    """
+    Recompute the denormalized occupancy counters and repair any drift.
+    """
+    from backend import counters
+
+    result = counters.reconcile()
+    return {"drifted_lots": result["drifted_lots"], "totals_drifted": result["totals_drifted"]}
+
+
+# ======================
+# 4️⃣ RESERVATION ARCHIVAL JOB
+# ======================
+@celery.task
+def archive_reservations():
+    """
+    Move reservations closed more than RESERVATION_ARCHIVE_DAYS ago into
+    ``reservation_archive`` so the hot table stays small.
+    """
+    from flask import current_app
+    from backend.archive import archive_closed
+
+    moved = archive_closed(current_app.config["RESERVATION_ARCHIVE_DAYS"])
+    return {"archived": moved}
+
+
+# ======================
+# 5️⃣ ANALYTICS ROLLUP JOB
+# ======================
+@celery.task
+def refresh_analytics():
+    """
+    Fold reservations closed since the last run into the hourly
+    occupancy/revenue rollups behind /api/admin/analytics.
+    """
+    from backend.analytics import refresh_rollups
+
+    return refresh_rollups()
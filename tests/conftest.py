@@ -0,0 +1,103 @@
+# tests/conftest.py
+"""
+Fixtures shared by the behaviour tests.
+
+Every test gets its own app on a fresh SQLite file with the in-process
+backends (SimpleCache, memory allocator/bitmap/admission/principals), so
+nothing needs Redis. ``make_app(**env)`` builds one with extra settings,
+e.g. ``make_app(BOOKING_GROUP_COMMIT="all")``.
+"""
+import pytest
+
+from app_factory import create_app
+from backend.bootstrap import bootstrap
+
+ENV = {
+    "CACHE_TYPE": "SimpleCache",
+    "SPOT_ALLOCATOR": "memory",
+    "SPOT_BITMAP": "memory",
+    "ADMISSION": "memory",
+    "ADMISSION_USER_RATE": "1000",
+    "ADMISSION_USER_BURST": "1000",
+    "PRINCIPAL_CACHE": "memory",
+    "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",  # fast enough for tests
+    "REDIS_URL": "redis://127.0.0.1:1/0",  # nothing listens: events are delivered locally
+    "DATABASE_SHARDS": "",
+}
+
+
+class Api:
+    """Thin helpers over the test client for the usual setup steps."""
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+        self.admin = self.login("admin", "admin123")
+
+    def login(self, username, password):
+        r = self.client.post("/api/login", json={"username": username, "password": password})
+        assert r.status_code == 200, r.json
+        return {"Authorization": "Bearer " + r.json["token"]}
+
+    def user(self, name, password="secret1"):
+        r = self.client.post("/api/register", json={
+            "username": name, "email": f"{name}@example.com", "password": password})
+        assert r.status_code == 201, r.json
+        return self.login(name, password)
+
+    def lot(self, name="Mall", spots=3, price=10, pincode="560001", address="MG Road"):
+        r = self.client.post("/api/admin/create_lot", headers=self.admin, json={
+            "prime_location_name": name, "price_per_hour": price, "address": address,
+            "pincode": pincode, "number_of_spots": spots})
+        assert r.status_code == 201, r.json
+        lots = self.client.get("/api/admin/lots", headers=self.admin).json
+        return max(lot["id"] for lot in lots if lot["prime_location_name"] == name)
+
+    def book(self, headers, lot_id):
+        return self.client.post(f"/api/user/book/{lot_id}", headers=headers)
+
+    def release(self, headers, reservation_id):
+        return self.client.post(f"/api/user/release/{reservation_id}", headers=headers)
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    def make(**env):
+        settings = {**ENV, "DATABASE_URL": f"sqlite:///{tmp_path / 'parking.db'}", **env}
+        for name, value in settings.items():
+            if value is None:  # the app's own default
+                monkeypatch.delenv(name, raising=False)
+            else:
+                monkeypatch.setenv(name, str(value))
+        app = create_app()
+        app.config["TESTING"] = True
+        with app.app_context():
+            bootstrap(create_all=True)
+        return app
+
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def sharded_app(make_app, tmp_path):
+    """Lot 1 on the primary, lot 2 on shard1, lots 3-100 on shard2; shard ids in blocks of 1000."""
+    return make_app(
+        DATABASE_SHARDS=f"2-2=sqlite:///{tmp_path / 'shard1.db'};3-100=sqlite:///{tmp_path / 'shard2.db'}",
+        SHARD_ID_BLOCK=1000,
+    )
+
+
+@pytest.fixture
+def api(app):
+    return Api(app)
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
@@ -0,0 +1,59 @@
+import pytest
+
+from backend.admission import MemoryBuckets, parse_limits, parse_rate
+
+
+def test_parse_limits_and_rates():
+    assert parse_limits("book_spot=32, release_spot=16,") == {"book_spot": 32, "release_spot": 16}
+    assert parse_limits("book_spot=200/400", parse_rate) == {"book_spot": (200.0, 400)}
+    assert parse_rate("2.5") == (2.5, 3)
+    with pytest.raises(ValueError):
+        parse_limits("book_spot")
+
+
+def test_buckets_allow_the_burst_then_report_the_wait():
+    buckets = MemoryBuckets()
+    user = [("user:1", 1.0, 2)]
+    assert buckets.take(user) == 0
+    assert buckets.take(user) == 0
+    assert 0.9 < buckets.take(user) <= 1.0
+    assert buckets.take([("user:2", 1.0, 2)]) == 0  # buckets are per key
+
+
+def test_several_buckets_take_all_or_nothing():
+    buckets = MemoryBuckets()
+    route = ("route:book_spot", 1.0, 1)
+    assert buckets.take([("user:1", 10.0, 10), route]) == 0
+    assert buckets.take([("user:2", 10.0, 10), route]) > 0
+    # the refused request did not spend user:2's token
+    assert buckets._buckets["user:2"][0] == 10
+
+
+class TestThrottling:
+
+    @pytest.fixture
+    def app(self, make_app):
+        return make_app(ADMISSION_USER_RATE=0.01, ADMISSION_USER_BURST=2)
+
+    def test_users_get_429_with_retry_after(self, api):
+        alice = api.user("alice")
+        lots = [api.client.get("/api/user/lots", headers=alice) for _ in range(3)]
+        assert [r.status_code for r in lots] == [200, 200, 429]
+        assert int(lots[2].headers["Retry-After"]) >= 1
+
+        # admins have no per-user bucket, other users have their own
+        assert all(api.client.get("/api/user/lots", headers=api.admin).status_code == 200 for _ in range(5))
+        assert api.client.get("/api/user/lots", headers=api.user("bob")).status_code == 200
+
+
+class TestConcurrency:
+
+    @pytest.fixture
+    def app(self, make_app):
+        return make_app(ADMISSION_CONCURRENCY="book_spot=0")
+
+    def test_full_routes_shed_with_503(self, api):
+        lot_id = api.lot()
+        r = api.book(api.user("alice"), lot_id)
+        assert r.status_code == 503 and "Retry-After" in r.headers
+        assert api.client.get("/api/user/lots", headers=api.admin).status_code == 200
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app_factory import db
+from backend.analytics import refresh_rollups
+from backend.models import Reservation
+
+
+def series(api, **args):
+    return api.client.get("/api/admin/analytics/series", headers=api.admin, query_string=args)
+
+
+def test_series_of_empty_window(api):
+    api.lot(spots=2)
+    r = series(api, bucket="day", **{"from": "2024-01-01", "to": "2024-01-03"})
+    assert r.status_code == 200
+    assert [p["t"][:10] for p in r.json["series"]] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+    assert all(p["occupied_hours"] == 0 and p["stays"] == 0 and p["avg_stay_minutes"] is None
+               for p in r.json["series"])
+
+    r = api.client.get("/api/admin/analytics/lots", headers=api.admin,
+                       query_string={"from": "2024-01-01", "to": "2024-01-03"})
+    assert r.status_code == 200 and r.json["lots"] == []
+
+
+def test_series_without_lots(api):
+    r = series(api, bucket="hour", **{"from": "2024-01-01", "to": "2024-01-01"})
+    assert r.status_code == 200
+    assert len(r.json["series"]) == 24
+    assert r.json["series"][0]["occupancy_rate"] is None
+
+
+def test_series_of_populated_window(api):
+    lot_id = api.lot(spots=2, price=10)
+    users = [api.user("alice"), api.user("bob")]
+    ids = [api.book(u, lot_id).json["reservation_id"] for u in users]
+    for u, rid in zip(users, ids):
+        assert api.release(u, rid).status_code == 200
+
+    # two stays of 1h30 on 2024-01-01 (10:00-11:30), 30 minutes into hour 11
+    start, end = datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11, 30)
+    with api.app.app_context():
+        db.session.execute(update(Reservation).values(parking_timestamp=start, leaving_timestamp=end,
+                                                      total_cost=15.0))
+        db.session.commit()
+        assert refresh_rollups(now=end + timedelta(hours=1))["folded"] == 2
+
+    points = series(api, bucket="hour", lot_id=lot_id, **{"from": "2024-01-01", "to": "2024-01-01"}).json["series"]
+    by_hour = {p["t"][11:13]: p for p in points}
+    assert by_hour["10"]["occupied_hours"] == 2.0
+    assert by_hour["10"]["occupancy_rate"] == 1.0
+    assert by_hour["10"]["revenue"] == 20.0
+    assert by_hour["11"]["occupied_hours"] == 1.0
+    assert by_hour["11"]["stays"] == 2
+    assert by_hour["11"]["avg_stay_minutes"] == 90.0
+    assert by_hour["12"]["stays"] == 0
+
+    day, = series(api, bucket="day", **{"from": "2024-01-01", "to": "2024-01-01"}).json["series"]
+    assert (day["occupied_hours"], day["revenue"], day["stays"]) == (3.0, 30.0, 2)
+
+    lots = api.client.get("/api/admin/analytics/lots", headers=api.admin,
+                          query_string={"from": "2024-01-01", "to": "2024-01-01"}).json["lots"]
+    assert [(lot["lot_id"], lot["stays"], lot["revenue"]) for lot in lots] == [(lot_id, 2, 30.0)]
+
+
+def test_rollups_fold_each_stay_once(api):
+    lot_id = api.lot(spots=1)
+    alice = api.user("alice")
+    api.release(alice, api.book(alice, lot_id).json["reservation_id"])
+    with api.app.app_context():
+        later = datetime.utcnow() + timedelta(hours=1)
+        assert refresh_rollups(now=later)["folded"] == 1
+        assert refresh_rollups(now=later)["folded"] == 0
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app_factory import db
+from backend.archive import archive_closed
+from backend.models import ReservationArchive
+from tests.test_history import all_pages, history, park
+
+
+@pytest.fixture
+def stays(api):
+    """alice: four closed stays in two lots (two of them archived) and one active."""
+    alice = api.user("alice")
+    mall, stadium = api.lot("Mall"), api.lot("Stadium")
+    old = [park(api, alice, mall, 40), park(api, alice, stadium, 35)]
+    recent = [park(api, alice, mall, 3), park(api, alice, stadium, 2)]
+    before = history(api, alice)["summary"]
+    with api.app.app_context():
+        assert archive_closed(30) == 2
+    active = api.book(alice, mall).json["reservation_id"]
+    return alice, {"mall": mall, "old": old, "recent": recent, "active": active, "before": before}
+
+
+def test_only_old_closed_stays_move(api, stays):
+    _, ids = stays
+    with api.app.app_context():
+        archived = db.session.execute(select(ReservationArchive.id).order_by(ReservationArchive.id)).scalars().all()
+    assert archived == ids["old"]
+
+
+def test_pages_merge_hot_and_archive_newest_first(api, stays):
+    alice, ids = stays
+    rows = all_pages(api, alice)
+    assert [r["reservation_id"] for r in rows] == [ids["active"], *reversed(ids["recent"]), *reversed(ids["old"])]
+    assert [r["lot_name"] for r in rows] == ["Mall", "Stadium", "Mall", "Stadium", "Mall"]
+
+
+def test_summary_is_the_same_before_and_after_archiving(api, stays):
+    alice, ids = stays
+    after = history(api, alice)["summary"]
+    assert after["completed"] == ids["before"]["completed"] == 4
+    assert after["total_reservations"] == ids["before"]["total_reservations"] + 1  # the new active one
+
+
+def test_filters_cover_both_tables(api, stays):
+    alice, ids = stays
+    mall = all_pages(api, alice, lot_id=ids["mall"])
+    assert [r["reservation_id"] for r in mall] == [ids["active"], ids["recent"][0], ids["old"][0]]
+
+    since = (datetime.utcnow() - timedelta(days=36)).date().isoformat()
+    until = (datetime.utcnow() - timedelta(days=3)).date().isoformat()
+    window = all_pages(api, alice, **{"from": since, "to": until})
+    assert [r["reservation_id"] for r in window] == [ids["recent"][0], ids["old"][1]]
+
+
+class TestSharded:
+
+    @pytest.fixture
+    def app(self, sharded_app):
+        return sharded_app
+
+    def test_archive_and_pages_span_every_shard(self, api):
+        alice = api.user("alice")
+        lots = [api.lot(f"Lot {i}") for i in range(1, 4)]  # primary, shard1, shard2
+        old = [park(api, alice, lot_id, 40) for lot_id in lots]
+        recent = [park(api, alice, lot_id, 5 - i) for i, lot_id in enumerate(lots)]
+        assert [rid // 1000 for rid in old] == [0, 1, 2]
+
+        with api.app.app_context():
+            assert archive_closed(30) == 3
+            archived = db.session.execute(
+                select(ReservationArchive.id, ReservationArchive.lot_name).order_by(ReservationArchive.id)
+            ).all()
+        assert archived == [(old[0], "Lot 1"), (old[1], "Lot 2"), (old[2], "Lot 3")]
+
+        rows = all_pages(api, alice)
+        assert [r["reservation_id"] for r in rows] == [*reversed(recent), *reversed(old)]
+        assert history(api, alice)["summary"]["total_reservations"] == 6
+        assert [r["reservation_id"] for r in all_pages(api, alice, lot_id=lots[1])] == [recent[1], old[1]]
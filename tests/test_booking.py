@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from app_factory import db
+from backend.allocator import allocator
+from backend.models import ParkingSpot, Reservation
+from backend.routes import claim_spot, _mark_occupied
+
+
+def summary(api):
+    return api.client.get("/api/admin/dashboard_summary", headers=api.admin).json
+
+
+def test_book_and_release(api):
+    lot_id = api.lot(spots=2, price=10)
+    alice = api.user("alice")
+
+    r = api.book(alice, lot_id)
+    assert r.status_code == 200
+    booked = r.json
+    assert summary(api)["occupied_spots"] == 1
+
+    # one active reservation per user
+    assert api.book(alice, lot_id).status_code == 400
+
+    with api.app.app_context():
+        # parked two hours ago: 2h * 10
+        db.session.execute(update(Reservation).where(Reservation.id == booked["reservation_id"])
+                           .values(parking_timestamp=datetime.utcnow() - timedelta(hours=2)))
+        db.session.commit()
+
+    r = api.release(alice, booked["reservation_id"])
+    assert r.status_code == 200
+    assert abs(r.json["total_cost"] - 20) < 0.1
+    assert api.release(alice, booked["reservation_id"]).status_code == 404
+
+    totals = summary(api)
+    assert (totals["available_spots"], totals["occupied_spots"]) == (2, 0)
+
+
+def test_full_lot_books_each_spot_once(api):
+    lot_id = api.lot(spots=2)
+    users = [api.user(f"u{i}") for i in range(3)]
+
+    results = [api.book(u, lot_id) for u in users]
+    assert [r.status_code for r in results] == [200, 200, 400]
+    assert results[2].json["error"] == "No free spots"
+    assert len({r.json["spot_id"] for r in results[:2]}) == 2
+
+
+def test_release_other_users_reservation_is_404(api):
+    lot_id = api.lot()
+    alice, bob = api.user("alice"), api.user("bob")
+    reservation_id = api.book(alice, lot_id).json["reservation_id"]
+    assert api.release(bob, reservation_id).status_code == 404
+
+
+def test_booking_falls_back_to_db_without_allocator(api, monkeypatch):
+    lot_id = api.lot(spots=1)
+    monkeypatch.setattr(allocator, "backend", None)
+
+    r = api.book(api.user("alice"), lot_id)
+    assert r.status_code == 200
+    assert api.book(api.user("bob"), lot_id).json["error"] == "No free spots"
+
+
+def test_mark_occupied_only_flips_free_spots(api):
+    lot_id = api.lot(spots=1)
+    with api.app.app_context():
+        spot_id = db.session.execute(select(ParkingSpot.id).where(ParkingSpot.lot_id == lot_id)).scalar()
+        assert _mark_occupied(lot_id, spot_id)
+        assert not _mark_occupied(lot_id, spot_id)
+        assert not _mark_occupied(lot_id + 1, spot_id)
+        db.session.rollback()
+
+
+def test_claim_skips_stale_allocator_entries(api):
+    lot_id = api.lot(spots=3)
+    with api.app.app_context():
+        spot_ids = db.session.execute(
+            select(ParkingSpot.id).where(ParkingSpot.lot_id == lot_id).order_by(ParkingSpot.id)
+        ).scalars().all()
+        allocator.backend.load(lot_id, spot_ids)
+        # taken behind the allocator's back: the free list is now stale
+        db.session.execute(update(ParkingSpot).where(ParkingSpot.id.in_(spot_ids[:2])).values(status="O"))
+
+        assert claim_spot(lot_id) == spot_ids[2]
+        assert claim_spot(lot_id) is None
+        db.session.rollback()
+
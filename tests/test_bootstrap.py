@@ -0,0 +1,43 @@
+import pytest
+from flask_migrate import upgrade
+from sqlalchemy import inspect, text
+
+from app_factory import db
+from backend.bootstrap import INITIAL_REVISION, SCHEMA_MARKERS, bootstrap, detect_revision, migrate_schema
+
+HEAD = SCHEMA_MARKERS[0][0]
+
+
+def revision():
+    return db.session.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def unversioned(rev):
+    """The schema of ``rev`` as an older create_all() left it: no alembic_version."""
+    db.drop_all(bind_key=None)
+    upgrade(revision=rev)
+    db.session.execute(text("DROP TABLE alembic_version"))
+    db.session.commit()
+
+
+def test_create_all_schema_is_head(ctx):
+    assert detect_revision(inspect(db.engine)) == HEAD
+    migrate_schema()
+    assert revision() == HEAD
+
+
+@pytest.mark.parametrize("rev", [INITIAL_REVISION] + [r for r, _, _ in SCHEMA_MARKERS[1:]])
+def test_older_schemas_are_stamped_where_they_are_and_upgraded(ctx, rev):
+    unversioned(rev)
+    assert detect_revision(inspect(db.engine)) == rev
+
+    migrate_schema()
+    assert revision() == HEAD
+    assert "lot_counter" in inspect(db.engine).get_table_names()
+
+
+def test_bootstrap_migrates_an_empty_database(ctx):
+    db.drop_all(bind_key=None)
+    report = bootstrap()
+    assert report["admin_created"]
+    assert revision() == HEAD
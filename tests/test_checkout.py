@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app_factory import db
+from backend import shards
+from backend.checkout import StaleRelease, active_reservations, close_reservations
+from backend.models import Reservation
+
+NOW = datetime(2026, 10, 17, 12, 0)
+
+
+def parked_at(api, reservation_id, when):
+    with api.app.app_context(), shards.row_shard(reservation_id):
+        db.session.execute(update(Reservation).where(Reservation.id == reservation_id).values(parking_timestamp=when))
+        db.session.commit()
+
+
+@pytest.fixture
+def booked(api):
+    mall = api.lot("Mall", spots=3, price=10)
+    stadium = api.lot("Stadium", spots=2, price=25.5)
+    stays = {}
+    for name, lot_id, hours in (("a", mall, 2), ("b", mall, 0.5), ("c", stadium, 3)):
+        reservation_id = api.book(api.user(name), lot_id).json["reservation_id"]
+        parked_at(api, reservation_id, NOW - timedelta(hours=hours))
+        stays[name] = reservation_id
+    return mall, stadium, stays
+
+
+def test_bills_each_stay_and_each_lot(api, booked):
+    mall, stadium, stays = booked
+    with api.app.app_context():
+        rows = active_reservations(reservation_ids=list(stays.values()))
+        billing, freed = close_reservations(rows, now=NOW)
+        db.session.commit()
+
+    by_id = {r["reservation_id"]: r for r in billing["reservations"]}
+    assert [by_id[stays[n]]["total_cost"] for n in "abc"] == [20.0, 5.0, 76.5]
+    assert [by_id[stays[n]]["hours"] for n in "abc"] == [2.0, 0.5, 3.0]
+    assert billing["released"] == 3 and billing["total_cost"] == 101.5
+    assert billing["lots"] == [
+        {"lot_id": mall, "lot_name": "Mall", "released": 2, "total_cost": 25.0},
+        {"lot_id": stadium, "lot_name": "Stadium", "released": 1, "total_cost": 76.5},
+    ]
+    assert {lot_id: len(spots) for lot_id, spots in freed.items()} == {mall: 2, stadium: 1}
+
+    totals = api.client.get("/api/admin/dashboard_summary", headers=api.admin).json
+    assert (totals["available_spots"], totals["occupied_spots"]) == (5, 0)
+
+
+def test_rows_of_one_lot(api, booked):
+    mall, _, stays = booked
+    with api.app.app_context():
+        rows = active_reservations(lot_id=mall)
+    assert [row[0] for row in rows] == [stays["a"], stays["b"]]
+    assert {row[4] for row in rows} == {"Mall"} and {float(row[5]) for row in rows} == {10.0}
+
+
+def test_already_closed_rows_are_stale(api, booked):
+    _, _, stays = booked
+    with api.app.app_context():
+        rows = active_reservations(reservation_ids=[stays["a"]])
+    api.release(api.login("a", "secret1"), stays["a"])
+    with api.app.app_context():
+        with pytest.raises(StaleRelease):
+            close_reservations(rows, now=NOW)
+        db.session.rollback()
+
+
+def test_nothing_to_close(ctx):
+    billing, freed = close_reservations([], now=NOW)
+    assert billing["released"] == 0 and freed == {}
+
+
+def summary(api):
+    return api.client.get("/api/admin/dashboard_summary", headers=api.admin).json
+
+
+def test_bulk_release_by_lot(api):
+    lot_id = api.lot(spots=3, price=10)
+    other = api.lot("Stadium", spots=1)
+    users = [api.user(f"u{i}") for i in range(3)]
+    for u in users[:2]:
+        assert api.book(u, lot_id).status_code == 200
+    assert api.book(users[2], other).status_code == 200
+
+    r = api.client.post("/api/admin/bulk_release", headers=api.admin, json={"lot_id": lot_id})
+    assert r.status_code == 200
+    assert r.json["released"] == 2
+    assert [lot["lot_id"] for lot in r.json["lots"]] == [lot_id]
+
+    totals = summary(api)
+    assert (totals["available_spots"], totals["occupied_spots"]) == (3, 1)
+    # freed spots are bookable again
+    assert api.book(users[0], lot_id).status_code == 200
+
+
+def test_bulk_release_by_ids(api):
+    lot_id = api.lot(spots=3)
+    users = [api.user(f"u{i}") for i in range(3)]
+    ids = [api.book(u, lot_id).json["reservation_id"] for u in users]
+
+    r = api.client.post("/api/admin/bulk_release", headers=api.admin, json={"reservation_ids": ids[:2]})
+    assert r.status_code == 200
+    assert sorted(row["reservation_id"] for row in r.json["reservations"]) == sorted(ids[:2])
+    assert api.release(users[2], ids[2]).status_code == 200
+    assert api.release(users[0], ids[0]).status_code == 404
+
+
+def test_bulk_release_validates_input(api):
+    lot_id = api.lot()
+    post = lambda body: api.client.post("/api/admin/bulk_release", headers=api.admin, json=body)
+    assert post({}).status_code == 400
+    assert post({"lot_id": lot_id, "reservation_ids": [1]}).status_code == 400
+    assert post({"lot_id": "x"}).status_code == 400
+    assert post({"lot_id": lot_id + 100}).status_code == 404
+    assert api.client.post("/api/admin/bulk_release", headers=api.user("alice"),
+                           json={"lot_id": lot_id}).status_code == 403
+
+
+class TestSharded:
+
+    @pytest.fixture
+    def app(self, sharded_app):
+        return sharded_app
+
+    def test_bills_across_shards(self, api):
+        lots = [api.lot(f"Lot {i}", price=10) for i in range(1, 4)]
+        ids = []
+        for i, lot_id in enumerate(lots):
+            reservation_id = api.book(api.user(f"u{i}"), lot_id).json["reservation_id"]
+            parked_at(api, reservation_id, NOW - timedelta(hours=i + 1))
+            ids.append(reservation_id)
+
+        r = api.client.post("/api/admin/bulk_release", headers=api.admin, json={"reservation_ids": ids})
+        assert r.status_code == 200, r.json
+        assert r.json["released"] == 3
+        assert [lot["lot_name"] for lot in r.json["lots"]] == ["Lot 1", "Lot 2", "Lot 3"]
+        assert api.client.get("/api/admin/dashboard_summary", headers=api.admin).json["occupied_spots"] == 0
@@ -0,0 +1,128 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, insert, select, update
+
+from app_factory import db
+from backend import counters, shards
+from backend.models import LotCounter, ParkingStats
+
+
+def summary(api):
+    return api.client.get("/api/admin/dashboard_summary", headers=api.admin).json
+
+
+@contextmanager
+def writes(app, bind=None):
+    """Collect the INSERT/UPDATE/DELETE statements sent to one database."""
+    with app.app_context():
+        engine = db.engines[bind]
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            seen.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield seen
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def test_summary_follows_lot_and_spot_changes(api):
+    alice = api.user("alice")
+    mall = api.lot(spots=3)
+    stadium = api.lot("Stadium", spots=2)
+    api.book(alice, mall)
+    assert summary(api) == {"total_lots": 2, "total_spots": 5, "available_spots": 4,
+                            "occupied_spots": 1, "registered_users": 1}
+
+    api.client.put(f"/api/admin/update_lot/{stadium}", headers=api.admin, json={"number_of_spots": 4})
+    api.client.delete(f"/api/admin/delete_lot/{mall}", headers=api.admin)  # occupied: refused
+    assert summary(api)["total_spots"] == 7
+
+    api.client.delete(f"/api/admin/delete_lot/{stadium}", headers=api.admin)
+    assert summary(api) == {"total_lots": 1, "total_spots": 3, "available_spots": 2,
+                            "occupied_spots": 1, "registered_users": 1}
+
+
+def test_booking_writes_no_global_row(api):
+    lot_id = api.lot()
+    alice = api.user("alice")
+    with writes(api.app) as seen:
+        reservation_id = api.book(alice, lot_id).json["reservation_id"]
+        api.release(alice, reservation_id)
+    tables = " ".join(seen)
+    assert "lot_counter" in tables
+    assert "parking_stats" not in tables and "parking_lot" not in tables
+
+
+def test_summary_without_a_stats_row_only_reads(api):
+    api.user("alice")
+    api.lot(spots=3)
+    with api.app.app_context():
+        db.session.execute(ParkingStats.__table__.delete())
+        db.session.commit()
+    with writes(api.app) as seen:
+        assert summary(api) == {"total_lots": 1, "total_spots": 3, "available_spots": 3,
+                                "occupied_spots": 0, "registered_users": 1}
+    assert seen == []
+    with api.app.app_context():
+        assert db.session.get(ParkingStats, counters.STATS_ID) is None
+
+def test_reconcile_repairs_drift(api):
+    mall = api.lot(spots=3)
+    stadium = api.lot("Stadium", spots=2)
+    api.book(api.user("alice"), mall)
+    with api.app.app_context():
+        db.session.execute(update(LotCounter).where(LotCounter.lot_id == mall).values(available_count=9))
+        db.session.execute(LotCounter.__table__.delete().where(LotCounter.lot_id == stadium))
+        db.session.execute(insert(LotCounter).values(lot_id=999, available_count=5, occupied_count=0))
+        db.session.commit()
+
+        report = counters.reconcile()
+        assert report["drifted_lots"] == 3
+        assert counters.available_counts() == {mall: 2, stadium: 2}
+        assert counters.reconcile()["drifted_lots"] == 0
+    assert summary(api)["total_spots"] == 5
+
+
+class TestSharded:
+
+    @pytest.fixture
+    def app(self, sharded_app):
+        return sharded_app
+
+    def test_counters_live_with_the_spots(self, api):
+        lots = [api.lot(f"Lot {i}", spots=2) for i in range(3)]
+        assert lots == [1, 2, 3]
+        with api.app.app_context():
+            for bind in shards.binds():
+                with shards.using(bind):
+                    rows = db.session.execute(select(LotCounter.lot_id)).scalars().all()
+                    assert rows == [lot for lot in lots if shards.for_lot(lot) == bind]
+
+    def test_shard_booking_only_writes_its_shard(self, api):
+        api.lot("Lot 1")
+        lot_id = api.lot("Lot 2")  # on shard1
+        alice = api.user("alice")
+        with writes(api.app) as primary, writes(api.app, "shard1") as shard:
+            reservation_id = api.book(alice, lot_id).json["reservation_id"]
+            api.release(alice, reservation_id)
+        assert primary == []
+        assert any("lot_counter" in s for s in shard) and any("reservation" in s for s in shard)
+
+    def test_summary_and_reconcile_across_shards(self, api):
+        lots = [api.lot(f"Lot {i}", spots=2) for i in range(3)]
+        users = [api.user(f"u{i}") for i in range(3)]
+        for user, lot_id in zip(users, lots):
+            assert api.book(user, lot_id).status_code == 200
+        assert summary(api)["occupied_spots"] == 3
+        assert summary(api)["available_spots"] == 3
+
+        with api.app.app_context():
+            with shards.lot_shard(3):
+                db.session.execute(update(LotCounter).values(occupied_count=0))
+            db.session.commit()
+            assert counters.reconcile()["drifted_lots"] == 1
+        assert summary(api)["occupied_spots"] == 3
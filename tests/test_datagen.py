@@ -0,0 +1,21 @@
+from benchmarks.datagen import PASSWORD, seed
+from backend import counters
+from backend.models import Reservation
+
+
+def test_seed_fills_the_schema_and_the_counters(ctx):
+    sizes = seed(lots=3, spots_per_lot=4, users=5, reservations=20)
+    assert sizes == {"lots": 3, "spots": 12, "users": 5, "reservations": 20}
+
+    summary = counters.summary()
+    assert summary["total_lots"] == 3
+    assert summary["available_spots"] == 12 and summary["occupied_spots"] == 0
+    assert summary["registered_users"] == 5
+    assert Reservation.query.filter(Reservation.leaving_timestamp.is_(None)).count() == 0
+    assert set(counters.available_counts().values()) == {4}
+
+
+def test_seeded_users_can_log_in(app, ctx):
+    seed(lots=1, spots_per_lot=1, users=1, reservations=1)
+    r = app.test_client().post("/api/login", json={"username": "bench_user_0", "password": PASSWORD})
+    assert r.status_code == 200, r.json
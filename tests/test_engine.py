@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import select, text, update
+
+from app_factory import db
+from backend.engine import REPLICA_BIND, engine_options, resolve_profile, use_primary
+from backend.models import User
+
+
+@pytest.mark.parametrize("env, uri, profile", [
+    (None, "sqlite:///x.db", "sqlite-wal"),
+    (None, "postgresql://db/parking", "postgres-pool"),
+    ("default", "sqlite:///x.db", "default"),
+])
+def test_profiles(monkeypatch, env, uri, profile):
+    if env is None:
+        monkeypatch.delenv("DB_PROFILE", raising=False)
+    else:
+        monkeypatch.setenv("DB_PROFILE", env)
+    assert resolve_profile(uri) == profile
+
+
+def test_postgres_pool_options():
+    options = engine_options("postgres-pool")
+    assert options["pool_pre_ping"] and options["pool_size"] == 10
+    assert engine_options("default") == {}
+
+
+def test_sqlite_connections_use_wal(ctx):
+    with db.engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+
+
+class TestReplica:
+
+    @pytest.fixture
+    def app(self, make_app, tmp_path):
+        return make_app(DATABASE_REPLICA_URL=f"sqlite:///{tmp_path / 'replica.db'}")
+
+    def bind(self, app, method, stmt):
+        with app.test_request_context(method=method):
+            return db.session.get_bind(clause=stmt)
+
+    def test_get_reads_go_to_the_replica(self, app):
+        with app.app_context():
+            replica, primary = db.engines[REPLICA_BIND], db.engine
+        assert self.bind(app, "GET", select(User)) is replica
+        assert self.bind(app, "POST", select(User)) is primary
+        assert self.bind(app, "GET", update(User).values(role="user")) is primary
+
+    def test_use_primary_keeps_reads_on_the_primary(self, app):
+        with app.test_request_context(method="GET"):
+            with use_primary():
+                assert db.session.get_bind(clause=select(User)) is db.engine
+            assert db.session.get_bind(clause=select(User)) is db.engines[REPLICA_BIND]
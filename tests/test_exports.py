@@ -0,0 +1,77 @@
+import gzip
+import os
+import threading
+
+import pytest
+
+from backend import exports
+from backend.models import User
+
+
+@pytest.fixture(autouse=True)
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "EXPORT_DIR", str(tmp_path / "exports"))
+    return tmp_path / "exports"
+
+
+@pytest.fixture
+def alice(api):
+    alice = api.user("alice")
+    lot_id = api.lot("City Mall")
+    api.release(alice, api.book(alice, lot_id).json["reservation_id"])
+    api.book(alice, lot_id)
+    return alice, lot_id
+
+
+def user_id(api):
+    with api.app.app_context():
+        return User.query.filter_by(username="alice").one().id
+
+
+def test_unchanged_history_reuses_the_file(api, alice):
+    uid = user_id(api)
+    with api.app.app_context():
+        _, path, reused = exports.write_export(uid)
+        assert not reused
+        assert exports.write_export(uid)[2] is True
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    assert lines[0] == ",".join(exports.HEADER) and len(lines) == 3
+    assert all(",City Mall," in line for line in lines[1:])
+
+
+def test_lot_rename_rewrites_the_file(api, alice):
+    _, lot_id = alice
+    uid = user_id(api)
+    with api.app.app_context():
+        before = exports.history_fingerprint(uid)
+        exports.write_export(uid)
+    api.client.put(f"/api/admin/update_lot/{lot_id}", headers=api.admin, json={"prime_location_name": "Mall East"})
+    with api.app.app_context():
+        assert exports.history_fingerprint(uid) != before
+        _, path, reused = exports.write_export(uid)
+        assert not reused
+        with open(path, encoding="utf-8") as f:
+            assert "Mall East" in f.read()
+
+
+def test_concurrent_exports_use_their_own_temp_files(api, alice, export_dir):
+    uid = user_id(api)
+    errors = []
+
+    def export():
+        try:
+            with api.app.app_context():
+                exports.write_export(uid, compress=True)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=export) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert sorted(os.listdir(export_dir)) == [f"user_{uid}_history.csv.gz", f"user_{uid}_history.csv.gz.meta"]
+    with gzip.open(export_dir / f"user_{uid}_history.csv.gz", "rt", encoding="utf-8") as f:
+        assert len(f.read().splitlines()) == 3
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from app_factory import cache
+from backend.group_commit import group_committer
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(BOOKING_GROUP_COMMIT="all", BOOKING_WAIT_MS=5000, BOOKING_BATCHER_IDLE_SECONDS=0.2)
+
+
+def test_concurrent_bookings_share_a_batch(api):
+    lot_id = api.lot(spots=3)
+    users = [api.user(f"u{i}") for i in range(5)]
+    batches = group_committer.batches
+    responses = [None] * len(users)
+
+    def book(i):
+        responses[i] = api.book(users[i], lot_id)
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(len(users))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    codes = sorted(r.status_code for r in responses)
+    assert codes == [200, 200, 200, 400, 400]
+    assert len({r.json["spot_id"] for r in responses if r.status_code == 200}) == 3
+    assert group_committer.batches - batches <= len(users)
+    assert api.client.get("/api/admin/dashboard_summary", headers=api.admin).json["occupied_spots"] == 3
+
+
+def test_idle_batchers_exit(api):
+    lots = [api.lot(f"Lot {i}") for i in range(3)]
+    for lot_id in lots:
+        assert api.book(api.user(f"user{lot_id}"), lot_id).status_code == 200
+    assert group_committer.batchers() > 0
+
+    deadline = time.monotonic() + 5
+    while group_committer.batchers() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert group_committer.batchers() == 0
+    # and the next booking starts a fresh one
+    assert api.book(api.user("late"), lots[0]).status_code == 200
+
+
+class TestPollWithoutCache:
+
+    @pytest.fixture
+    def app(self, make_app):
+        return make_app(BOOKING_GROUP_COMMIT="all", BOOKING_WAIT_MS=0)
+
+    @pytest.fixture
+    def ticket(self, api, monkeypatch):
+        lot_id = api.lot()
+        alice = api.user("alice")
+        r = api.book(alice, lot_id)
+        assert r.status_code == 202
+
+        def down(*args, **kwargs):
+            raise ConnectionError("cache down")
+        monkeypatch.setattr(cache, "get", down)
+        return alice, r.json["poll"]
+
+    def poll(self, api, headers, url):
+        deadline = time.monotonic() + 5
+        while True:
+            r = api.client.get(url, headers=headers)
+            if r.status_code != 202 or time.monotonic() > deadline:
+                return r
+            time.sleep(0.02)
+
+    def test_the_booking_worker_answers_from_memory(self, api, ticket):
+        alice, url = ticket
+        r = self.poll(api, alice, url)
+        assert r.status_code == 200 and r.json["spot_id"]
+        assert self.poll(api, api.user("bob"), url).status_code == 404
+
+    def test_other_workers_read_the_active_reservation(self, api, ticket, monkeypatch):
+        alice, url = ticket
+        booked = self.poll(api, alice, url).json
+        monkeypatch.setattr(group_committer, "_tickets", {})
+        r = api.client.get(url, headers=alice)
+        assert r.status_code == 200 and r.json == booked
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app_factory import db
+from backend import shards
+from backend.models import Reservation
+
+
+def history(api, headers, **args):
+    r = api.client.get("/api/user/history", headers=headers, query_string=args)
+    assert r.status_code == 200, r.json
+    return r.json
+
+
+def all_pages(api, headers, limit=2, **args):
+    rows, cursor = [], None
+    while True:
+        page = history(api, headers, limit=limit, **({"cursor": cursor} if cursor else {}), **args)
+        rows += page["reservations"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return rows
+
+
+def park(api, headers, lot_id, days_ago):
+    """A closed stay that started ``days_ago`` days ago; returns its id."""
+    reservation_id = api.book(headers, lot_id).json["reservation_id"]
+    api.release(headers, reservation_id)
+    with api.app.app_context(), shards.row_shard(reservation_id):
+        start = datetime.utcnow() - timedelta(days=days_ago)
+        db.session.execute(update(Reservation).where(Reservation.id == reservation_id)
+                           .values(parking_timestamp=start, leaving_timestamp=start + timedelta(hours=1)))
+        db.session.commit()
+    return reservation_id
+
+
+@pytest.fixture
+def stays(api):
+    """alice: four closed stays in two lots and one active."""
+    alice = api.user("alice")
+    mall, stadium = api.lot("Mall"), api.lot("Stadium")
+    closed = [park(api, alice, mall, 40), park(api, alice, stadium, 35),
+              park(api, alice, mall, 3), park(api, alice, stadium, 2)]
+    active = api.book(alice, mall).json["reservation_id"]
+    return alice, {"mall": mall, "stadium": stadium, "closed": closed, "active": active}
+
+
+def test_pages_are_newest_first(api, stays):
+    alice, ids = stays
+    rows = all_pages(api, alice)
+    assert [r["reservation_id"] for r in rows] == [ids["active"], *reversed(ids["closed"])]
+    assert [r["lot_name"] for r in rows] == ["Mall", "Stadium", "Mall", "Stadium", "Mall"]
+    assert rows[0]["leaving_timestamp"] is None
+
+
+def test_summary(api, stays):
+    alice, _ = stays
+    summary = history(api, alice)["summary"]
+    assert (summary["total_reservations"], summary["completed"]) == (5, 4)
+
+
+def test_lot_and_date_filters(api, stays):
+    alice, ids = stays
+    mall = all_pages(api, alice, lot_id=ids["mall"])
+    assert [r["reservation_id"] for r in mall] == [ids["active"], ids["closed"][2], ids["closed"][0]]
+
+    since = (datetime.utcnow() - timedelta(days=36)).date().isoformat()
+    until = (datetime.utcnow() - timedelta(days=3)).date().isoformat()
+    window = all_pages(api, alice, **{"from": since, "to": until})
+    assert [r["reservation_id"] for r in window] == [ids["closed"][2], ids["closed"][1]]
+
+
+def test_bad_cursor_is_400(api, stays):
+    alice, _ = stays
+    r = api.client.get("/api/user/history?cursor=nope", headers=alice)
+    assert r.status_code == 400
+
+
+def test_other_users_see_nothing(api, stays):
+    assert all_pages(api, api.user("bob")) == []
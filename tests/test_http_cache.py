@@ -0,0 +1,98 @@
+import gzip
+
+import pytest
+
+from app_factory import cache
+from backend import http_cache
+from tests.conftest import Api
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(HTTP_ETAGS="on", HTTP_COMPRESS_MIN_BYTES=200)
+
+
+def get_lots(api, etag=None, **headers):
+    if etag:
+        headers["If-None-Match"] = etag
+    return api.client.get("/api/admin/lots", headers={**api.admin, **headers})
+
+
+def test_unchanged_poll_is_304_until_a_write(api):
+    api.lot()
+    first = get_lots(api)
+    assert first.status_code == 200 and first.headers["ETag"]
+
+    again = get_lots(api, first.headers["ETag"])
+    assert again.status_code == 304 and again.data == b""
+
+    api.lot("Stadium")
+    changed = get_lots(api, first.headers["ETag"])
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != first.headers["ETag"]
+    assert len(changed.json) == 2
+
+
+def test_tag_depends_on_the_query_string(api):
+    api.lot()
+    r = api.client.get("/api/admin/spots", headers=api.admin)
+    other = api.client.get("/api/admin/spots?limit=1", headers={**api.admin, "If-None-Match": r.headers["ETag"]})
+    assert other.status_code == 200
+
+
+def test_booking_bumps_spots(api):
+    lot_id = api.lot()
+    tag = api.client.get("/api/user/lots", headers=api.admin).headers["ETag"]
+    api.book(api.user("alice"), lot_id)
+    r = api.client.get("/api/user/lots", headers={**api.admin, "If-None-Match": tag})
+    assert r.status_code == 200 and r.json[0]["available_spots"] == 2
+
+
+def test_tokens_expire(api, monkeypatch):
+    calls = []
+    monkeypatch.setattr(cache, "set_many", lambda mapping, timeout=None: calls.append(timeout) or list(mapping))
+    http_cache.bump("lots")
+    assert calls == [http_cache.config["ttl"]] and 0 < calls[0] < 3600
+
+
+def test_failed_bump_fails_open(api, monkeypatch):
+    api.lot()
+    tag = get_lots(api).headers["ETag"]
+
+    def broken(*args, **kwargs):
+        raise ConnectionError("cache down")
+    monkeypatch.setattr(cache, "set_many", broken)
+    api.lot("Stadium")  # commits, but its bump is lost
+
+    r = get_lots(api, tag)
+    assert r.status_code == 200 and len(r.json) == 2
+    assert "ETag" not in r.headers
+
+
+def test_unreadable_tokens_fail_open(api, monkeypatch):
+    api.lot()
+    tag = get_lots(api).headers["ETag"]
+    monkeypatch.setattr(cache, "get_many", lambda *keys: (_ for _ in ()).throw(ConnectionError("cache down")))
+    r = get_lots(api, tag)
+    assert r.status_code == 200 and "ETag" not in r.headers
+
+
+def test_no_etags_with_a_per_process_cache(make_app):
+    api = Api(make_app(HTTP_ETAGS="auto"))  # SimpleCache
+    api.lot()
+    assert "ETag" not in get_lots(api).headers
+
+
+def test_gzip_keeps_its_own_tag(api):
+    for i in range(5):
+        api.lot(f"Lot {i}")
+    r = get_lots(api, **{"Accept-Encoding": "gzip"})
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert r.headers["ETag"].strip('"').endswith("-gzip")
+    assert len(gzip.decompress(r.data)) > 200
+
+    again = get_lots(api, r.headers["ETag"], **{"Accept-Encoding": "gzip"})
+    assert again.status_code == 304
+    # the same tag without -gzip is a different representation
+    plain = get_lots(api, r.headers["ETag"])
+    assert plain.status_code == 200 and "Content-Encoding" not in plain.headers
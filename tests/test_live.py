@@ -0,0 +1,52 @@
+import json
+
+from tests.conftest import Api
+
+
+def ticket(api, headers=None):
+    r = api.client.post("/api/admin/live/ticket", headers=api.admin if headers is None else headers)
+    assert r.status_code == 200, r.json
+    return r.json["ticket"]
+
+
+def live(api, **args):
+    return api.client.get("/api/admin/live", query_string=args, headers={"Accept": "text/event-stream"})
+
+
+def test_stream_opens_with_a_ticket_and_starts_with_a_snapshot(api):
+    api.lot(spots=3)
+    r = live(api, ticket=ticket(api))
+    assert r.status_code == 200 and r.mimetype == "text/event-stream"
+    chunks = iter(r.response)
+    assert next(chunks) == b"retry: 5000\n"
+    event = json.loads(next(chunks).decode().removeprefix("data: "))
+    assert event["type"] == "snapshot" and event["summary"]["available_spots"] == 3
+    r.close()
+
+
+def test_tickets_are_single_use(api):
+    t = ticket(api)
+    live(api, ticket=t).close()
+    assert live(api, ticket=t).status_code == 401
+
+
+def test_the_jwt_is_not_accepted_in_the_url(api):
+    token = api.admin["Authorization"].split(" ")[1]
+    assert live(api, token=token).status_code == 401
+    assert live(api, ticket=token).status_code == 401
+    assert live(api).status_code == 401
+
+
+def test_a_ticket_is_not_a_bearer_token(api):
+    headers = {"Authorization": "Bearer " + ticket(api)}
+    assert api.client.get("/api/admin/dashboard_summary", headers=headers).status_code == 401
+
+
+def test_only_admins_get_tickets(api):
+    assert api.client.post("/api/admin/live/ticket").status_code == 401
+    assert api.client.post("/api/admin/live/ticket", headers=api.user("alice")).status_code == 403
+
+
+def test_expired_tickets_are_refused(make_app):
+    api = Api(make_app(LIVE_TICKET_SECONDS=-1))
+    assert live(api, ticket=ticket(api)).status_code == 401
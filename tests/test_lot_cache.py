@@ -0,0 +1,76 @@
+from sqlalchemy import event
+
+from app_factory import cache, db
+
+
+def lots(api, headers):
+    r = api.client.get("/api/user/lots", headers=headers)
+    assert r.status_code == 200, r.json
+    return {lot["prime_location_name"]: lot for lot in r.json}
+
+
+def lot_queries(api, headers):
+    """Statements on the lot tables while serving one /api/user/lots."""
+    with api.app.app_context():
+        engine = db.engine
+    seen = []
+
+    def record(conn, cursor, statement, *args):
+        if "parking_lot" in statement or "lot_counter" in statement:
+            seen.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        lots(api, headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return seen
+
+
+def test_free_counts_follow_bookings(api):
+    alice = api.user("alice")
+    mall, _ = api.lot("Mall", spots=3), api.lot("Stadium", spots=2)
+    listed = lots(api, alice)
+    assert (listed["Mall"]["available_spots"], listed["Stadium"]["available_spots"]) == (3, 2)
+    assert listed["Mall"]["total_spots"] == 3
+
+    reservation_id = api.book(alice, mall).json["reservation_id"]
+    assert lots(api, alice)["Mall"]["available_spots"] == 2
+    api.release(alice, reservation_id)
+    assert lots(api, alice)["Mall"]["available_spots"] == 3
+
+
+def test_unchanged_lots_are_served_from_the_cache(api):
+    alice = api.user("alice")
+    api.lot("Mall"), api.lot("Stadium")
+    assert len(lot_queries(api, alice)) == 2  # lots, then every counter in one query
+    assert lot_queries(api, alice) == []
+
+
+def test_a_booking_reloads_only_its_lots_count(api):
+    alice = api.user("alice")
+    mall, _ = api.lot("Mall"), api.lot("Stadium")
+    lots(api, alice)
+    api.book(alice, mall)
+    reloaded = lot_queries(api, alice)
+    assert len(reloaded) == 1 and "lot_counter" in reloaded[0]
+
+
+def test_lot_changes_reach_the_list(api):
+    alice = api.user("alice")
+    mall = api.lot("Mall")
+    lots(api, alice)
+    api.client.put(f"/api/admin/update_lot/{mall}", headers=api.admin, json={"prime_location_name": "City Mall"})
+    assert list(lots(api, alice)) == ["City Mall"]
+    api.client.delete(f"/api/admin/delete_lot/{mall}", headers=api.admin)
+    assert lots(api, alice) == {}
+
+
+def test_cache_outage_reads_the_db(api, monkeypatch):
+    alice = api.user("alice")
+    api.lot("Mall", spots=2)
+
+    def down(*args, **kwargs):
+        raise ConnectionError("cache down")
+    for name in ("get", "get_many", "set", "set_many"):
+        monkeypatch.setattr(cache, name, down)
+    assert lots(api, alice)["Mall"]["available_spots"] == 2
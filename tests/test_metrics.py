@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import text
+
+from app_factory import db
+from backend import metrics, shards
+
+
+def queries(endpoint):
+    return metrics.registry._counters[("parking_db_queries_total", (("endpoint", endpoint),))]
+
+
+def scoped_scatter(fn):
+    token = metrics._open_scope("endpoint", "test")
+    shards.scatter(fn)
+    return metrics._close_scope(token)
+
+
+def test_requests_count_their_queries(api):
+    before = queries("app_routes.user_summary")
+    api.client.get("/api/user/dashboard_summary", headers=api.user("alice"))
+    assert queries("app_routes.user_summary") - before >= 1
+    assert 'parking_http_requests_total{endpoint="app_routes.user_summary",method="GET",status="200"}' in metrics.render()
+
+
+def test_metrics_route_is_off_without_a_token(api):
+    assert api.client.get("/metrics").status_code == 404
+
+
+def test_metrics_route_needs_the_token(make_app):
+    client = make_app(METRICS_TOKEN="s3cret").test_client()
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer nope"}).status_code == 401
+    r = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert r.status_code == 200 and "# TYPE parking_http_requests_total counter" in r.text
+
+
+class TestSharded:
+
+    @pytest.fixture
+    def app(self, sharded_app):
+        return sharded_app
+
+    def test_scatter_counts_against_the_callers_scope(self, ctx):
+        scope = scoped_scatter(lambda: db.session.execute(text("SELECT 1")).all())
+        assert scope["queries"] == len(shards.binds()) == 3
+        assert scope["statements"]["SELECT 1"] == 3
+
+    def test_scatter_from_a_request(self, api):
+        admin_before = queries("app_routes.admin_dashboard_summary")
+        api.client.get("/api/admin/dashboard_summary", headers=api.admin)
+        # the stats row, then the spot totals of each database from the pool threads
+        assert queries("app_routes.admin_dashboard_summary") - admin_before >= 1 + 3
@@ -0,0 +1,51 @@
+from app_factory import db
+from backend.models import User
+from backend.passwords import HashingBusy, password_hasher
+from tests.conftest import Api
+
+
+def stored_hash(app, username):
+    with app.app_context():
+        user = db.session.query(User).filter_by(username=username).one()
+        return user.password_hash, user.token_version
+
+
+def test_login_rehashes_with_the_current_method(make_app):
+    api = Api(make_app(PASSWORD_HASH_METHOD="pbkdf2:sha256:1000"))
+    api.user("alice")
+    old_hash, version = stored_hash(api.app, "alice")
+    assert old_hash.startswith("pbkdf2:sha256:1000$")
+
+    api = Api(make_app(PASSWORD_HASH_METHOD="pbkdf2:sha256:2000"))  # same database
+    headers = api.login("alice", "secret1")
+    new_hash, new_version = stored_hash(api.app, "alice")
+    assert new_hash.startswith("pbkdf2:sha256:2000$")
+    assert new_version == version  # tokens issued before stay valid
+    assert api.client.get("/api/user/lots", headers=headers).status_code == 200
+
+    assert api.login("alice", "secret1")
+    assert stored_hash(api.app, "alice")[0] == new_hash  # already current: not rehashed again
+
+
+def test_wrong_password_is_not_rehashed(make_app):
+    api = Api(make_app(PASSWORD_HASH_METHOD="pbkdf2:sha256:1000"))
+    api.user("alice")
+    old_hash, _ = stored_hash(api.app, "alice")
+    api = Api(make_app(PASSWORD_HASH_METHOD="pbkdf2:sha256:2000"))
+    r = api.client.post("/api/login", json={"username": "alice", "password": "wrong"})
+    assert r.status_code == 401
+    assert stored_hash(api.app, "alice")[0] == old_hash
+
+
+def test_needs_rehash_learns_the_method_defaults(app):
+    assert not password_hasher.needs_rehash(password_hasher.hash("x"))
+    assert password_hasher.needs_rehash("scrypt:32768:8:1$salt$hash")
+
+
+def test_busy_hashing_is_503_with_retry_after(api, monkeypatch):
+    def busy(*args):
+        raise HashingBusy("password hashing queue is full", 3)
+    monkeypatch.setattr(password_hasher, "verify", busy)
+    r = api.client.post("/api/login", json={"username": "admin", "password": "admin123"})
+    assert r.status_code == 503 and r.headers["Retry-After"] == "3"
+
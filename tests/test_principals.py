@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+import redis
+
+from app_factory import db
+from backend.models import User
+from backend.principals import PrincipalCache, principal_cache
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.Redis, "from_url",
+                        classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server)))
+    return server
+
+
+@pytest.fixture
+def app(make_app, server):
+    return make_app(PRINCIPAL_CACHE="redis")
+
+
+def profile(api, headers):
+    return api.client.get("/api/user/lots", headers=headers)
+
+
+def test_redis_is_the_default(make_app, server):
+    assert make_app(PRINCIPAL_CACHE=None).config["PRINCIPAL_CACHE"] == "redis"
+    assert principal_cache.client is not None
+
+
+def test_role_change_revokes_in_every_worker(api):
+    alice = api.user("alice")
+    assert profile(api, alice).status_code == 200
+    with api.app.app_context():
+        other = PrincipalCache(api.app)  # a second worker sharing the Redis server
+        user_id = db.session.query(User.id).filter_by(username="alice").scalar()
+        assert other.get(user_id).role == "user"
+
+        db.session.get(User, user_id).role = "admin"
+        db.session.commit()
+        assert other.get(user_id).role == "admin"
+    assert profile(api, alice).status_code == 401
+
+
+def test_redis_outage_reads_the_db(api, monkeypatch):
+    alice = api.user("alice")
+
+    def down(*args, **kwargs):
+        raise redis.ConnectionError("redis down")
+    monkeypatch.setattr(principal_cache.client, "get", down)
+    errors = principal_cache.errors
+    assert profile(api, alice).status_code == 200
+    assert profile(api, alice).status_code == 200
+    assert principal_cache.errors == errors + 1  # the breaker skips Redis after the first failure
+
+
+def test_memory_is_opt_in_and_per_process(make_app):
+    app = make_app(PRINCIPAL_CACHE="memory")
+    assert principal_cache.client is None
+    with app.app_context():
+        admin = db.session.query(User.id).filter_by(role="admin").scalar()
+        hits = principal_cache.hits
+        assert principal_cache.get(admin).role == "admin"
+        assert principal_cache.get(admin).role == "admin"
+        assert principal_cache.stats()["backend"] == "memory" and principal_cache.hits == hits + 1
+
+
+def test_counts_are_exact_under_concurrent_requests(make_app):
+    app = make_app(PRINCIPAL_CACHE="memory")
+    with app.app_context():
+        admin = db.session.query(User.id).filter_by(role="admin").scalar()
+        principal_cache.get(admin)
+    before = principal_cache.stats()
+
+    def worker():
+        with app.app_context():
+            for _ in range(2000):
+                principal_cache.get(admin)
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    after = principal_cache.stats()
+    assert (after["hits"] - before["hits"], after["misses"] - before["misses"]) == (16000, 0)
@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import select
+
+from app_factory import db
+from backend import routes
+from backend.models import ParkingLot, ParkingSpot
+
+
+def spots(api, lot_id):
+    with api.app.app_context():
+        return db.session.execute(routes.spot_count_query(lot_id)).scalar()
+
+
+def totals(api):
+    summary = api.client.get("/api/admin/dashboard_summary", headers=api.admin).json
+    return summary["total_lots"], summary["available_spots"], summary["occupied_spots"]
+
+
+def resize(api, lot_id, count):
+    return api.client.put(f"/api/admin/update_lot/{lot_id}", headers=api.admin, json={"number_of_spots": count})
+
+
+def lot_row(name, spots=2):
+    return {"prime_location_name": name, "price_per_hour": 20, "address": "MG Road",
+            "pincode": "560001", "number_of_spots": spots}
+
+
+def test_import_creates_lots_spots_and_counters(api):
+    r = api.client.post("/api/admin/import_lots", headers=api.admin, json=[lot_row("A", 3), lot_row("B", 4)])
+    assert r.status_code == 201
+    assert (r.json["lots"], r.json["spots"]) == (2, 7)
+    assert [spots(api, lot_id) for lot_id in r.json["lot_ids"]] == [3, 4]
+    assert totals(api) == (2, 7, 0)
+
+
+def test_import_csv_and_dry_run(api):
+    body = "prime_location_name,price_per_hour,address,pincode,number_of_spots\nA,20,MG Road,560001,2\n"
+    r = api.client.post("/api/admin/import_lots?dry_run=1", headers=api.admin, data=body, content_type="text/csv")
+    assert r.status_code == 200 and r.json["dry_run"]
+    assert totals(api) == (0, 0, 0)
+
+    r = api.client.post("/api/admin/import_lots", headers=api.admin, data=body, content_type="text/csv")
+    assert r.status_code == 201 and totals(api) == (1, 2, 0)
+
+
+def test_one_bad_row_writes_nothing(api):
+    r = api.client.post("/api/admin/import_lots", headers=api.admin, json=[lot_row("A"), lot_row("B", 0)])
+    assert r.status_code == 400
+    assert r.json["errors"] == [{"row": 2, "error": "Number of spots must be > 0"}]
+    assert totals(api) == (0, 0, 0)
+
+
+def test_resize_adds_and_removes_free_spots(api):
+    lot_id = api.lot(spots=3)
+    assert resize(api, lot_id, 5).status_code == 200
+    assert spots(api, lot_id) == 5 and totals(api) == (1, 5, 0)
+    assert resize(api, lot_id, 2).status_code == 200
+    assert spots(api, lot_id) == 2 and totals(api) == (1, 2, 0)
+
+
+def test_shrink_keeps_occupied_spots(api):
+    lot_id = api.lot(spots=2)
+    api.book(api.user("alice"), lot_id)
+    api.book(api.user("bob"), lot_id)
+    assert resize(api, lot_id, 1).status_code == 400
+    assert spots(api, lot_id) == 2
+
+
+def test_shrink_racing_a_booking_is_409(api, monkeypatch):
+    lot_id = api.lot(spots=2)
+    booked = api.book(api.user("alice"), lot_id).json["spot_id"]
+    # the spot picked for removal is booked between the SELECT and the DELETE
+    monkeypatch.setattr(routes, "removable_spots_query", lambda lot_id, count: (
+        select(ParkingSpot.id).where(ParkingSpot.id == booked).limit(count)
+    ))
+
+    assert resize(api, lot_id, 1).status_code == 409
+    assert spots(api, lot_id) == 2
+    assert totals(api) == (1, 1, 1)
+    with api.app.app_context():
+        assert db.session.get(ParkingLot, lot_id).number_of_spots == 2
+
+
+@pytest.mark.parametrize("count", ["x", 0])
+def test_resize_validates_the_count(api, count):
+    assert resize(api, api.lot(), count).status_code == 400
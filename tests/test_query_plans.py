@@ -0,0 +1,109 @@
+"""
+Query-plan regression check for the hot queries.
+
+Each case EXPLAINs the statement the code itself builds (the query
+builders in routes, history, tasks, checkout, ...) on the app's SQLite
+schema and fails if it full-scans one of the tables that grow with
+traffic.
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+import tasks
+from app_factory import db
+from backend import analytics, checkout, counters, exports, history, routes
+from backend.allocator import free_spots_query
+from backend.group_commit import active_users_query
+from backend.models import ParkingSpot, Reservation, ReservationArchive
+from backend.principals import principal_query
+from backend.spot_bitmap import layout_query
+
+# Tables that grow with traffic; scanning them on a hot path is a regression
+LARGE_TABLES = ("users", "parking_spot", "reservation", "reservation_archive", "lot_hourly_rollup")
+
+DAY = datetime(2026, 10, 1)
+NOW = datetime(2026, 10, 17, 12)
+CURSOR = (DAY, 100)
+
+HOT_QUERIES = {
+    "login: user by username": lambda: routes.user_by_username_query("u"),
+    "register: user by email": lambda: routes.user_by_email_query("e"),
+    "principal cache miss": lambda: principal_query(1),
+    "counters: registered users": counters.registered_users_query,
+    "counters: recount drifted lots": counters.recount_query,
+    "book: active reservation of user": lambda: routes.active_reservation_query(1),
+    "book: claim free spot": lambda: routes.free_spot_query(1),
+    "group commit: active users of a batch": lambda: active_users_query([1, 2, 3]),
+    "release: active reservation": lambda: routes.open_reservation_query(1, 1),
+    "spot details: active reservation of spot": lambda: routes.spot_reservation_query(1),
+    "user summary: counts of user": lambda: routes.user_summary_queries(1),
+    "admin spots: keyset page": lambda: routes.spots_page_query(0, 500),
+    "admin spots: keyset page by lot": lambda: routes.spots_page_query(0, 500, lot_id=1),
+    "admin spots: keyset page by status": lambda: routes.spots_page_query(0, 500, status="A"),
+    "admin spots: shard page by lot and status": lambda: routes.spots_page_query(0, 500, 1, "A", names=False),
+    "update lot: spot count": lambda: routes.spot_count_query(1),
+    "update lot: removable spots": lambda: routes.removable_spots_query(1, 10),
+    "delete lot: occupied count": lambda: routes.spot_count_query(1, "O"),
+    "history: first page": lambda: history.page_query(1, 50),
+    "history: keyset page by lot and day": lambda: history.page_query(1, 50, CURSOR, DAY, NOW, lot_id=1),
+    "history: shard pages": lambda: history.shard_page_queries(1, 50, CURSOR),
+    "history: summary": lambda: history.summary_queries(1),
+    "allocator: free spots of lot": lambda: free_spots_query(1),
+    "spot bitmap: build lots": lambda: layout_query([1, 2]),
+    "tasks: inactive users": lambda: tasks._inactive_users(DAY, 0),
+    "tasks: recently parked of chunk": lambda: tasks._recently_parked([1, 2, 3], DAY),
+    "export: rows of user": lambda: exports.export_queries(1),
+    "export: shard rows of user": lambda: exports.export_queries(1, names=False),
+    "export: fingerprint": lambda: exports.fingerprint_queries(1),
+    "export: lots of hot reservations": lambda: exports.hot_lots_query(1),
+    "analytics: closed since watermark": lambda: analytics.closed_batch_queries(CURSOR, NOW, 20000),
+    "analytics: first closed batch": lambda: analytics.closed_batch_queries((None, None), NOW, 20000),
+    "analytics: rollup range of lot": lambda: analytics.rollup_query(DAY, NOW, 1),
+    "analytics: rollup range of all lots": lambda: analytics.rollup_query(DAY, NOW),
+}
+
+
+def full_scans(plan_rows):
+    """Plan lines that scan a large table without an index."""
+    bad = []
+    for detail in plan_rows:
+        words = detail.split()
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] in LARGE_TABLES and "INDEX" not in detail:
+            bad.append(detail)
+    return bad
+
+
+def explain(stmt):
+    compiled = stmt.compile(dialect=db.engine.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + compiled.string, tuple(params[name] for name in compiled.positiontup)
+        )
+        return [row[-1] for row in rows]
+
+
+def statements(built):
+    return built if isinstance(built, tuple) else (built,)
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_an_index(ctx, name):
+    for stmt in statements(HOT_QUERIES[name]()):
+        plan = explain(stmt)
+        assert not full_scans(plan), f"{name}: {' | '.join(plan)}"
+
+
+@pytest.mark.parametrize("lots", [True, False])
+def test_checkout_lookups_use_an_index(ctx, lots):
+    # callers filter by lot or by reservation ids
+    stmt = checkout.active_reservations_query(lots)
+    for plan in (explain(stmt.where(ParkingSpot.lot_id == 1)), explain(stmt.where(Reservation.id.in_([1, 2, 3])))):
+        assert not full_scans(plan), " | ".join(plan)
+
+
+def test_full_scans_are_reported(ctx):
+    plan = explain(select(ReservationArchive.id).where(ReservationArchive.total_cost > 5))
+    assert full_scans(plan)
@@ -0,0 +1,100 @@
+import pytest
+
+from app_factory import cache
+from backend.lot_search import LotSearchIndex
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(LOT_SEARCH_SYNC_SECONDS=0)
+
+
+@pytest.fixture
+def lots(api):
+    return {
+        "mall": api.lot("City Mall", spots=3, price=40, pincode="560001", address="MG Road"),
+        "stadium": api.lot("Stadium North", spots=1, price=20, pincode="560034", address="Stadium Road"),
+        "airport": api.lot("Airport", spots=2, price=80, pincode="110037", address="Terminal 3"),
+    }
+
+
+def search(api, **args):
+    r = api.client.get("/api/user/lots/search", headers=api.admin, query_string=args)
+    assert r.status_code == 200, r.json
+    return r.json
+
+
+def names(result):
+    return [lot["prime_location_name"] for lot in result["lots"]]
+
+
+def test_tokens_match_as_prefixes(api, lots):
+    assert names(search(api, q="stad")) == ["Stadium North"]
+    assert names(search(api, q="road")) == ["City Mall", "Stadium North"]
+    assert names(search(api, q="road mg")) == ["City Mall"]
+    assert names(search(api, q="nowhere")) == []
+
+
+def test_pincode_prefix_and_price(api, lots):
+    assert names(search(api, pincode="5600")) == ["City Mall", "Stadium North"]
+    assert names(search(api, pincode="560", max_price=30)) == ["Stadium North"]
+    assert names(search(api, min_price=50)) == ["Airport"]
+
+
+def test_sort_and_paging(api, lots):
+    first = search(api, sort="-price", limit=2)
+    assert names(first) == ["Airport", "City Mall"]
+    assert names(search(api, sort="-price", limit=2, offset=first["next_offset"])) == ["Stadium North"]
+    assert names(search(api, sort="name")) == ["Airport", "City Mall", "Stadium North"]
+    assert names(search(api, sort="-id")) == ["Airport", "Stadium North", "City Mall"]
+    assert names(search(api, sort="id")) == ["City Mall", "Stadium North", "Airport"]
+
+
+def test_availability_filter_uses_live_counts(api, lots):
+    api.book(api.user("alice"), lots["stadium"])
+    result = search(api, available=1, sort="-available")
+    assert names(result) == ["City Mall", "Airport"]
+    assert [lot["available_spots"] for lot in result["lots"]] == [3, 2]
+
+
+def test_invalid_sort(api, lots):
+    r = api.client.get("/api/user/lots/search?sort=bogus", headers=api.admin)
+    assert r.status_code == 400
+
+
+def test_changes_reach_other_workers(api, lots):
+    with api.app.app_context():
+        worker = LotSearchIndex()
+        worker.sync_interval = 0
+        assert len(worker.search()[0]) == 3
+
+        api.lot("Harbour", pincode="400001")
+        api.client.put(f"/api/admin/update_lot/{lots['airport']}", headers=api.admin,
+                       json={"prime_location_name": "Airport Long Stay"})
+        api.client.delete(f"/api/admin/delete_lot/{lots['mall']}", headers=api.admin)
+
+        rows, _ = worker.search()
+        assert [lot["prime_location_name"] for lot in rows] == ["Stadium North", "Airport Long Stay", "Harbour"]
+
+
+def test_other_workers_rebuild_by_age_without_the_cache(api, lots, monkeypatch):
+    with api.app.app_context():
+        worker = LotSearchIndex()
+        worker.sync_interval = 0
+        worker.search()
+
+        def down(*args, **kwargs):
+            raise ConnectionError("cache down")
+        monkeypatch.setattr(cache.cache, "get", down)
+        monkeypatch.setattr(cache.cache, "inc", down)
+        worker.search()  # version unreadable from now on
+
+        # the committing worker still patches its own index
+        api.lot("Harbour", pincode="400001")
+        assert names(search(api, q="harbour")) == ["Harbour"]
+
+        # the other one only sees it once its index is older than max_age
+        assert worker.search(q="harbour")[0] == []
+
+        worker.max_age = 0
+        assert [lot["prime_location_name"] for lot in worker.search(q="harbour")[0]] == ["Harbour"]
@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import func, select
+
+from app_factory import db
+from backend import shards
+from backend.models import ParkingSpot, Reservation
+
+
+def test_parse_shards_orders_ranges_and_names_binds():
+    ranges = shards.parse_shards("101-200=sqlite:///b.db; 2-100=sqlite:///a.db")
+    assert ranges == [(2, 100, "shard2", "sqlite:///a.db"), (101, 200, "shard1", "sqlite:///b.db")]
+    assert shards.parse_shards("") == []
+
+
+@pytest.mark.parametrize("spec", ["2-100", "x-100=sqlite://", "2-100=sqlite://;50-150=sqlite://"])
+def test_parse_shards_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        shards.parse_shards(spec)
+
+
+def test_routing_is_off_without_shards(ctx):
+    assert not shards.enabled()
+    assert shards.binds() == [None]
+    assert shards.for_lot(5) is None and shards.for_row(10 ** 9) is None
+    assert shards.each(lambda: shards.current()) == [None]
+
+
+class TestSharded:
+
+    @pytest.fixture
+    def app(self, sharded_app):
+        return sharded_app
+
+    def test_lots_and_rows_route_to_their_shard(self, ctx):
+        assert shards.binds() == [None, "shard1", "shard2"]
+        assert [shards.for_lot(lot_id) for lot_id in (1, 2, 3, 100, 101)] == [None, "shard1", "shard2", "shard2", None]
+        assert [shards.for_row(row_id) for row_id in (999, 1000, 2500, 3000)] == [None, "shard1", "shard2", None]
+        assert shards.by_lot([1, 2, 3, 4]) == {None: [1], "shard1": [2], "shard2": [3, 4]}
+        assert shards.by_row([5, 1001, 2001, 2002]) == {None: [5], "shard1": [1001], "shard2": [2001, 2002]}
+
+    def test_spots_and_reservations_are_created_on_the_lots_shard(self, api):
+        lots = [api.lot(f"Lot {i}", spots=2) for i in range(1, 4)]
+        users = [api.user(f"u{i}") for i in range(3)]
+        booked = [api.book(user, lot_id).json for user, lot_id in zip(users, lots)]
+        assert [b["spot_id"] // 1000 for b in booked] == [0, 1, 2]
+        assert [b["reservation_id"] // 1000 for b in booked] == [0, 1, 2]
+
+        with api.app.app_context():
+            per_bind = shards.each(lambda: (
+                db.session.execute(select(func.count(ParkingSpot.id))).scalar(),
+                db.session.execute(select(Reservation.id)).scalars().all(),
+            ))
+        assert per_bind == [(2, [booked[0]["reservation_id"]]),
+                            (2, [booked[1]["reservation_id"]]),
+                            (2, [booked[2]["reservation_id"]])]
+
+        # a row id is enough to find it again
+        for user, b in zip(users, booked):
+            assert api.release(user, b["reservation_id"]).status_code == 200
+
+    def test_spot_listing_merges_shards_in_id_order(self, api):
+        for i in range(1, 4):
+            api.lot(f"Lot {i}", spots=2)
+        r = api.client.get("/api/admin/spots?limit=4", headers=api.admin).json
+        assert [s["id"] for s in r["spots"]] == [1, 2, 1001, 1002]
+        assert [s["lot_name"] for s in r["spots"]] == ["Lot 1", "Lot 1", "Lot 2", "Lot 2"]
+        rest = api.client.get(f"/api/admin/spots?after={r['next_cursor']}", headers=api.admin).json
+        assert [s["id"] for s in rest["spots"]] == [2001, 2002]
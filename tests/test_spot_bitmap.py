@@ -0,0 +1,110 @@
+import base64
+
+import numpy as np
+import pytest
+import redis
+from sqlalchemy import select, update
+
+from app_factory import db
+from backend import spot_bitmap as spot_bitmap_module
+from backend.models import ParkingSpot
+from backend.spot_bitmap import _Layout, _runs, spot_bitmap
+
+
+def bitmap(api, **args):
+    r = api.client.get("/api/admin/spots/bitmap", headers=api.admin, query_string=args)
+    assert r.status_code == 200, r.json
+    return r.json["lots"]
+
+
+def occupied_offsets(lot):
+    bits = np.unpackbits(np.frombuffer(base64.b64decode(lot["bitmap"]), dtype=np.uint8))
+    return np.flatnonzero(bits[:lot["spots"]]).tolist()
+
+
+def test_runs_and_offsets():
+    runs = _runs(np.array([3, 4, 5, 9, 10, 20]))
+    assert runs == [[3, 3], [9, 2], [20, 1]]
+    layout = _Layout(runs)
+    assert layout.size == 6
+    assert [layout.offset(spot_id) for spot_id in (3, 5, 9, 10, 20)] == [0, 2, 3, 4, 5]
+    assert [layout.offset(spot_id) for spot_id in (2, 6, 11, 21)] == [None] * 4
+    assert _runs(np.array([], dtype=np.int64)) == []
+
+
+def test_bookings_flip_their_bits(api):
+    mall = api.lot("Mall", spots=4)
+    stadium = api.lot("Stadium", spots=2)
+    lots = {lot["lot_id"]: lot for lot in bitmap(api)}
+    assert occupied_offsets(lots[mall]) == [] and lots[stadium]["spots"] == 2
+
+    alice, bob = api.user("alice"), api.user("bob")
+    first = api.book(alice, mall).json
+    second = api.book(bob, mall).json
+    layout = api.client.get("/api/admin/spots/layout", headers=api.admin, query_string={"lot_id": mall}).json
+    spot_ids = [start + i for start, count in layout["lots"][0]["runs"] for i in range(count)]
+
+    lot = bitmap(api, lot_id=mall)[0]
+    assert lot["occupied"] == 2 and lot["available"] == 2
+    assert occupied_offsets(lot) == sorted(spot_ids.index(b["spot_id"]) for b in (first, second))
+
+    api.release(alice, first["reservation_id"])
+    lot = bitmap(api, lot_id=mall)[0]
+    assert occupied_offsets(lot) == [spot_ids.index(second["spot_id"])]
+
+
+def test_resizing_a_lot_changes_its_layout(api):
+    mall = api.lot("Mall", spots=2)
+    before = bitmap(api, lot_id=mall)[0]
+    api.client.put(f"/api/admin/update_lot/{mall}", headers=api.admin, json={"number_of_spots": 5})
+    after = bitmap(api, lot_id=mall)[0]
+    assert after["spots"] == 5 and after["layout"] != before["layout"]
+
+
+def test_binary_format(api):
+    mall = api.lot("Mall", spots=9)
+    api.book(api.user("alice"), mall)
+    r = api.client.get(f"/api/admin/spots/bitmap?lot_id={mall}&format=binary", headers=api.admin)
+    assert r.headers["X-Spot-Count"] == "9" and r.headers["X-Spot-Occupied"] == "1"
+    assert len(r.data) == 2
+    assert api.client.get("/api/admin/spots/bitmap?format=binary", headers=api.admin).status_code == 400
+    assert api.client.get("/api/admin/spots/bitmap?lot_id=99", headers=api.admin).status_code == 404
+
+
+@pytest.fixture(params=["memory", "redis"])
+def racing_app(request, make_app, monkeypatch):
+    if request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        server = fakeredis.FakeServer()
+        monkeypatch.setattr(redis.Redis, "from_url",
+                            classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server)))
+    return make_app(SPOT_BITMAP=request.param, SPOT_BITMAP_TTL=300)
+
+
+def test_a_booking_during_a_rebuild_is_not_lost(racing_app, monkeypatch):
+    app = racing_app
+    client = app.test_client()
+    admin = {"Authorization": "Bearer " + client.post(
+        "/api/login", json={"username": "admin", "password": "admin123"}).json["token"]}
+    client.post("/api/admin/create_lot", headers=admin, json={
+        "prime_location_name": "Mall", "price_per_hour": 10, "address": "MG Road",
+        "pincode": "560001", "number_of_spots": 3})
+
+    with app.app_context():
+        lot_id, spot_id = db.session.execute(select(ParkingSpot.lot_id, ParkingSpot.id).limit(1)).one()
+        build = spot_bitmap_module._build
+
+        def racing_build(lot_ids):
+            built = build(lot_ids)
+            # a booking commits after the rebuild read the spots, then flips its bit
+            db.session.execute(update(ParkingSpot).where(ParkingSpot.id == spot_id).values(status="O"))
+            db.session.commit()
+            spot_bitmap.set(lot_id, [spot_id], True)
+            return built
+
+        monkeypatch.setattr(spot_bitmap_module, "_build", racing_build)
+        assert spot_bitmap.snapshots([lot_id])[lot_id]["occupied"] == 0  # this read was already stale
+        monkeypatch.setattr(spot_bitmap_module, "_build", build)
+
+        # the stale build was not stored: the next read rebuilds and sees the booking
+        assert spot_bitmap.snapshots([lot_id])[lot_id]["occupied"] == 1
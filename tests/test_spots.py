@@ -0,0 +1,56 @@
+import pytest
+
+
+def spots(api, **args):
+    r = api.client.get("/api/admin/spots", headers=api.admin, query_string=args)
+    assert r.status_code == 200, r.json
+    return r.json
+
+
+def all_pages(api, limit, **args):
+    rows, after = [], 0
+    while after is not None:
+        page = spots(api, after=after, limit=limit, **args)
+        rows += page["spots"]
+        after = page["next_cursor"]
+    return rows
+
+
+@pytest.fixture
+def lots(api):
+    mall, stadium = api.lot("Mall", spots=3), api.lot("Stadium", spots=2)
+    booked = api.book(api.user("alice"), stadium).json["spot_id"]
+    return mall, stadium, booked
+
+
+def test_pages_walk_every_spot_in_id_order_with_lot_names(api, lots):
+    rows = all_pages(api, limit=2)
+    assert [r["id"] for r in rows] == sorted(r["id"] for r in rows) and len(rows) == 5
+    assert [r["lot_name"] for r in rows] == ["Mall"] * 3 + ["Stadium"] * 2
+    assert spots(api, after=rows[-1]["id"])["spots"] == []
+
+
+def test_lot_and_status_filters(api, lots):
+    mall, stadium, booked = lots
+    assert [r["lot_name"] for r in all_pages(api, limit=1, lot_id=mall)] == ["Mall"] * 3
+    occupied = all_pages(api, limit=10, status="O")
+    assert [(r["id"], r["status"]) for r in occupied] == [(booked, "O")]
+    assert len(all_pages(api, limit=10, lot_id=stadium, status="A")) == 1
+
+
+def test_stream_returns_the_same_spots(api, lots):
+    r = api.client.get("/api/admin/spots?stream=1", headers=api.admin)
+    assert r.status_code == 200 and r.json == all_pages(api, limit=2)
+
+
+@pytest.mark.parametrize("args", [{"limit": "x"}, {"limit": 0}, {"status": "Z"}])
+def test_bad_parameters_are_400(api, args):
+    assert api.client.get("/api/admin/spots", headers=api.admin, query_string=args).status_code == 400
+
+
+def test_spot_details(api, lots):
+    mall, _, booked = lots
+    occupied = api.client.get(f"/api/admin/spot-details/{booked}", headers=api.admin).json
+    assert occupied["status"] == "Occupied" and occupied["user"]["username"] == "alice"
+    free = spots(api, lot_id=mall, limit=1)["spots"][0]["id"]
+    assert api.client.get(f"/api/admin/spot-details/{free}", headers=api.admin).json == {"status": "Available"}
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import tasks
+from app_factory import db
+from backend.models import Reservation, User
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def state(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(tasks, "_reminder_state", lambda: client)
+    return client
+
+
+@pytest.fixture
+def dispatched(monkeypatch):
+    chunks = []
+
+    class Group:
+        def __init__(self, signatures):
+            self.signatures = signatures
+
+        def apply_async(self):
+            chunks.extend(user_id for sig in self.signatures for user_id in sig.args[1])
+    monkeypatch.setattr(tasks, "group", Group)
+    return chunks
+
+
+def test_reminders_go_to_inactive_users_once_per_run(api, state, dispatched):
+    api.user("idle")
+    lot_id = api.lot()
+    for name in ("busy", "old"):
+        user = api.user(name)
+        api.release(user, api.book(user, lot_id).json["reservation_id"])
+    with api.app.app_context():
+        ids = dict(db.session.query(User.username, User.id))
+        res = Reservation.query.filter_by(user_id=ids["old"]).one()
+        res.leaving_timestamp = datetime.utcnow() - timedelta(days=30)
+        db.session.commit()
+
+        result = tasks.send_daily_reminders.run(run_id="2026-10-17")
+        assert result == {"run_id": "2026-10-17", "dispatched": 3}
+        assert sorted(dispatched) == sorted([ids["admin"], ids["idle"], ids["old"]])
+
+        again = tasks.send_daily_reminders.run(run_id="2026-10-17")
+        assert again == {"run_id": "2026-10-17", "dispatched": 3, "already_complete": True}
+        assert len(dispatched) == 3
+
+    progress = tasks.reminder_progress("2026-10-17")
+    assert progress["dispatched"] == 3 and progress["dispatch_complete"] is True
+    assert tasks.reminder_progress("2026-10-18")["dispatch_complete"] is False